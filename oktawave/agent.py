@@ -0,0 +1,93 @@
+import base64
+import json
+import os
+import socket
+import sys
+
+# set to a non-empty value to never forward commands to the agent
+NO_AGENT_ENV = 'OKTAWAVE_CLI_NO_AGENT'
+SOCKET_ENV = 'OKTAWAVE_CLI_AGENT_SOCKET'
+
+# seconds to wait for the agent (busy with another command) before running the command ourselves
+READY_TIMEOUT = 0.5
+
+
+def default_socket_path():
+    return os.environ.get(SOCKET_ENV) or os.path.expanduser('~/.oktawave-cli/agent.sock')
+
+
+def send_message(f, **message):
+    f.write(json.dumps(message) + '\n')
+    f.flush()
+
+
+def read_message(f):
+    line = f.readline()
+    if not line:
+        return None
+    return json.loads(line)
+
+
+def connect(path=None):
+    """Returns a socket connected to the agent, or None if no agent is running"""
+    if path is None:
+        path = default_socket_path()
+    if not os.path.exists(path):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except socket.error:
+        sock.close()
+        return None
+    return sock
+
+
+def forward(argv, path=None):
+    """Runs a command line in a running agent, streaming its output
+
+    Returns the exit status of the command or None if the command should
+    run in the current process instead (no agent, the agent is busy with
+    another command, or it refused this one).
+    """
+    if os.environ.get(NO_AGENT_ENV) or '-' in argv:
+        return None
+    sock = connect(path)
+    if sock is None:
+        return None
+    accepted = False
+    try:
+        # the request is only sent once the agent picks up the connection,
+        # so a command we give up waiting for cannot run twice
+        sock.settimeout(READY_TIMEOUT)
+        f = sock.makefile('r+b')
+        message = read_message(f)
+        if not message or 'ready' not in message:
+            return None
+        sock.settimeout(None)
+        send_message(f, argv=argv, cwd=os.getcwd())
+        while True:
+            message = read_message(f)
+            if message is None:
+                break
+            if 'fallback' in message:
+                return None
+            if 'accepted' in message:
+                accepted = True
+            if 'out' in message:
+                sys.stdout.write(base64.b64decode(message['out']))
+                sys.stdout.flush()
+            if 'err' in message:
+                sys.stderr.write(base64.b64decode(message['err']))
+            if 'exit' in message:
+                return message['exit']
+    except socket.error:
+        pass
+    finally:
+        sock.close()
+
+    if not accepted:
+        return None
+    # the agent went away while running the command, we cannot tell what happened
+    print >> sys.stderr, 'ERROR: connection to oktawave-cli agent lost'
+    return 1
@@ -1,18 +1,15 @@
-from time import time
+import hashlib
+import threading
+from time import sleep, time
 
-from client import ApiClient
+from client import ApiClient, BackgroundCall, CallMemo, HttpTransport, ResultsStream
 from exceptions import *
-
-
-try:
-    from swiftclient import Connection
-except ImportError:
-    # noinspection PyUnresolvedReferences
-    from swift.common.client import Connection
+from records import Record, field, convert, date, record_list
 
 # JSON API endpoints
-jsonapi_common = 'https://api.oktawave.com/CommonService.svc/json'
-jsonapi_clients = 'https://api.oktawave.com/ClientsService.svc/json'
+API_URL = 'https://api.oktawave.com'
+COMMON_SERVICE = '/CommonService.svc/json'
+CLIENTS_SERVICE = '/ClientsService.svc/json'
 
 DICT = {
     'DB_VM_CATEGORY': 324,
@@ -102,6 +99,16 @@ class DictionaryItem(RawDictionaryItem):
             self.ITEM_ID_FIELD: item_id,
         }
 
+    @classmethod
+    def from_id_name(cls, item_id, name):
+        """Builds an item from an already known id and name (no API data)"""
+        obj = cls.__new__(cls)
+        RawDictionaryItem.__init__(obj, item_id, name)
+        obj.item = {
+            cls.ITEM_ID_FIELD: item_id,
+        }
+        return obj
+
 
 class TemplateCategory(DictionaryItem):
     ITEM_ID_FIELD = 'TemplateCategoryId'
@@ -131,6 +138,158 @@ class TemplateDescription(DictionaryItem):
     NAME_FIELD = 'Description'
 
 
+# API result records, see oktawave.records.Record
+# ###
+
+class VM(Record):
+    """Virtual machine, as listed by GetVirtualMachines"""
+    __slots__ = ()
+
+    FIELDS = {
+        'id': field('VirtualMachineId'),
+        'name': field('VirtualMachineName'),
+        'status': convert(PowerStatus, 'StatusDictId'),
+        'class_name': convert(DictionaryItem, 'VMClass'),
+        'cpu_mhz': field('CpuMhz'),
+        'cpu_usage_mhz': field('CpuMhzUsage'),
+        'memory_mb': field('RamMB'),
+        'memory_usage_mb': field('RamMBUsage'),
+    }
+
+
+class VMDisk(Record):
+    """Disk attached to a virtual machine"""
+    __slots__ = ()
+
+    FIELDS = {
+        'id': field('ClientHddId'),
+        'name': field('ClientHdd', 'HddName'),
+        'capacity_gb': field('ClientHdd', 'CapacityGB'),
+        'creation_date': date('ClientHdd', 'CreationDate'),
+        'creation_user_name': field('ClientHdd', 'CreationUser', 'FullName'),
+        'is_primary': field('IsPrimary'),
+        'is_shared': field('ClientHdd', 'IsShared'),
+    }
+
+
+class IPAddress(Record):
+    __slots__ = ()
+
+    FIELDS = {
+        'ipv4': field('Address'),
+        'netmask': field('NetMask'),
+        'ipv6': field('AddressV6'),
+        'creation_date': date('CreationDate'),
+        'dhcp_branch': field('DhcpBranch'),
+        'gateway': field('Gateway'),
+        'status': convert(DictionaryItem, 'IPStatus'),
+        'last_change_date': date('LastChangeDate'),
+        'macaddr': field('MacAddress'),
+    }
+
+
+class PrivateIPAddress(Record):
+    """Address of a virtual machine in a private network (OPN)"""
+    __slots__ = ()
+
+    FIELDS = {
+        'ipv4': field('PrivateIpAddress'),
+        'creation_date': date('CreationDate'),
+        'macaddr': field('MacAddress'),
+    }
+
+
+class VMDetails(Record):
+    """Virtual machine, as returned by GetVirtualMachineById"""
+    __slots__ = ()
+
+    FIELDS = {
+        'autoscaling': convert(DictionaryItem, 'AutoScalingType'),
+        'connection_type': convert(DictionaryItem, 'ConnectionType'),
+        'cpu_mhz': field('CpuMhz'),
+        'cpu_usage_mhz': field('CpuMhzUsage'),
+        'creation_date': date('CreationDate'),
+        'creation_user_name': field('CreationUserSimple', 'FullName'),
+        'iops_usage': field('IopsUsage'),
+        'last_change_date': date('LastChangeDate'),
+        'payment_type': convert(DictionaryItem, 'PaymentType'),
+        'memory_mb': field('RamMB'),
+        'memory_usage_mb': field('RamMBUsage'),
+        'status': convert(DictionaryItem, 'Status'),
+        'name': field('VirtualMachineName'),
+        'vm_class_name': convert(DictionaryItem, 'VMClass'),
+        'disks': record_list(VMDisk, 'DiskDrives'),
+        'ips': record_list(IPAddress, 'IPs'),
+        'vlans': record_list(PrivateIPAddress, 'PrivateIpv4'),
+    }
+
+
+class LogEntry(Record):
+    """Virtual machine history entry"""
+    __slots__ = ()
+
+    FIELDS = {
+        'time': date('CreationDate'),
+        'type': convert(DictionaryItem, 'OperationType'),
+        'user_name': field('CreationUser', 'FullName'),
+        'status': convert(DictionaryItem, 'Status'),
+        'parameters': lambda raw: [item['Value'] for item in raw['Parameters']],
+    }
+
+
+class DiskMapping(Record):
+    """Virtual machine a disk is connected to"""
+    __slots__ = ()
+
+    FIELDS = {
+        'id': field('VirtualMachine', 'VirtualMachineId'),
+        'name': field('VirtualMachine', 'VirtualMachineName'),
+        'primary': field('IsPrimary'),
+        'vm_status': convert(PowerStatus, 'VirtualMachine', 'StatusDictId'),
+    }
+
+
+class Disk(Record):
+    """Disk (OVS), as listed by GetDisks"""
+    __slots__ = ()
+
+    FIELDS = {
+        'id': field('ClientHddId'),
+        'name': field('HddName'),
+        'tier': convert(DictionaryItem, 'HddStandard'),
+        'capacity_gb': field('CapacityGB'),
+        'used_gb': field('UsedCapacityGB'),
+        'is_shared': field('IsShared'),
+        'vms': record_list(DiskMapping, 'VirtualMachineHdds'),
+    }
+
+
+class DatabaseInstance(Record):
+    __slots__ = ()
+
+    FIELDS = {
+        'id': field('VirtualMachineId'),
+        'name': field('VirtualMachineName'),
+        'type': convert(DictionaryItem, 'DatabaseType'),
+        'size': field('Size'),
+        'available_space': field('AvailableSpace'),
+    }
+
+
+class LogicalDatabase(Record):
+    __slots__ = ()
+
+    FIELDS = {
+        'id': field('VirtualMachineId'),
+        'name': field('DatabaseName'),
+        'type': convert(DictionaryItem, 'DatabaseType'),
+        'encoding': field('Encoding'),
+        'is_running': field('IsRunning'),
+        'qps': field('QPS'),
+        'size': field('Size'),
+    }
+
+
 def _get_machine_ip():
     return '127.0.0.1'
 
@@ -165,52 +324,227 @@ def _subregion_id(subregion):
     return int(subregion)
 
 
-def _container_service_id(service):
-    services = {'HTTP': 43, 'HTTPS': 44, 'SMTP': 45, 'MySQL': 287, 'Port': 155}
-    return services[service]
+class Dictionary(object):
+    """Dictionary items indexed both by id and by name"""
+
+    def __init__(self, items):
+        self._by_id = {}
+        self._by_name = {}
+        for item in items:
+            self._by_id.setdefault(item.id, item)
+            self._by_name.setdefault(item.name, item)
+
+    @classmethod
+    def from_mapping(cls, mapping):
+        return cls(DictionaryItem.from_id_name(item_id, name) for name, item_id in mapping.items())
 
+    def __iter__(self):
+        return iter(self._by_id.values())
 
-def _load_balancer_algorithm_id(algorithm):
-    algorithms = {'least_response_time': 282, 'least_connections': 281, 'source_ip_hash': 288, 'round_robin': 612}
-    return algorithms[algorithm]
+    def __len__(self):
+        return len(self._by_id)
 
+    def by_id(self, item_id):
+        return self._by_id.get(item_id)
 
-def _session_type_id(s_type):
-    s_types = {'none': 47, 'by_source_ip': 46, 'by_cookie': 280}
-    return s_types[s_type]
+    def by_name(self, name):
+        return self._by_name.get(name)
 
+    def id_of(self, name):
+        """Returns ID of the item with a given name, raises KeyError if not found"""
+        return self._by_name[name].id
 
-def _ip_version_id(version):
-    versions = {'4': 115, '6': 116, 'both': 565}
-    return versions[version]
 
+# dictionaries we know the contents of, no need to ask the API about these
+STATIC_DICTIONARIES = dict((key, Dictionary.from_mapping(mapping)) for key, mapping in {
+    'container_service': {'HTTP': 43, 'HTTPS': 44, 'SMTP': 45, 'MySQL': 287, 'Port': 155},
+    'load_balancer_algorithm': {
+        'least_response_time': 282, 'least_connections': 281, 'source_ip_hash': 288, 'round_robin': 612},
+    'session_type': {'none': 47, 'by_source_ip': 46, 'by_cookie': 280},
+    'ip_version': {'4': 115, '6': 116, 'both': 565},
+    'autoscaling': {'on': 185, 'off': 184},
+    'address_pool': {'10.0.0.0/24': 278, '192.168.0.0/24': 279},
+    'encoding': {'utf8': DICT['UTF8_ENCODING'], 'latin2': DICT['LATIN2_ENCODING']},
+}.items())
 
-def _autoscaling_id(autoscaling):
-    types = {'on': 185, 'off': 184}
-    return types[autoscaling]
 
+class DictionaryRegistry(object):
+    """Loads API dictionaries once and keeps them indexed by id and name
 
-def _address_pool_id(name):
-    pools = {'10.0.0.0/24': 278, '192.168.0.0/24': 279}
-    return pools[name]
+    Remote dictionaries (identified by numeric dictionary ID) are fetched
+    with GetDictionaryItems at most once per registry and optionally kept
+    in a FileCache between invocations. Static dictionaries (identified
+    by name) are always available.
+    """
+
+    def __init__(self, loader, store=None, store_key=''):
+        """Initialize the registry
+
+        Arguments:
+        - loader (callable) - takes a dictionary ID, returns raw items from the API
+        - store (FileCache) - persistent cache for loaded dictionaries (optional)
+        - store_key (string) - prefix for cache keys, e.g. user and endpoint
+        """
+        self.loader = loader
+        self.store = store
+        self.store_key = store_key
+        self._dicts = dict(STATIC_DICTIONARIES)
+        self._reloaded = set()
+        self._lock = threading.Lock()
+
+    def _load(self, dict_id, use_store=True):
+        key = '{0}#{1}'.format(self.store_key, dict_id)
+        if self.store is not None and use_store:
+            items = self.store.get(key)
+            if items is not None:
+                return Dictionary(DictionaryItem.from_id_name(item_id, name) for item_id, name in items)
+        dictionary = Dictionary(DictionaryItem(item) for item in self.loader(dict_id) or [])
+        # an empty dictionary is most likely an API hiccup, do not keep it around
+        if self.store is not None and len(dictionary):
+            self.store.set(key, [(item.id, item.name) for item in dictionary])
+        return dictionary
+
+    def get(self, dict_id):
+        """Returns the Dictionary with a given ID (or static dictionary name)"""
+        with self._lock:
+            dictionary = self._dicts.get(dict_id)
+            if dictionary is None:
+                dictionary = self._dicts[dict_id] = self._load(dict_id)
+            return dictionary
+
+    def _reload(self, dict_id):
+        """Fetches a remote dictionary again, bypassing the store (once per registry)"""
+        with self._lock:
+            if dict_id in STATIC_DICTIONARIES or dict_id in self._reloaded:
+                return self._dicts[dict_id]
+            self._reloaded.add(dict_id)
+            dictionary = self._dicts[dict_id] = self._load(dict_id, use_store=False)
+            return dictionary
+
+    def find(self, dict_id, name):
+        """Returns the item with a given name or None
+
+        A miss reloads the dictionary once, in case the cached copy is stale.
+        """
+        item = self.get(dict_id).by_name(name)
+        if item is None:
+            item = self._reload(dict_id).by_name(name)
+        return item
+
+    def id_of(self, dict_id, name):
+        """Returns ID of the item with a given name, raises KeyError if not found"""
+        item = self.find(dict_id, name)
+        if item is None:
+            raise KeyError(name)
+        return item.id
+
+
+class OperationWatcher(object):
+    """Waits for asynchronous operations to finish
+
+    Any number of threads may wait at the same time (e.g. batch jobs run
+    with --wait); a single GetRunningOperations poll serves all of them.
+    A waiter polls after MIN_INTERVAL, then every time it wakes up, with
+    the interval growing by BACKOFF up to MAX_INTERVAL; if another waiter
+    polled while it slept, that result is used instead of polling again.
+    """
+    MIN_INTERVAL = 1.0
+    MAX_INTERVAL = 15.0
+    BACKOFF = 1.5
+
+    def __init__(self, poll):
+        """poll() returns the list of currently running operations (raw API data)"""
+        self.poll = poll
+        self._cond = threading.Condition()
+        self._polling = False
+        self._operations = None
+        self._polled_at = None
+
+    def running(self, since):
+        """Returns the running operations as polled not earlier than since"""
+        with self._cond:
+            while True:
+                if self._polled_at is not None and self._polled_at >= since:
+                    return self._operations
+                if not self._polling:
+                    self._polling = True
+                    break
+                self._cond.wait()
+        operations = None
+        polled_at = time()
+        try:
+            operations = self.poll() or []
+        finally:
+            with self._cond:
+                self._polling = False
+                if operations is not None:
+                    self._operations = operations
+                    self._polled_at = polled_at
+                self._cond.notify_all()
+        return operations
+
+    def wait(self, match, timeout=None):
+        """Waits until no running operation matches (match(operation) is true)
+
+        Returns False if the operations are still running after timeout seconds.
+        """
+        deadline = time() + timeout if timeout is not None else None
+        interval = self.MIN_INTERVAL
+        while True:
+            since = time()
+            delay = interval
+            if deadline is not None:
+                delay = min(delay, deadline - since)
+            if delay > 0:
+                sleep(delay)
+            if not [op for op in self.running(since) if match(op)]:
+                return True
+            if deadline is not None and time() >= deadline:
+                return False
+            interval = min(interval * self.BACKOFF, self.MAX_INTERVAL)
 
 
 class OktawaveApi(object):
-    def __init__(self, username, password, debug=False):
+    # default number of items requested per page of search results; large enough
+    # for most accounts to get everything in a single round trip
+    PAGE_SIZE = 1000
+
+    def __init__(self, username, password, debug=False, session_store=None, pool_size=4,
+                 dictionary_store=None, api_url=None, call_hooks=()):
         """Initialize the API instance
 
         Arguments:
         - username (string) - Oktawave account username
         - password (string) - Oktawave account password
         - debug (bool) - enable debug output?
+        - session_store (FileCache) - where to keep LogonUser results
+          between invocations (optional)
+        - pool_size (int) - max. number of pooled HTTP connections
+        - dictionary_store (FileCache) - where to keep downloaded API
+          dictionaries between invocations (optional)
+        - api_url (string) - API server to use instead of API_URL, e.g.
+          oktawave.fakeserver
+        - call_hooks (list) - functions called after every API call
+          (see ApiClient)
         """
+        api_url = (api_url or API_URL).rstrip('/')
+        self.common_url = api_url + COMMON_SERVICE
+        self.clients_url = api_url + CLIENTS_SERVICE
         self.username = username
         self.password = password
         self.debug = debug
+        self.session_store = session_store
+        self.pool_size = pool_size
+        self.call_hooks = call_hooks
+        self.call_memo = CallMemo()
+        self.operations = OperationWatcher(self._running_operations)
+        self.transport = None
         self.client_id = None
         self.client_object = None
         self.common = None
         self.clients = None
+        self.dictionaries = DictionaryRegistry(
+            self._load_dictionary, dictionary_store, '{0}@{1}'.format(username, self.common_url))
 
     # HELPER METHODS ###
     # methods starting with "_" will not be autodispatched to client commands
@@ -220,12 +554,20 @@ class OktawaveApi(object):
         if self.debug:
             print what
 
+    def _init_transport(self):
+        """Creates the HTTP connection pool shared by all service clients"""
+        if self.transport is None:
+            self.transport = HttpTransport(self.username, self.password, self.pool_size)
+        return self.transport
+
     def _init_common(self):
         """Convenience method to initialize CommonService client"""
         if self.common is not None:
             return
         self.common = ApiClient(
-            jsonapi_common, self.username, self.password, self.debug)
+            self.common_url, self.username, self.password, self.debug,
+            on_access_denied=self._invalidate_session, transport=self._init_transport(),
+            call_hooks=self.call_hooks, memo=self.call_memo)
         self._d(self.common)
 
     def _init_clients(self):
@@ -233,9 +575,48 @@ class OktawaveApi(object):
         if self.clients is not None:
             return
         self.clients = ApiClient(
-            jsonapi_clients, self.username, self.password, self.debug)
+            self.clients_url, self.username, self.password, self.debug,
+            on_access_denied=self._invalidate_session, transport=self._init_transport(),
+            call_hooks=self.call_hooks, memo=self.call_memo)
         self._d(self.clients)
 
+    def _session_key(self):
+        """Sessions are stored per user, password and endpoint
+
+        A changed (or mistyped) password must go through LogonUser again.
+        """
+        password = self.password or ''
+        if isinstance(password, unicode):
+            password = password.encode('utf-8')
+        return '{0}:{1}@{2}'.format(self.username, hashlib.sha256(password).hexdigest()[:16], self.common_url)
+
+    def _invalidate_session(self):
+        """Forgets the stored LogonUser result, e.g. after access was denied"""
+        if self.session_store is not None:
+            self.session_store.delete(self._session_key())
+
+    def _running_operations(self):
+        self.logon(only_common=True)
+        return self.common.call('GetRunningOperations', clientId=self.client_id)
+
+    def wait_for_operations(self, object_names, timeout=None):
+        """Waits until no operation on objects named object_names is running
+
+        Returns False on timeout (see OperationWatcher).
+        """
+        object_names = set(object_names)
+        return self.operations.wait(lambda op: op['ObjectName'] in object_names, timeout)
+
+    def forget_calls(self):
+        """Forgets memoized API responses, e.g. before the next command of a shell session"""
+        self.call_memo.clear()
+
+    def pool_stats(self):
+        """Returns HTTP connection pool statistics (see HttpTransport.stats)"""
+        if self.transport is None:
+            return []
+        return self.transport.stats()
+
     def logon(self, only_common=False):
         """Initializes CommonService client and calls LogonUser method.
 
@@ -247,6 +628,12 @@ class OktawaveApi(object):
             self._init_clients()
         if self.client_object is not None:
             return self.client_object
+        if self.session_store is not None:
+            session = self.session_store.get(self._session_key())
+            if session is not None:
+                self.client_id = session['client_id']
+                self.client_object = session['client_object']
+                return self.client_object
         try:
             res = self.common.call(
                 'LogonUser',
@@ -258,7 +645,12 @@ class OktawaveApi(object):
             raise OktawaveLoginError()
         self.client_id = res['User']['Client']['ClientId']
         self.client_object = res['User']
-        return res
+        if self.session_store is not None:
+            self.session_store.set(self._session_key(), {
+                'client_id': self.client_id,
+                'client_object': self.client_object,
+            })
+        return self.client_object
 
     def _simple_vm_method(self, method, vm_id):
         """Wraps around common simple virtual machine method call pattern"""
@@ -270,8 +662,7 @@ class OktawaveApi(object):
         dsp = {
             'ClientId': self.client_id,
         }
-        disks = [d for d in self.clients.call(
-            'GetDisks', searchParams=dsp)['_results'] if d['ClientHddId'] == disk_id]
+        disks = [d for d in self._paged_search('GetDisks', dsp) if d['ClientHddId'] == disk_id]
         if len(disks) == 0:
             return None
         res = disks[0]
@@ -279,13 +670,62 @@ class OktawaveApi(object):
             res['VirtualMachineHdds'] = []
         return res
 
-    def _dict_item(self, dict_id, key):
-        items = self.common.call(
+    def _load_dictionary(self, dict_id):
+        """Downloads raw items of a dictionary (used by self.dictionaries)"""
+        self.logon(only_common=True)
+        return self.common.call(
             'GetDictionaryItems', dictionary=dict_id, clientId=self.client_id)
-        for item in items:
-            item = DictionaryItem(item)
-            if item.name == key:
-                return item
+
+    def _search_page(self, method, search_params, page_number, page_size, **kwargs):
+        """Returns the items of a page of search results and the total number of results"""
+        sp = dict(search_params, PageNumber=page_number, PageSize=page_size)
+        parser = ResultsStream()
+        items = list(self.clients.call_results(method, parser=parser, searchParams=sp, **kwargs))
+        return items, parser.total_count
+
+    def _paged_search(self, method, search_params, page_size=None, limit=None, **kwargs):
+        """Yields "_results" items of a search method, page by page
+
+        Pages are fetched only as the items are consumed, while the items of
+        the current page are processed the next one is already being fetched.
+        At most limit items are fetched if limit is given. Paging stops at
+        the reported total count of results (even if some pages come back
+        short), at a short page if no total is reported, or when a page comes
+        back empty or the same as the previous one (a server ignoring PageNumber).
+        """
+        page_size = page_size or self.PAGE_SIZE
+        if limit is not None:
+            # the page size determines page offsets, so it stays the same for all pages
+            page_size = min(page_size, limit)
+        if limit is None:
+            limit = float('inf')
+        page_number = 1
+        page = BackgroundCall(self._search_page, method, search_params, page_number, page_size, **kwargs)
+        previous = None
+        count = 0
+        while page is not None:
+            items, total = page.result()
+            page = None
+            if items == previous:
+                return
+            previous = items
+            if total is not None:
+                limit = min(limit, total)
+            if items and count + len(items) < limit and (total is not None or len(items) == page_size):
+                page_number += 1
+                page = BackgroundCall(self._search_page, method, search_params, page_number, page_size, **kwargs)
+            for item in items:
+                if count >= limit:
+                    return
+                count += 1
+                yield item
+
+    def _dict_item(self, dict_id, key):
+        return self.dictionaries.find(dict_id, key)
+
+    def _dict_ref(self, dict_id, key):
+        """Returns a reference to a dictionary item, as used in API payloads"""
+        return {'DictionaryItemId': self.dictionaries.id_of(dict_id, key)}
 
     def _oci_class(self, class_name):
         """Returns a dictionary item for OCI class with a given name"""
@@ -424,23 +864,12 @@ class OktawaveApi(object):
                 'status': PowerStatus(vm['StatusDictId']),
             }
 
-    def OCI_ListDetails(self):
+    def OCI_ListDetails(self, page_size=None, limit=None):
         """Lists client's virtual machines"""
         self.logon()
         sp = {'ClientId': self.client_id}
-        vms = self.clients.call('GetVirtualMachines', searchParams=sp)
-        self._d(vms)
-        for vm in vms['_results']:
-            yield {
-                'id': vm['VirtualMachineId'],
-                'name': vm['VirtualMachineName'],
-                'status': PowerStatus(vm['StatusDictId']),
-                'class_name': DictionaryItem(vm['VMClass']),
-                'cpu_mhz': vm['CpuMhz'],
-                'cpu_usage_mhz': vm['CpuMhzUsage'],
-                'memory_mb': vm['RamMB'],
-                'memory_usage_mb': vm['RamMBUsage'],
-            }
+        for vm in self._paged_search('GetVirtualMachines', sp, page_size, limit):
+            yield VM(vm)
 
     def OCI_Restart(self, oci_id):
         """Restarts given VM"""
@@ -466,25 +895,16 @@ class OktawaveApi(object):
         """Deletes given virtual machine"""
         self._simple_vm_method('DeleteVirtualMachine', oci_id)
 
-    def OCI_Logs(self, oci_id):
+    def OCI_Logs(self, oci_id, page_size=None, limit=None):
         """Shows virtual machine logs"""
         self.logon()
         sp = {
             'VirtualMachineId': oci_id,
-            'PageSize': 100,
             'SortingDirection': 0,  # descending
         }
-        data = self.clients.call(
-            'GetVirtualMachineHistories', searchParams=sp, clientId=self.client_id)
-        self._d(data)
-        for op in data['_results']:
-            yield {
-                'time': self.clients.parse_date(op['CreationDate']),
-                'type': DictionaryItem(op['OperationType']),
-                'user_name': op['CreationUser']['FullName'],
-                'status': DictionaryItem(op['Status']),
-                'parameters': [item['Value'] for item in op['Parameters']],
-            }
+        for op in self._paged_search(
+                'GetVirtualMachineHistories', sp, page_size, limit, clientId=self.client_id):
+            yield LogEntry(op)
 
     def OCI_DefaultPassword(self, oci_id):
         logs = self.OCI_Logs(oci_id)
@@ -497,53 +917,7 @@ class OktawaveApi(object):
 
     def OCI_Settings(self, oci_id):
         """Shows basic VM settings (IP addresses, OS, names, autoscaling etc.)"""
-        data = self._simple_vm_method('GetVirtualMachineById', oci_id)
-
-        res = {
-            'autoscaling': DictionaryItem(data['AutoScalingType']),
-            'connection_type': DictionaryItem(data['ConnectionType']),
-            'cpu_mhz': data['CpuMhz'],
-            'cpu_usage_mhz': data['CpuMhzUsage'],
-            'creation_date': self.clients.parse_date(data['CreationDate']),
-            'creation_user_name': data['CreationUserSimple']['FullName'],
-            'iops_usage': data['IopsUsage'],
-            'last_change_date': self.clients.parse_date(data['LastChangeDate']),
-            'payment_type': DictionaryItem(data['PaymentType']),
-            'memory_mb': data['RamMB'],
-            'memory_usage_mb': data['RamMBUsage'],
-            'status': DictionaryItem(data['Status']),
-            'name': data['VirtualMachineName'],
-            'vm_class_name': DictionaryItem(data['VMClass']),
-            'disks': [{
-                'id': disk['ClientHddId'],
-                'name': disk['ClientHdd']['HddName'],
-                'capacity_gb': disk['ClientHdd']['CapacityGB'],
-                'creation_date': self.clients.parse_date(disk['ClientHdd']['CreationDate']),
-                'creation_user_name': disk['ClientHdd']['CreationUser']['FullName'],
-                'is_primary': disk['IsPrimary'],
-                'is_shared': disk['ClientHdd']['IsShared']
-            } for disk in data['DiskDrives']],
-            'ips': [{
-                'ipv4': ip['Address'],
-                'netmask': ip['NetMask'],
-                'ipv6': ip['AddressV6'],
-                'creation_date': self.clients.parse_date(ip['CreationDate']),
-                'dhcp_branch': ip['DhcpBranch'],
-                'gateway': ip['Gateway'],
-                'status': DictionaryItem(ip['IPStatus']),
-                'last_change_date': self.clients.parse_date(ip['LastChangeDate']),
-                'macaddr': ip['MacAddress'],
-            } for ip in data['IPs']],
-            'vlans': [],
-        }
-        if data['PrivateIpv4']:
-            res['vlans'] = [{
-                'ipv4': vlan['PrivateIpAddress'],
-                'creation_date': self.clients.parse_date(vlan['CreationDate']),
-                'macaddr': vlan['MacAddress'],
-            } for vlan in data['PrivateIpv4']]
-
-        return res
+        return VMDetails(self._simple_vm_method('GetVirtualMachineById', oci_id))
 
     def OCI_Classes(self):
         self.logon(only_common=True)
@@ -644,32 +1018,14 @@ class OktawaveApi(object):
 
     # OVS (disks) ###
 
-    def OVS_List(self):
+    def OVS_List(self, page_size=None, limit=None):
         """Lists disks"""
         self.logon()
         dsp = {
             'ClientId': self.client_id,
         }
-        data = self.clients.call('GetDisks', searchParams=dsp)
-        for disk in data['_results']:
-            if disk['VirtualMachineHdds'] is None:
-                vms = []
-            else:
-                vms = [{
-                    'id': vm['VirtualMachine']['VirtualMachineId'],
-                    'name': vm['VirtualMachine']['VirtualMachineName'],
-                    'primary': vm['IsPrimary'],
-                    'vm_status': PowerStatus(vm['VirtualMachine']['StatusDictId']),
-                } for vm in disk['VirtualMachineHdds']]
-            yield {
-                'id': disk['ClientHddId'],
-                'name': disk['HddName'],
-                'tier': DictionaryItem(disk['HddStandard']),
-                'capacity_gb': disk['CapacityGB'],
-                'used_gb': disk['UsedCapacityGB'],
-                'is_shared': disk['IsShared'],
-                'vms': vms,
-            }
+        for disk in self._paged_search('GetDisks', dsp, page_size, limit):
+            yield Disk(disk)
 
     def OVS_Delete(self, ovs_id):
         """Deletes a disk"""
@@ -755,21 +1111,14 @@ class OktawaveApi(object):
 
     # ORDB (databases) ###
 
-    def ORDB_List(self):
+    def ORDB_List(self, page_size=None, limit=None):
         """Lists databases"""
         self.logon()
         sp = {
             'ClientId': self.client_id,
         }
-        data = self.clients.call('GetDatabaseInstances', searchParams=sp)
-        for db in data['_results']:
-            yield {
-                'id': db['VirtualMachineId'],
-                'name': db['VirtualMachineName'],
-                'type': DictionaryItem(db['DatabaseType']),
-                'size': db['Size'],
-                'available_space': db['AvailableSpace'],
-            }
+        for db in self._paged_search('GetDatabaseInstances', sp, page_size, limit):
+            yield DatabaseInstance(db)
 
     ORDB_TurnOn = OCI_TurnOn
     ORDB_TurnOff = OCI_TurnOff
@@ -788,28 +1137,22 @@ class OktawaveApi(object):
 
     ORDB_Logs = OCI_Logs
 
-    def ORDB_LogicalDatabases(self, oci_id):
+    def ORDB_LogicalDatabases(self, oci_id, page_size=None, limit=None):
         """Shows logical databases"""
         self.logon()
         sp = {
             'ClientId': self.client_id,
         }
-        data = self.clients.call('GetDatabaseInstances', searchParams=sp)
-
-        for vm in data['_results']:
+        count = 0
+        for vm in self._paged_search('GetDatabaseInstances', sp, page_size):
             if oci_id is not None and str(vm['VirtualMachineId']) != str(oci_id):
                 continue
 
             for db in vm['Databases']:
-                yield {
-                    'id': db['VirtualMachineId'],
-                    'name': db['DatabaseName'],
-                    'type': DictionaryItem(db['DatabaseType']),
-                    'encoding': db['Encoding'],
-                    'is_running': db['IsRunning'],
-                    'qps': db['QPS'],
-                    'size': db['Size']
-                }
+                if limit is not None and count >= limit:
+                    return
+                count += 1
+                yield LogicalDatabase(db)
 
     ORDB_Settings = OCI_Settings
 
@@ -843,7 +1186,7 @@ class OktawaveApi(object):
             'CreateDatabase',
             virtualMachineId=oci_id,
             databaseName=name,
-            encodingDictId=DICT[encoding.upper() + '_ENCODING'],
+            encodingDictId=self.dictionaries.id_of('encoding', encoding),
             clientId=self.client_id)
 
     def ORDB_BackupLogicalDatabase(self, oci_id, name):
@@ -865,10 +1208,12 @@ class OktawaveApi(object):
     def ORDB_Backups(self):
         """Lists logical database backups"""
         self.logon()
-        mysql_data = self.clients.call(
-            'GetBackups', databaseTypeDictId=DICT['MYSQL_DB'], clientId=self.client_id) or []
-        pgsql_data = self.clients.call(
-            'GetBackups', databaseTypeDictId=DICT['POSTGRESQL_DB'], clientId=self.client_id) or []
+        mysql_call = self.clients.call_async(
+            'GetBackups', databaseTypeDictId=DICT['MYSQL_DB'], clientId=self.client_id)
+        pgsql_call = self.clients.call_async(
+            'GetBackups', databaseTypeDictId=DICT['POSTGRESQL_DB'], clientId=self.client_id)
+        mysql_data = mysql_call.result() or []
+        pgsql_data = pgsql_call.result() or []
 
         for b in mysql_data:
             yield {
@@ -951,6 +1296,7 @@ class OktawaveApi(object):
     def Container_RemoveOCI(self, container_id, oci_id):
         """Removes an instance from container"""
         self.logon()
+        c_call = self.clients.call_async('GetContainer', containerId=container_id)
         c_simple = self._container_simple(container_id)
         found = False
         for vm in c_simple['VirtualMachines']:
@@ -962,13 +1308,14 @@ class OktawaveApi(object):
         vm_ids = [vm['VirtualMachineId']
                   for vm in c_simple['VirtualMachines']
                   if vm['VirtualMachineId'] != oci_id]
-        c = self.clients.call('GetContainer', containerId=container_id)
+        c = c_call.result()
         self._d(vm_ids)
         self.clients.call('UpdateContainer', container=c, virtualMachinesId=vm_ids)
 
     def Container_AddOCI(self, container_id, oci_id):
         """Adds an instance to container"""
         self.logon()
+        c_call = self.clients.call_async('GetContainer', containerId=container_id)
         c_simple = self._container_simple(container_id)
         found = False
         for vm in c_simple['VirtualMachines']:
@@ -979,7 +1326,7 @@ class OktawaveApi(object):
             raise OktawaveOCIInContainer()
         vm_ids = [vm['VirtualMachineId']
                   for vm in c_simple['VirtualMachines']] + [oci_id]
-        c = self.clients.call('GetContainer', containerId=container_id)
+        c = c_call.result()
         self.clients.call('UpdateContainer', container=c, virtualMachinesId=vm_ids)
 
     def Container_Delete(self, container_id):
@@ -998,15 +1345,15 @@ class OktawaveApi(object):
             'OwnerClientId': self.client_id,
             'ContainerName': name,
             'IsLoadBalancer': load_balancer,
-            'Service': {'DictionaryItemId': _container_service_id(service)},
-            'LoadBalancerAlgorithm': {'DictionaryItemId': _load_balancer_algorithm_id(lb_algorithm)},
+            'Service': self._dict_ref('container_service', service),
+            'LoadBalancerAlgorithm': self._dict_ref('load_balancer_algorithm', lb_algorithm),
             'IsSSLUsed': ssl,
             'IsProxyCache': proxy_cache,
             'MasterServiceId': master_id,
             'PortNumber': port,
-            'SessionType': {'DictionaryItemId': _session_type_id(session)},
-            'IPVersion': {'DictionaryItemId': _ip_version_id(ip_version)},
-            'AutoScalingType': {'DictionaryItemId': _autoscaling_id(autoscaling)},
+            'SessionType': self._dict_ref('session_type', session),
+            'IPVersion': self._dict_ref('ip_version', ip_version),
+            'AutoScalingType': self._dict_ref('autoscaling', autoscaling),
             'IsServiceCheckAvailable': healthcheck
         }, virtualMachinesId=vm_ids)
         return result
@@ -1019,20 +1366,21 @@ class OktawaveApi(object):
         self.logon()
         if lb_algorithm == 'least_response_time' and service != 'HTTP' and service != 'HTTPS':
             raise OktawaveLRTNotAllowed()
+        c_simple_call = BackgroundCall(self._container_simple, container_id)
         c = self.clients.call('GetContainer', containerId=container_id)
-        c_simple = self._container_simple(container_id)
+        c_simple = c_simple_call.result()
         c['ContainerName'] = name
         c['IsLoadBalancer'] = load_balancer
-        c['Service'] = {'DictionaryItemId': _container_service_id(service)}
-        c['LoadBalancerAlgorithm'] = {'DictionaryItemId': _load_balancer_algorithm_id(lb_algorithm)}
+        c['Service'] = self._dict_ref('container_service', service)
+        c['LoadBalancerAlgorithm'] = self._dict_ref('load_balancer_algorithm', lb_algorithm)
         c['IsSSLUsed'] = ssl
         c['IsProxyCache'] = proxy_cache
         c['MasterServiceId'] = master_id
         c['PortNumber'] = port
-        c['SessionType'] = {'DictionaryItemId': _session_type_id(session)}
-        c['IPVersion'] = {'DictionaryItemId': _ip_version_id(ip_version)}
-        c['AutoScalingType'] = {'DictionaryItemId': _autoscaling_id(autoscaling)}
-        c['AutoScalingTypeDictId'] = _autoscaling_id(autoscaling)
+        c['SessionType'] = self._dict_ref('session_type', session)
+        c['IPVersion'] = self._dict_ref('ip_version', ip_version)
+        c['AutoScalingType'] = self._dict_ref('autoscaling', autoscaling)
+        c['AutoScalingTypeDictId'] = self.dictionaries.id_of('autoscaling', autoscaling)
         c['IsServiceCheckAvailable'] = healthcheck
         self._d(c)
         self.clients.call('UpdateContainer', container=c,
@@ -1052,8 +1400,9 @@ class OktawaveApi(object):
 
     def OPN_Get(self, opn_id):
         self.logon()
+        vms_call = self.clients.call_async('GetVirtualMachineVlansByVlanId', vlanId=opn_id, clientId=self.client_id)
         v = self.clients.call('GetVlanById', vlanId=opn_id, clientId=self.client_id)
-        vms = self.clients.call('GetVirtualMachineVlansByVlanId', vlanId=opn_id, clientId=self.client_id)
+        vms = vms_call.result()
         return {
             'id': v['VlanId'],
             'name': v['VlanName'],
@@ -1067,7 +1416,7 @@ class OktawaveApi(object):
         self._d(self.client_object)
         return self.clients.call('CreateVlan', vlan={
             'VlanName': name,
-            'AddressPool': {'DictionaryItemId': _address_pool_id(address_pool)},
+            'AddressPool': self._dict_ref('address_pool', address_pool),
             'OwnerClient': self.client_object['Client'],
             'PaymentType': {'DictionaryItemId': DICT['OPN_PAYMENT_ID']},
             'CreationUserId': self.client_id
@@ -1079,8 +1428,9 @@ class OktawaveApi(object):
 
     def OPN_AddOCI(self, opn_id, oci_id, ip_address):
         self.logon()
+        vlan_call = self.clients.call_async('GetVlanById', vlanId=opn_id, clientId=self.client_id)
         oci = self.clients.call('GetVirtualMachineById', virtualMachineId=oci_id, clientId=self.client_id)
-        vlan = self.clients.call('GetVlanById', vlanId=opn_id, clientId=self.client_id)
+        vlan = vlan_call.result()
         for opn in oci['PrivateIpv4']:
             if opn['Vlan']['VlanId'] == opn_id:
                 raise OktawaveOCIInOPN()
@@ -1111,8 +1461,3 @@ class OktawaveApi(object):
         vlan['VlanName'] = name
         return self.clients.call('UpdateVlan', vlan=vlan)
 
-
-class OCSConnection(Connection):
-    def __init__(self, username, password):
-        super(OCSConnection, self).__init__(
-            'https://ocs-pl.oktawave.com/auth/v1.0', username, password)
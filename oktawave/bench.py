@@ -0,0 +1,219 @@
+"""Performance checks for oktawave-cli
+
+Run with: python -m oktawave.bench COMMAND
+"""
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from time import time
+
+import click
+
+# modules which must not be loaded just to parse the command line or show help
+HEAVY_MODULES = ('requests', 'swiftclient', 'prettytable')
+
+# maximum time (in seconds) of oktawave-cli --help in a fresh interpreter
+STARTUP_BUDGET = 0.25
+
+# directory containing the oktawave package, for running it in subprocesses
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STARTUP_SCRIPT = """
+import sys
+sys.argv = ['oktawave-cli'] + sys.argv[1:]
+from oktawave.cli import cli
+try:
+    cli(prog_name='oktawave-cli')
+except SystemExit:
+    pass
+loaded = [m for m in sys.modules if sys.modules[m] is not None and m.startswith(%r)]
+sys.stderr.write(' '.join(sorted(loaded)))
+"""
+
+# fleet size the expected numbers of round trips below are for
+BASELINE_VMS = 1000
+
+# round trips of logging in, made by commands run with --cold only
+LOGON_ROUND_TRIPS = 1
+
+# read-only commands timed by "commands", with IDs existing in the fake fleet:
+# (command line, API round trips with a reused session, time budget in seconds
+# without API latency; the latency of every expected round trip is added)
+BENCH_COMMANDS = [
+    (('Account', 'Settings'), 1, 1.0),
+    (('Account', 'RunningJobs'), 1, 1.0),
+    (('Account', 'Users'), 1, 1.0),
+    (('OCI', 'List'), 1, 1.0),
+    (('OCI', 'ListDetails'), 1, 2.5),
+    (('OCI', 'Settings', '1'), 1, 1.0),
+    (('OCI', 'Logs', '1'), 1, 1.0),
+    (('OCI', 'Classes'), 1, 1.0),
+    (('OCI', 'Subregions'), 1, 1.0),
+    (('OCI', 'TemplateCategories'), 1, 1.0),
+    (('OVS', 'List'), 1, 2.5),
+    (('ORDB', 'List'), 1, 1.0),
+    (('ORDB', 'Settings', '10'), 1, 1.0),
+    (('Container', 'List'), 1, 1.0),
+    (('Container', 'Get', '1'), 2, 1.0),
+    (('OPN', 'List'), 1, 1.0),
+    (('OPN', 'Get', '1'), 2, 1.0),
+]
+
+# runs the CLI directly, without forwarding to a running agent
+CLI_SCRIPT = """
+import sys
+sys.argv = ['oktawave-cli'] + sys.argv[1:]
+from oktawave.cli import cli
+cli(prog_name='oktawave-cli')
+"""
+
+
+def measure_startup(args, runs):
+    """Runs oktawave-cli in fresh interpreters, returns (best time, heavy modules loaded)"""
+    script = STARTUP_SCRIPT % (HEAVY_MODULES,)
+    best = None
+    loaded = []
+    for _ in xrange(runs):
+        start = time()
+        proc = subprocess.Popen([sys.executable, '-c', script] + list(args),
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=PACKAGE_ROOT)
+        _out, err = proc.communicate()
+        elapsed = time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+        loaded = err.split()
+    return best, loaded
+
+
+def check_result(result, round_trips, seconds, latency, warm):
+    """Returns the reasons why a benchmark result (see commands) is a regression"""
+    if not warm:
+        round_trips += LOGON_ROUND_TRIPS
+    budget = seconds + round_trips * latency
+    failures = []
+    if result['round_trips'] > round_trips:
+        failures.append('{0} round trips, expected {1}'.format(result['round_trips'], round_trips))
+    if result['seconds'] > budget:
+        failures.append('{0:.3f}s, budget {1:.3f}s'.format(result['seconds'], budget))
+    return failures
+
+
+def run_command(server, config_dir, args, warm):
+    """Runs one CLI command against the fake server, returns (seconds, API calls per method)"""
+    if not warm:
+        shutil.rmtree(config_dir, ignore_errors=True)
+        os.mkdir(config_dir)
+    cli_args = ['-c', os.path.join(config_dir, 'config'), '-u', 'bench', '-p', 'bench', '--api-url', server.url]
+    if not warm:
+        cli_args += ['--session-ttl', '0', '--name-cache-ttl', '0']
+    server.reset_calls()
+    start = time()
+    proc = subprocess.Popen([sys.executable, '-c', CLI_SCRIPT] + cli_args + list(args),
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    _out, err = proc.communicate()
+    elapsed = time() - start
+    if proc.returncode != 0:
+        raise click.ClickException('oktawave-cli {0} failed:\n{1}'.format(' '.join(args), err))
+    return elapsed, server.reset_calls()
+
+
+@click.group()
+def bench():
+    pass
+
+
+@bench.command()
+@click.option('--budget', help='Maximum startup time in seconds', type=float, default=STARTUP_BUDGET,
+              show_default=True)
+@click.option('--runs', help='Number of runs (the best one counts)', type=click.IntRange(min=1), default=5,
+              show_default=True)
+@click.argument('args', nargs=-1)
+def startup(budget, runs, args):
+    """Check that "oktawave-cli ARGS" (default: --help) starts fast enough"""
+    args = args or ('--help',)
+    best, loaded = measure_startup(args, runs)
+    print 'oktawave-cli {0}: {1:.3f}s (budget {2:.3f}s)'.format(' '.join(args), best, budget)
+    failed = False
+    if loaded:
+        print 'FAILED: heavy modules imported at startup: {0}'.format(', '.join(loaded))
+        failed = True
+    if best > budget:
+        print 'FAILED: startup time over budget'
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+@bench.command()
+@click.option('--vms', help='Number of instances in the fake fleet', type=click.IntRange(min=10),
+              default=BASELINE_VMS, show_default=True)
+@click.option('--latency', help='Delay of every API call in seconds', type=float, default=0.02, show_default=True)
+@click.option('--runs', help='Number of runs of each command (the best one counts)', type=click.IntRange(min=1),
+              default=3, show_default=True)
+@click.option('--warm/--cold', help='Reuse the login session and caches between runs', default=False,
+              show_default=True)
+@click.option('--json', 'json_file', help='Also write the results to a JSON file', type=click.File('w'))
+@click.argument('commands', nargs=-1)
+def commands(vms, latency, runs, warm, json_file, commands):
+    """Time CLI commands (default: all read-only ones) against a fake API server
+
+    Each command is run in a fresh interpreter; reported are the best wall
+    time and the number of API round trips it made. Select commands by
+    group or "group command", e.g.: OCI "OVS List"
+
+    With the default fleet size, the exit status is 1 if a command makes
+    more round trips than expected or takes longer than its time budget.
+    """
+    from oktawave import fakeserver
+
+    selected = [entry for entry in BENCH_COMMANDS
+                if not commands or entry[0][0] in commands or ' '.join(entry[0][:2]) in commands]
+    if not selected:
+        raise click.UsageError('No such benchmark command')
+    server = fakeserver.start(latency=latency, vms=vms)
+    config_dir = tempfile.mkdtemp(prefix='oktawave-bench-')
+    results = []
+    try:
+        for args, round_trips, seconds in selected:
+            if warm:
+                run_command(server, config_dir, args, warm)
+            best = None
+            for _ in xrange(runs):
+                elapsed, calls = run_command(server, config_dir, args, warm)
+                if best is None or elapsed < best[0]:
+                    best = elapsed, calls
+            result = {
+                'command': ' '.join(args),
+                'seconds': round(best[0], 4),
+                'round_trips': sum(best[1].values()),
+                'calls': best[1],
+            }
+            if vms == BASELINE_VMS:
+                result['failures'] = check_result(result, round_trips, seconds, latency, warm)
+            results.append(result)
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(config_dir, ignore_errors=True)
+
+    print '{0} instances, {1:.3f}s API latency, {2} cache'.format(vms, latency, 'warm' if warm else 'cold')
+    width = max(len(result['command']) for result in results)
+    for result in results:
+        line = '{0:<{width}}  {1:7.3f}s  {2:4d} round trips'.format(
+            result['command'], result['seconds'], result['round_trips'], width=width)
+        if result.get('failures'):
+            line += '  FAILED: ' + '; '.join(result['failures'])
+        print line
+    if json_file is not None:
+        json.dump({'vms': vms, 'latency': latency, 'warm': warm, 'results': results}, json_file, indent=2)
+    if vms != BASELINE_VMS:
+        print 'No expected values for {0} instances, not checked'.format(vms)
+    elif any(result['failures'] for result in results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    bench()
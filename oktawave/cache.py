@@ -0,0 +1,230 @@
+import hashlib
+import json
+import os
+import tempfile
+from time import time
+
+
+class FileCache(object):
+    """Small JSON-backed key/value store with per-entry expiry
+
+    The whole store lives in a single file, which is rewritten atomically
+    on every change. It is meant for small amounts of data shared between
+    CLI invocations (sessions, lookup tables), not for bulk storage.
+    """
+
+    def __init__(self, path, ttl):
+        """Initialize the cache
+
+        Arguments:
+        - path (string) - location of the cache file
+        - ttl (int) - entry lifetime in seconds, 0 disables the cache
+        """
+        self.path = path
+        self.ttl = ttl
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (IOError, OSError, ValueError):
+            return {}
+        if not isinstance(data, dict):
+            return {}
+        return data
+
+    def _save(self, data):
+        dir_name = os.path.dirname(self.path) or '.'
+        try:
+            if not os.path.isdir(dir_name):
+                os.makedirs(dir_name, 0700)
+            fd, tmp_path = tempfile.mkstemp(dir=dir_name, prefix='.tmp-')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f)
+            os.rename(tmp_path, self.path)
+        except (IOError, OSError):
+            # the cache is only an optimization, never fail because of it
+            pass
+
+    def get(self, key):
+        """Returns the value stored under key or None if missing or expired"""
+        if not self.ttl:
+            return None
+        entry = self._load().get(key)
+        if entry is None:
+            return None
+        if entry['expires'] < time():
+            self.delete(key)
+            return None
+        return entry['value']
+
+    def set(self, key, value):
+        if not self.ttl:
+            return
+        now = time()
+        data = dict((k, v) for k, v in self._load().items() if v['expires'] >= now)
+        data[key] = {
+            'expires': now + self.ttl,
+            'value': value,
+        }
+        self._save(data)
+
+    def delete(self, key):
+        data = self._load()
+        if data.pop(key, None) is not None:
+            self._save(data)
+
+    def delete_prefix(self, prefix):
+        """Deletes all entries with keys starting with prefix"""
+        data = self._load()
+        keys = [key for key in data if key.startswith(prefix)]
+        if keys:
+            for key in keys:
+                del data[key]
+            self._save(data)
+
+
+class ListingCache(object):
+    """Directory of cached OCS listings, evicted by total size
+
+    Every listing is a file of JSON lines: the validators it was stored
+    with (e.g. object count and size of the container) and the time it was
+    stored, followed by one listing entry per line, so neither storing nor
+    reading a listing needs to keep it in memory. When the files take more
+    than max_size bytes, the least recently used ones are removed.
+
+    Validators do not change when e.g. an object is replaced by another
+    one of the same size, so listings older than max_age are not used.
+    """
+
+    def __init__(self, path, max_size, max_age=300):
+        """Initialize the cache
+
+        Arguments:
+        - path (string) - directory keeping the listings
+        - max_size (int) - maximum total size in bytes, 0 disables the cache
+        - max_age (int) - listing lifetime in seconds, 0 disables the cache
+        """
+        self.path = path
+        self.max_size = max_size
+        self.max_age = max_age
+
+    @staticmethod
+    def _digest(text):
+        if isinstance(text, unicode):
+            text = text.encode('utf-8')
+        return hashlib.md5(text).hexdigest()
+
+    def _file(self, group, key):
+        return os.path.join(self.path, '{0}-{1}.jsonl'.format(self._digest(group), self._digest(key)))
+
+    def get(self, group, key, validators):
+        """Returns an iterator over the listing stored under group and key
+
+        Returns None if there is no such listing, it has been stored with
+        different validators or more than max_age seconds ago.
+        """
+        if not (self.max_size and self.max_age):
+            return None
+        path = self._file(group, key)
+        try:
+            f = open(path)
+            header = json.loads(f.readline())
+            if (not isinstance(header, dict) or header.get('validators') != validators or
+                    header.get('stored', 0) < time() - self.max_age):
+                f.close()
+                return None
+            # mark as recently used
+            os.utime(path, None)
+        except (IOError, OSError, ValueError):
+            return None
+        return self._read(f)
+
+    @staticmethod
+    def _read(f):
+        with f:
+            for line in f:
+                yield json.loads(line)
+
+    def store(self, group, key, validators, entries):
+        """Yields entries, storing them as the listing under group and key
+
+        The listing is only stored when entries are exhausted and if it
+        fits in the cache.
+        """
+        if not (self.max_size and self.max_age):
+            for entry in entries:
+                yield entry
+            return
+        f = tmp_path = None
+        try:
+            if not os.path.isdir(self.path):
+                os.makedirs(self.path, 0700)
+            fd, tmp_path = tempfile.mkstemp(dir=self.path, prefix='.tmp-')
+            f = os.fdopen(fd, 'w')
+            f.write(json.dumps({'validators': validators, 'stored': time()}) + '\n')
+        except (IOError, OSError):
+            # the cache is only an optimization, never fail because of it
+            f = None
+        try:
+            for entry in entries:
+                if f is not None:
+                    try:
+                        f.write(json.dumps(entry) + '\n')
+                        too_big = f.tell() > self.max_size
+                    except (IOError, OSError):
+                        too_big = True
+                    if too_big:
+                        f.close()
+                        f = None
+                yield entry
+            if f is not None:
+                f.close()
+                try:
+                    os.rename(tmp_path, self._file(group, key))
+                    tmp_path = None
+                    self._evict()
+                except OSError:
+                    pass
+        finally:
+            if f is not None and not f.closed:
+                f.close()
+            if tmp_path is not None:
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
+
+    def invalidate(self, group):
+        """Removes all listings stored under group"""
+        if not self.max_size:
+            return
+        prefix = self._digest(group) + '-'
+        try:
+            for name in os.listdir(self.path):
+                if name.startswith(prefix):
+                    os.unlink(os.path.join(self.path, name))
+        except OSError:
+            pass
+
+    def _evict(self):
+        files = []
+        for name in os.listdir(self.path):
+            if name.startswith('.tmp-'):
+                # being written by another invocation
+                continue
+            path = os.path.join(self.path, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _mtime, size, _path in files)
+        for _mtime, size, path in sorted(files):
+            if total <= self.max_size:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            total -= size
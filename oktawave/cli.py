@@ -1,21 +1,36 @@
-from ConfigParser import RawConfigParser, NoSectionError
 import os
+import sys
 
 import click
 
-from oktawave.commands.account import Account
-from oktawave.commands.container import Container
-from oktawave.commands.context import OktawaveCliContext, pass_context
-from oktawave.commands.oci import OCI
-from oktawave.commands.ocs import OCS
-from oktawave.commands.opn import OPN
-from oktawave.commands.ordb import ORDB
-from oktawave.commands.ovs import OVS
+from oktawave import agent as agent_client
+from oktawave.cache import FileCache, ListingCache
+from oktawave.commands.context import LazyGroup, OktawaveCliContext, pass_context
+from oktawave.config import read_credentials
+from oktawave.printer import PRINTERS
 
 VERSION = '0.9.0'
 
+# API dictionaries (OCI classes, OVS tiers etc.) change very rarely
+DICTIONARY_CACHE_TTL = 24 * 3600
 
-@click.group()
+# command modules are only imported when their command is run,
+# so that e.g. --help does not pay for loading all of them
+COMMANDS = {
+    'Account': ('oktawave.commands.account', 'Show account information'),
+    'OCI': ('oktawave.commands.oci', 'Manage OCI instances'),
+    'OCS': ('oktawave.commands.ocs', 'Manage OCS containers'),
+    'OVS': ('oktawave.commands.ovs', 'Manage OVS volumes'),
+    'ORDB': ('oktawave.commands.ordb', 'Manage database instances and logical databases'),
+    'Container': ('oktawave.commands.container', 'Manage instance containers'),
+    'OPN': ('oktawave.commands.opn', 'Manage private networks'),
+    'batch': ('oktawave.commands.batch', 'Run many commands from a file, one per line'),
+    'shell': ('oktawave.commands.shell', 'Interactive shell keeping the session and caches between commands'),
+    'agent': ('oktawave.commands.agent', 'Keep a logged in session and run commands for other invocations'),
+}
+
+
+@click.group(cls=LazyGroup, lazy_commands=COMMANDS)
 @click.option('-c', '--config', help='Specify configuration file', type=click.Path(dir_okay=False),
               default=os.path.expanduser('~/.oktawave-cli/config'))
 @click.option('-d', '--debug/--no-debug', help='Debug output')
@@ -23,40 +38,62 @@ VERSION = '0.9.0'
 @click.option('-p', '--password', help='Oktawave password', required=False)
 @click.option('-ocsu', '--ocs-username', help='OCS username', required=False)
 @click.option('-ocsp', '--ocs-password', help='OCS password', required=False)
+@click.option('--api-url', help='Oktawave API server [default: https://api.oktawave.com]', metavar='URL')
+@click.option('--session-ttl', help='Reuse Oktawave login session for this many seconds (0 to disable)',
+              type=click.IntRange(min=0), default=3600, show_default=True)
+@click.option('--pool-size', help='Maximum number of pooled HTTP connections to the Oktawave API',
+              type=click.IntRange(min=1), default=4, show_default=True)
+@click.option('--name-cache-ttl', help='Remember name to ID mappings for this many seconds (0 to disable)',
+              type=click.IntRange(min=0), default=60, show_default=True)
+@click.option('--listing-cache-size', help='Size of the cache of OCS listings in MB (0 to disable)',
+              type=click.IntRange(min=0), default=64, show_default=True)
+@click.option('--listing-cache-ttl', help='Reuse cached OCS listings for at most this many seconds (0 to disable)',
+              type=click.IntRange(min=0), default=300, show_default=True)
+@click.option('--stats', help='Print statistics of API calls (count, time, bytes) to stderr at exit', is_flag=True)
+@click.option('--stats-file', help='Write statistics of API calls as JSON to this file', type=click.File('w'))
+@click.option('--format', 'output_format', help='Output format of tables (table is for humans)',
+              type=click.Choice(list(PRINTERS)), default='table', show_default=True)
 @click.version_option(VERSION)
 @pass_context
-def cli(ctx, config=None, username=None, password=None, ocs_username=None, ocs_password=None, debug=False):
-    cp = {}
+def cli(ctx, config=None, username=None, password=None, ocs_username=None, ocs_password=None, debug=False,
+        api_url=None, session_ttl=3600, pool_size=4, name_cache_ttl=60, listing_cache_size=64,
+        listing_cache_ttl=300, stats=False, stats_file=None, output_format='table'):
+    assert isinstance(ctx, OktawaveCliContext)
+    credentials = read_credentials(config, username, password, ocs_username, ocs_password)
+    config_dir = os.path.dirname(config)
+    session_store = FileCache(os.path.join(config_dir, 'session'), session_ttl)
+    dictionary_store = FileCache(os.path.join(config_dir, 'dictionaries'), DICTIONARY_CACHE_TTL)
+    ctx.credentials = credentials
+    ctx.init_output(output_format=output_format)
+    call_stats = None
+    if stats or stats_file is not None:
+        from oktawave.client import CallStats
+        call_stats = CallStats()
+        click.get_current_context().call_on_close(lambda: ctx.print_call_stats(stats_file, show=stats))
+    ctx.init_api(credentials['api_username'], credentials['api_password'], debug, session_store, pool_size,
+                 dictionary_store, api_url, call_stats)
+    ctx.init_ocs(credentials['ocs_username'], credentials['ocs_password'],
+                 ListingCache(os.path.join(config_dir, 'listings'), listing_cache_size * 1024 * 1024,
+                              listing_cache_ttl))
+    ctx.init_names(FileCache(os.path.join(config_dir, 'names'), name_cache_ttl))
+    if debug:
+        click.get_current_context().call_on_close(ctx.print_pool_stats)
 
-    def get_config_value(section, key, override):
-        if override:
-            return override
-        if 'cp' not in cp:
-            cp['cp'] = RawConfigParser()
-            cp['cp'].read(config)
-        return cp['cp'].get(section, key)
 
-    assert isinstance(ctx, OktawaveCliContext)
-    api_username = get_config_value('Auth', 'username', username)
-    api_password = get_config_value('Auth', 'password', password)
-    if os.path.exists(config):
-        try:
-            ocs_username = get_config_value('OCS', 'username', ocs_username)
-            ocs_password = get_config_value('OCS', 'password', ocs_password)
-        except NoSectionError:
-            pass
-    ctx.init_output()
-    ctx.init_api(api_username, api_password, debug)
-    ctx.init_ocs(ocs_username, ocs_password)
-
-
-cli.add_command(Account)
-cli.add_command(OCI)
-cli.add_command(OCS)
-cli.add_command(OVS)
-cli.add_command(ORDB)
-cli.add_command(Container)
-cli.add_command(OPN)
+@cli.resultcallback()
+def exit_status(rv, **kwargs):
+    """Commands reporting an error return 1, make it the exit status"""
+    if isinstance(rv, int) and rv:
+        click.get_current_context().exit(rv)
 
-if __name__ == '__main__':
+
+def main():
+    """Console script entry point: uses a running agent if possible"""
+    rv = agent_client.forward(sys.argv[1:])
+    if rv is not None:
+        sys.exit(rv)
     cli()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,12 @@
+import codecs
 import json
 import datetime
 import pprint
-
-import requests
+import re
+import socket
+import sys
+import threading
+from time import time
 
 from oktawave.exceptions import OktawaveAPIError, OktawaveAccessDenied, OktawaveFault
 
@@ -31,34 +35,415 @@ def raise_api_error(fault_text):
         raise OktawaveFault(error_msg.text)
 
 
+class BackgroundCall(object):
+    """Runs a function in a separate thread; result() waits for it
+
+    Exceptions raised by the function are re-raised by result(), with
+    the original traceback.
+    """
+
+    def __init__(self, func, *args, **kwargs):
+        self._result = None
+        self._exc_info = None
+        self._thread = threading.Thread(target=self._run, args=(func, args, kwargs))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self, func, args, kwargs):
+        try:
+            self._result = func(*args, **kwargs)
+        except BaseException:
+            self._exc_info = sys.exc_info()
+
+    def done(self):
+        return not self._thread.is_alive()
+
+    def result(self):
+        self._thread.join()
+        if self._exc_info is not None:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+        return self._result
+
+
+# set on every pooled socket
+SOCKET_OPTIONS = [
+    (socket.IPPROTO_TCP, socket.TCP_NODELAY, 1),
+    (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+]
+
+
+class HttpTransport(object):
+    """HTTP connection pool shared by all API service clients
+
+    CommonService and ClientsService live on the same host, so a single
+    pool lets them reuse warm (TLS) connections.
+    """
+
+    def __init__(self, username, password, pool_size=4):
+        # requests takes a while to import, only load it when really needed
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        session = requests.session()
+        adapter = HTTPAdapter(pool_maxsize=pool_size)
+        adapter.poolmanager.connection_pool_kw['socket_options'] = SOCKET_OPTIONS
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.auth = ('API\\' + username, password)
+        session.headers.update(**{'Content-Type': 'text/json', 'Connection': 'keep-alive'})
+        self.session = session
+        self.adapter = adapter
+        self.pool_size = pool_size
+
+    def post(self, url, data, stream=False):
+        return self.session.post(url, data=data, stream=stream)
+
+    def stats(self):
+        """Returns a list of per-host connection pool statistics"""
+        res = []
+        pools = self.adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools[key]
+            res.append({
+                'host': '{0}://{1}:{2}'.format(pool.scheme, pool.host, pool.port),
+                'connections_opened': pool.num_connections,
+                'requests': pool.num_requests,
+                'idle_connections': len([c for c in pool.pool.queue if c is not None]) if pool.pool is not None else 0,
+                'pool_size': self.pool_size,
+            })
+        return res
+
+
+class ResultsStream(object):
+    """Incremental parser yielding items of the "_results" list of a JSON document
+
+    Feed it decoded text with feed() as it arrives; it returns the items
+    completed so far. Only the item being currently parsed is kept in memory.
+    A JSON string cannot contain an unescaped quote, so the "_results" key
+    can be searched for in the raw text. The "_totalCount" found before or
+    after the list is available as total_count (None if not seen yet).
+    """
+
+    RESULTS_RE = re.compile(r'"_results"\s*:\s*\[')
+    # the number must be followed by something, it might continue in the next chunk
+    TOTAL_COUNT_RE = re.compile(r'"_totalCount"\s*:\s*(\d+)\D')
+    WHITESPACE = ' \t\r\n'
+
+    def __init__(self):
+        self.buf = u''
+        self.started = False
+        self.finished = False
+        self.total_count = None
+        self.decoder = json.JSONDecoder()
+
+    def _scan_total_count(self, text):
+        if self.total_count is None:
+            match = self.TOTAL_COUNT_RE.search(text)
+            if match is not None:
+                self.total_count = int(match.group(1))
+
+    def feed(self, text):
+        """Adds a chunk of text, returns a list of complete items"""
+        if self.finished:
+            self.buf += text
+            self._scan_total_count(self.buf)
+            self.buf = self.buf[-64:]
+            return []
+        self.buf += text
+        if not self.started:
+            match = self.RESULTS_RE.search(self.buf)
+            if match is None:
+                self._scan_total_count(self.buf)
+                # keep enough to match a key split between chunks
+                self.buf = self.buf[-64:]
+                return []
+            self._scan_total_count(self.buf[:match.start()])
+            self.started = True
+            self.buf = self.buf[match.end():]
+
+        items = []
+        pos = 0
+        buf = self.buf
+        while True:
+            while pos < len(buf) and (buf[pos] in self.WHITESPACE or buf[pos] == ','):
+                pos += 1
+            if pos == len(buf):
+                break
+            if buf[pos] == ']':
+                self.finished = True
+                pos += 1
+                break
+            try:
+                item, end = self.decoder.raw_decode(buf, pos)
+            except ValueError:
+                # incomplete item, wait for more data
+                break
+            if end == len(buf) and not isinstance(item, (dict, list)):
+                # a number (or literal) might continue in the next chunk
+                break
+            items.append(item)
+            pos = end
+        self.buf = buf[pos:]
+        if self.finished:
+            self._scan_total_count(self.buf)
+        return items
+
+
+def _percentile(values, percent):
+    """Nearest-rank percentile of a sorted list"""
+    return values[max(0, int(len(values) * percent / 100.0 + 0.5) - 1)]
+
+
+class CallStats(object):
+    """Per-method statistics of API calls, an ApiClient call hook
+
+    Thread safe, so calls made with call_async() are counted as well.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.methods = {}
+
+    def __call__(self, method, seconds, request_bytes, response_bytes, decode_seconds, error):
+        with self.lock:
+            stats = self.methods.get(method)
+            if stats is None:
+                stats = self.methods[method] = {
+                    'times': [],
+                    'errors': 0,
+                    'request_bytes': 0,
+                    'response_bytes': 0,
+                    'decode_seconds': 0.0,
+                }
+            stats['times'].append(seconds)
+            stats['request_bytes'] += request_bytes
+            stats['response_bytes'] += response_bytes
+            stats['decode_seconds'] += decode_seconds
+            if error is not None:
+                stats['errors'] += 1
+
+    def summary(self):
+        """Returns a list of per-method dicts, slowest methods (in total) first"""
+        res = []
+        with self.lock:
+            for method, stats in self.methods.items():
+                times = sorted(stats['times'])
+                res.append({
+                    'method': method,
+                    'calls': len(times),
+                    'errors': stats['errors'],
+                    'total_seconds': sum(times),
+                    'p50_seconds': _percentile(times, 50),
+                    'p90_seconds': _percentile(times, 90),
+                    'p99_seconds': _percentile(times, 99),
+                    'max_seconds': times[-1],
+                    'decode_seconds': stats['decode_seconds'],
+                    'request_bytes': stats['request_bytes'],
+                    'response_bytes': stats['response_bytes'],
+                })
+        res.sort(key=lambda row: row['total_seconds'], reverse=True)
+        return res
+
+
+class CallMemo(object):
+    """Responses of read-only API calls made during one command
+
+    Shared by the clients of an OktawaveApi. A Get* method called again with
+    the same arguments gets the remembered response instead of another round
+    trip. Any other method (Update*, Create*, Delete*, TurnOn*...) may change
+    anything, so it makes the memo forget everything.
+    """
+    # read-only methods whose results change by themselves
+    VOLATILE_METHODS = frozenset(['GetRunningOperations'])
+    # methods which never change anything
+    READ_ONLY_PREFIXES = ('Get', 'Is')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.responses = {}
+
+    def key(self, url, method, kwargs):
+        """Returns the memo key of a call, None if the call must not be memoized"""
+        if not method.startswith('Get') or method in self.VOLATILE_METHODS:
+            return None
+        return url, method, json.dumps(kwargs, sort_keys=True)
+
+    def changes_data(self, method):
+        return not method.startswith(self.READ_ONLY_PREFIXES)
+
+    def get(self, key):
+        with self.lock:
+            return self.responses.get(key)
+
+    def set(self, key, content):
+        with self.lock:
+            self.responses[key] = content
+
+    def clear(self):
+        with self.lock:
+            self.responses.clear()
+
+
 class ApiClient(object):
-    def __init__(self, url, username, password, debug=False):
+    """Client of an Oktawave API service
+
+    Every call is reported to each of call_hooks as
+    hook(method, seconds, request_bytes, response_bytes, decode_seconds, error),
+    error being the exception raised by the call or None (see CallStats).
+    Calls answered from memo (a CallMemo) are not reported.
+    """
+    STREAM_CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, url, username, password, debug=False, on_access_denied=None, transport=None,
+                 call_hooks=(), memo=None):
         if not url.endswith('/'):
             url += '/'
         self.url = url
-        session = requests.session()
-        session.auth = ('API\\' + username, password)
-        session.headers.update(**{'Content-Type': 'text/json'})
-        self.session = session
+        if transport is None:
+            transport = HttpTransport(username, password)
+        self.transport = transport
+        self.session = transport.session
         self.debug = debug
+        self.on_access_denied = on_access_denied
+        self.call_hooks = list(call_hooks)
+        self.memo = memo
+
+    def _check_response(self, resp):
+        """Raises the error of a failed call, calling on_access_denied first if access was denied"""
+        try:
+            if resp.status_code == 500:
+                raise_api_error(resp.content)
+            resp.raise_for_status()
+        except Exception as e:
+            denied = isinstance(e, OktawaveAccessDenied) or resp.status_code in (401, 403)
+            if denied and self.on_access_denied is not None:
+                self.on_access_denied()
+            raise
+
+    def _report_call(self, method, seconds, request_bytes, response_bytes, decode_seconds, error):
+        for hook in self.call_hooks:
+            hook(method, seconds, request_bytes, response_bytes, decode_seconds, error)
+
+    @staticmethod
+    def _result(parsed):
+        if len(parsed) == 1:
+            return parsed.values().pop()
+        return parsed
 
     def call(self, method, **kwargs):
         req = kwargs
-        resp = self.session.post(self.url + method, data=json.dumps(req))
-        if self.debug:
-            print '-- request to %s%s --' % (self.url, method)
-            pprint.pprint(req)
-            print '-- response --'
-            pprint.pprint(resp.content)
-        if resp.status_code == 500:
-            raise_api_error(resp.content)
-        resp.raise_for_status()
-        parsed = resp.json()
+        memo_key = None
+        if self.memo is not None:
+            memo_key = self.memo.key(self.url, method, req)
+            content = self.memo.get(memo_key) if memo_key is not None else None
+            if content is not None:
+                # decoding again is cheaper than a deep copy and
+                # callers may modify the result as they like
+                if self.debug:
+                    print '-- memoized response to %s%s --' % (self.url, method)
+                return self._result(json.loads(content))
+        data = json.dumps(req)
+        start = time()
+        resp = None
+        decode_seconds = 0.0
+        error = None
+        try:
+            resp = self.transport.post(self.url + method, data=data)
+            if self.debug:
+                print '-- request to %s%s --' % (self.url, method)
+                pprint.pprint(req)
+                print '-- response --'
+                pprint.pprint(resp.content)
+            self._check_response(resp)
+            decode_start = time()
+            parsed = resp.json()
+            decode_seconds = time() - decode_start
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            if self.call_hooks:
+                self._report_call(method, time() - start, len(data), len(resp.content) if resp is not None else 0,
+                                  decode_seconds, error)
+            if self.memo is not None and self.memo.changes_data(method):
+                # even a failed call might have changed something
+                self.memo.clear()
+        if memo_key is not None:
+            self.memo.set(memo_key, resp.content)
         if self.debug:
             pprint.pprint(parsed)
-        if len(parsed) == 1:
-            return parsed.values().pop()
-        return parsed
+        return self._result(parsed)
+
+    def call_results(self, method, parser=None, **kwargs):
+        """Calls a method returning a paged list, yields its "_results" items
+
+        The response is parsed while it is being received, so the first items
+        are available before the whole (possibly multi-megabyte) body arrives
+        and memory use does not depend on the number of results. Pass a
+        ResultsStream as parser to read its total_count afterwards.
+        """
+        if parser is None:
+            parser = ResultsStream()
+        if self.debug:
+            # dump whole responses, as call() does
+            data = self.call(method, **kwargs)
+            parser.total_count = (data or {}).get('_totalCount')
+            for item in (data or {}).get('_results') or []:
+                yield item
+            return
+
+        data = json.dumps(kwargs)
+        start = time()
+        # time the consumer of the items spends between them does not count
+        paused = 0.0
+        pause_start = None
+        response_bytes = 0
+        decode_seconds = 0.0
+        error = None
+        resp = None
+        try:
+            resp = self.transport.post(self.url + method, data=data, stream=True)
+            self._check_response(resp)
+            text_decoder = codecs.getincrementaldecoder('utf-8')()
+            # read the body to the end even after the list, so that
+            # the connection can go back to the pool
+            for chunk in resp.iter_content(self.STREAM_CHUNK_SIZE):
+                response_bytes += len(chunk)
+                decode_start = time()
+                items = parser.feed(text_decoder.decode(chunk))
+                decode_seconds += time() - decode_start
+                for item in items:
+                    pause_start = time()
+                    yield item
+                    paused += time() - pause_start
+                    pause_start = None
+            parser.feed(text_decoder.decode('', final=True))
+            if parser.started and not parser.finished:
+                raise ValueError('Truncated response to {0}'.format(method))
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            if resp is not None:
+                resp.close()
+            if self.call_hooks:
+                if pause_start is not None:
+                    # the consumer stopped iterating early
+                    paused += time() - pause_start
+                if resp is not None and resp.status_code == 500:
+                    response_bytes = len(resp.content)
+                self._report_call(method, time() - start - paused, len(data), response_bytes, decode_seconds,
+                                  error)
+
+    def call_async(self, method, **kwargs):
+        """Starts an API call in the background, returns a BackgroundCall
+
+        Use it to issue independent calls concurrently, e.g.:
+            vm = client.call_async('GetVirtualMachineById', ...)
+            vlan = client.call_async('GetVlanById', ...)
+            vm, vlan = vm.result(), vlan.result()
+        """
+        return BackgroundCall(self.call, method, **kwargs)
 
     @classmethod
     def parse_date(cls, value):
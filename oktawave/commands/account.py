@@ -45,7 +45,7 @@ def Account_RunningJobs(ctx):
     if not ctx.print_table(
             ['Operation ID', 'Started at', 'Started by', 'Operation type', 'Object', 'Progress', 'Status'],
             ops, fmt):
-        print "No running operations"
+        ctx.p.print_str("No running operations")
 
 
 @Account.command(name='Users')
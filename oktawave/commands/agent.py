@@ -0,0 +1,161 @@
+import base64
+import os
+import signal
+import socket
+import sys
+
+import click
+
+from oktawave.agent import default_socket_path, read_message, send_message, connect
+from oktawave.commands.context import pass_context
+from oktawave.commands.runner import EXEC_COMMANDS, RUNNER_COMMANDS, command_path, install_output_router, \
+    run_captured
+from oktawave.config import read_credentials
+
+CREDENTIAL_PARAMS = frozenset(['config', 'username', 'password', 'ocs_username', 'ocs_password'])
+
+# seconds a client may keep the (serial) agent waiting for its request
+CLIENT_TIMEOUT = 10.0
+
+
+class SocketOutput(object):
+    """File-like object streaming written bytes to an agent client
+
+    The bytes are sent base64-encoded as the key message field ('out' for
+    stdout, 'err' for stderr), so binary output (e.g. OCS Get -o -) and
+    multibyte characters split between writes reach the client unchanged.
+    Unicode text is encoded as UTF-8.
+    """
+
+    def __init__(self, f, key='out'):
+        self.f = f
+        self.key = key
+
+    def write(self, text):
+        if isinstance(text, unicode):
+            text = text.encode('utf-8')
+        if text:
+            send_message(self.f, **{self.key: base64.b64encode(text)})
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def flush(self):
+        self.f.flush()
+
+    def isatty(self):
+        return False
+
+
+def accept_request(root_ctx, argv):
+    """Checks whether a client's command line can run in this agent
+
+    Returns (args, None) with the command line stripped of global
+    options, or (None, reason) if the client should run it by itself.
+    """
+    try:
+        client_ctx = root_ctx.command.make_context(root_ctx.info_name, list(argv), resilient_parsing=True)
+    except click.ClickException:
+        return None, 'invalid command line'
+    args = client_ctx.protected_args + client_ctx.args
+    if not args:
+        return None, 'no command'
+    if args[0] in RUNNER_COMMANDS or command_path(args) in EXEC_COMMANDS:
+        return None, 'command not supported by agent'
+    if '--help' in args:
+        return None, 'help requested'
+
+    params = dict(client_ctx.params)
+    for param in root_ctx.command.params:
+        # resilient parsing does not fill in default values
+        if params.get(param.name) is None:
+            params[param.name] = param.get_default(client_ctx)
+    for key, value in root_ctx.params.items():
+        if key not in CREDENTIAL_PARAMS and params.get(key) != value:
+            return None, 'different value of {0}'.format(key)
+    credentials = read_credentials(params['config'], params['username'], params['password'],
+                                   params['ocs_username'], params['ocs_password'])
+    if credentials != root_ctx.obj.credentials:
+        return None, 'different credentials'
+    return args, None
+
+
+def handle_connection(root_ctx, conn, router):
+    conn.settimeout(CLIENT_TIMEOUT)
+    f = conn.makefile('r+b')
+    send_message(f, ready=True)
+    request = read_message(f)
+    if not request:
+        return
+    # the output may be piped into a slow reader (e.g. less), do not abort the command
+    conn.settimeout(None)
+    cwd = os.getcwd()
+    try:
+        try:
+            os.chdir(request['cwd'])
+        except OSError:
+            send_message(f, fallback='no access to working directory')
+            return
+        args, reason = accept_request(root_ctx, request['argv'])
+        if args is None:
+            send_message(f, fallback=reason)
+            return
+        send_message(f, accepted=True)
+        root_ctx.obj.forget_names()
+        result = run_captured(root_ctx, args, router=router, output=SocketOutput(f),
+                              errors=SocketOutput(f, 'err'))
+        send_message(f, exit=result.exit_code)
+    finally:
+        os.chdir(cwd)
+
+
+def listen(path):
+    """Creates the agent's listening socket, removing stale socket files"""
+    if connect(path) is not None:
+        raise click.ClickException('another agent is already listening on {0}'.format(path))
+    if os.path.exists(path):
+        os.unlink(path)
+    dir_name = os.path.dirname(path)
+    if dir_name and not os.path.isdir(dir_name):
+        os.makedirs(dir_name, 0700)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    old_umask = os.umask(0077)
+    try:
+        server.bind(path)
+    finally:
+        os.umask(old_umask)
+    server.listen(16)
+    return server
+
+
+@click.command(name='agent', epilog="""
+    While the agent is running, oktawave-cli invocations using the same
+    credentials and options forward their commands to it instead of
+    logging in by themselves. Set OKTAWAVE_CLI_NO_AGENT=1 to disable that.
+    """)
+@click.option('--socket', 'socket_path', metavar='PATH',
+              help='Unix socket to listen on [default: ~/.oktawave-cli/agent.sock]')
+@pass_context
+def agent(ctx, socket_path):
+    """Keep a logged in session and run commands for other invocations"""
+    root_ctx = click.get_current_context().find_root()
+    path = socket_path or default_socket_path()
+    server = listen(path)
+    router = install_output_router(ctx)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    print >> sys.stderr, 'oktawave-cli agent listening on {0}'.format(path)
+    try:
+        while True:
+            conn, _addr = server.accept()
+            try:
+                handle_connection(root_ctx, conn, router)
+            except socket.error:
+                pass
+            finally:
+                conn.close()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        os.unlink(path)
@@ -0,0 +1,110 @@
+import shlex
+import sys
+import threading
+from time import time
+
+import click
+
+from oktawave.commands.context import pass_context
+from oktawave.commands.runner import install_output_router, run_captured
+
+
+def read_batch(f):
+    """Parses a batch file into stages
+
+    Every stage is a list of (line number, arguments) tuples. Lines in
+    a stage are independent of each other; a line containing just "wait"
+    ends the stage. Empty lines and lines starting with # are ignored.
+    """
+    stages = [[]]
+    for lineno, line in enumerate(f, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if line == 'wait':
+            stages.append([])
+            continue
+        try:
+            args = shlex.split(line)
+        except ValueError as e:
+            raise click.BadParameter('line {0}: {1}'.format(lineno, e), param_hint='FILE')
+        stages[-1].append((lineno, args))
+    return [stage for stage in stages if stage]
+
+
+def run_stage(root_ctx, stage, jobs, router, report):
+    """Runs lines of a stage, at most jobs at a time
+
+    report(lineno, result) is called for every line, in line order.
+    """
+    if jobs == 1 or len(stage) == 1:
+        for lineno, args in stage:
+            report(lineno, run_captured(root_ctx, args, router=router))
+        return
+
+    results = [None] * len(stage)
+    cond = threading.Condition()
+    pending = iter(list(enumerate(stage)))
+
+    def worker():
+        while True:
+            with cond:
+                try:
+                    i, (_lineno, args) = next(pending)
+                except StopIteration:
+                    return
+            result = run_captured(root_ctx, args, router=router)
+            with cond:
+                results[i] = result
+                cond.notify_all()
+
+    for _ in xrange(min(jobs, len(stage))):
+        t = threading.Thread(target=worker)
+        t.daemon = True
+        t.start()
+
+    for i, (lineno, _args) in enumerate(stage):
+        with cond:
+            while results[i] is None:
+                # a timeout keeps the main thread responsive to Ctrl-C
+                cond.wait(0.1)
+        report(lineno, results[i])
+
+
+@click.command(name='batch', epilog="""
+    Lines are independent and may run concurrently (see --jobs); a line
+    containing just "wait" makes the following lines wait for all previous
+    ones to finish. Empty lines and lines starting with # are ignored.
+    """)
+@click.argument('batch_file', metavar='FILE|-', type=click.File('r'))
+@click.option('-j', '--jobs', help='Number of lines to run concurrently',
+              type=click.IntRange(min=1), default=1, show_default=True)
+@pass_context
+def batch(ctx, batch_file, jobs):
+    """Run many commands from a file, one per line (e.g. "OCI List")"""
+    root_ctx = click.get_current_context().find_root()
+    stages = read_batch(batch_file)
+    router = install_output_router(ctx)
+    output = router.default
+    counts = {'ok': 0, 'failed': 0}
+    start = time()
+
+    def report(lineno, result):
+        output.write(result.output)
+        output.flush()
+        if result.ok:
+            counts['ok'] += 1
+            status = result.status
+        else:
+            counts['failed'] += 1
+            status = '{0} ({1})'.format(result.status, result.error)
+        print >> sys.stderr, '[line {0}] {1} in {2:.3f}s: {3}'.format(
+            lineno, status, result.elapsed, ' '.join(result.args))
+
+    for stage in stages:
+        run_stage(root_ctx, stage, jobs, router, report)
+
+    print >> sys.stderr, '{0} commands, {1} failed, {2:.3f}s total'.format(
+        counts['ok'] + counts['failed'], counts['failed'], time() - start)
+    if counts['failed']:
+        sys.exit(1)
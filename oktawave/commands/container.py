@@ -114,7 +114,7 @@ def Container_Get(ctx, container_id):
 
     ctx.p.print_str('\nAttached OCIs')
     ctx.print_table(
-        ['ID', 'Name', 'Status'], oci_list, fmt_oci)
+        ['ID', 'Name', 'Status'], oci_list, fmt_oci, secondary=True)
 
 
 @Container.command()
@@ -143,6 +143,7 @@ def Container_AddOCI(ctx, container_id, oci_id):
 def Container_Delete(ctx, container_id):
     """Delete a container"""
     ctx.api.Container_Delete(container_id)
+    ctx.invalidate_names()
     print "OK"
 
 
@@ -163,6 +164,7 @@ def Container_Create(ctx, name, load_balancer, service, port, proxy_cache, use_s
         use_ssl, healthcheck, mysql_master_id, session_persistence,
         load_balancer_algorithm, ip_version, autoscaling
     )
+    ctx.invalidate_names()
     print "OK, new container ID: " + str(container_id) + "."
 
 
@@ -184,5 +186,6 @@ def Container_Edit(ctx, container_id, name, load_balancer, service, port, proxy_
         use_ssl, healthcheck, mysql_master_id, session_persistence,
         load_balancer_algorithm, ip_version, autoscaling
     )
+    ctx.invalidate_names()
     print "OK"
 
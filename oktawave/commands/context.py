@@ -1,41 +1,206 @@
+import importlib
 import inspect
+import json
+import pprint
 import sys
+import threading
 import click
 # noinspection PyProtectedMember
 from click.decorators import _param_memo
-from oktawave.api import OktawaveApi, OCSConnection
 from oktawave.exceptions import OktawaveLoginError
-from oktawave.printer import Printer
+from oktawave.printer import PRINTERS
 
 
 class OktawaveCliContext(object):
     p = None
-    api = None
-    ocs = None
     config = None
+    credentials = None
+    _api = None
+    _api_args = None
+    call_stats = None
+    _ocs = None
+    _ocs_args = None
+    ocs_listings = None
+    _name_store = None
+    _name_indexes = None
 
-    def init_output(self, output=sys.stdout):
-        self.p = Printer(output)
+    def init_output(self, output=sys.stdout, output_format='table'):
+        self.p = PRINTERS[output_format](output)
 
-    def init_api(self, api_username, api_password, debug=False):
-        self.api = OktawaveApi(
+    def init_api(self, api_username, api_password, debug=False, session_store=None, pool_size=4,
+                 dictionary_store=None, api_url=None, call_stats=None):
+        """Prepares Oktawave API access; logon is deferred until ctx.api is first used
+
+        call_stats (a CallStats) collects statistics of all API calls.
+        """
+        self._api = None
+        self._api_lock = threading.Lock()
+        self.call_stats = call_stats
+        self._api_args = dict(
             username=api_username, password=api_password,
-            debug=debug)
+            debug=debug, session_store=session_store, pool_size=pool_size,
+            dictionary_store=dictionary_store, api_url=api_url,
+            call_hooks=[call_stats] if call_stats is not None else [])
+
+    def init_ocs(self, ocs_username, ocs_password, listing_cache=None):
+        """Prepares OCS access; the connection is created when ctx.ocs is first used
+
+        listing_cache (a ListingCache) keeps account and container listings
+        between invocations.
+        """
+        self._ocs = None
+        self._ocs_args = dict(username=ocs_username, password=ocs_password)
+        self.ocs_listings = listing_cache
+
+    def ocs_changed(self, container):
+        """Forgets cached listings of a container modified by this invocation
+
+        Overwriting an object with one of the same size is invisible to
+        the validation of cached listings.
+        """
+        if self.ocs_listings is not None:
+            from oktawave.ocs import forget_listings
+            forget_listings(self.ocs, self.ocs_listings, container)
+
+    def init_names(self, name_store=None):
+        """Prepares name->id indexes used by NamedItemParam
+
+        Indexes are shared by all parameters within this context and,
+        if name_store (a FileCache) is given, between invocations.
+        """
+        self._name_store = name_store
+        self._name_indexes = {}
+        self._names_lock = threading.Lock()
+
+    def _name_store_key(self, label=''):
+        """Keys name indexes by user and API endpoint, like sessions and dictionaries"""
+        from oktawave.api import API_URL
+        username = api_url = None
+        if self._api_args:
+            username = self._api_args['username']
+            api_url = self._api_args['api_url']
+        return u'{0}@{1}:{2}'.format(username, (api_url or API_URL).rstrip('/'), label)
+
+    def name_index(self, param, refresh=False):
+        """Returns a dict mapping names of param's items to lists of their IDs
+
+        Returns (index, fresh) where fresh tells whether the index has been
+        downloaded from the API during this invocation.
+        """
+        if self._name_indexes is None:
+            self.init_names()
+        label = param.label
+        with self._names_lock:
+            cached = self._name_indexes.get(label)
+            if cached is not None and (cached[1] or not refresh):
+                return cached
+            if not refresh and self._name_store is not None:
+                index = self._name_store.get(self._name_store_key(label))
+                if index is not None:
+                    cached = self._name_indexes[label] = (index, False)
+                    return cached
+            index = {}
+            for item_id, item_name in param.list_items(self.api):
+                index.setdefault(item_name, []).append(item_id)
+            if self._name_store is not None:
+                self._name_store.set(self._name_store_key(label), index)
+            cached = self._name_indexes[label] = (index, True)
+            return cached
+
+    def invalidate_names(self):
+        """Forgets all name indexes, to be called after creating, renaming or deleting items"""
+        if self._name_indexes is None:
+            self.init_names()
+        with self._names_lock:
+            if self._name_store is not None:
+                self._name_store.delete_prefix(self._name_store_key())
+            self._name_indexes.clear()
+
+    def forget_names(self):
+        """Makes the next command look up names again, like a separate invocation would
+
+        Long-lived contexts (shell, agent) call this before each command, so
+        that items created, renamed or deleted elsewhere are noticed. Indexes
+        kept in the name store remain valid for their TTL.
+        """
+        if self._name_indexes is None:
+            return
+        with self._names_lock:
+            self._name_indexes.clear()
+
+    @property
+    def api(self):
+        if self._api is None and self._api_args is not None:
+            # concurrent batch jobs must not log on separately
+            with self._api_lock:
+                if self._api is None:
+                    self._api = self._create_api()
+        return self._api
+
+    def _create_api(self):
+        if not self._api_args['username'] or not self._api_args['password']:
+            print "ERROR: Oktawave username and password required (use -u/-p or the config file)."
+            sys.exit(1)
+        from oktawave.api import OktawaveApi
+        api = OktawaveApi(**self._api_args)
         try:
-            self.api.logon(only_common=False)
+            api.logon(only_common=False)
         except OktawaveLoginError:
             print "ERROR: Couldn't login to Oktawave."
             sys.exit(1)
+        return api
 
-    def init_ocs(self, ocs_username, ocs_password):
-        self.ocs = OCSConnection(username=ocs_username, password=ocs_password)
+    def forget_api_calls(self):
+        """Makes the next command fetch fresh data, see CallMemo"""
+        if self._api is not None:
+            self._api.forget_calls()
 
-    def print_table(self, head, results, mapper_func):
-        items = map(mapper_func, results)
-        if items:
-            self.p.print_table([head] + items)
-            return True
-        return False
+    @property
+    def ocs(self):
+        if self._ocs is None and self._ocs_args is not None:
+            from oktawave.ocs import OCSConnection
+            self._ocs = OCSConnection(**self._ocs_args)
+        return self._ocs
+
+    def print_pool_stats(self):
+        if self._api is None:
+            return
+        print '-- HTTP connection pools --'
+        pprint.pprint(self._api.pool_stats())
+
+    def print_call_stats(self, stats_file=None, show=True):
+        """Prints API call statistics to stderr and/or writes them as JSON to stats_file"""
+        summary = self.call_stats.summary()
+        if stats_file is not None:
+            json.dump(summary, stats_file, indent=2)
+            stats_file.write('\n')
+        if not show:
+            return
+        print >> sys.stderr, '-- API calls --'
+        if not summary:
+            print >> sys.stderr, 'No API calls'
+            return
+        rows = [(
+            row['method'], row['calls'], row['errors'],
+            '{0:.3f}'.format(row['total_seconds']),
+            '{0:.3f}/{1:.3f}/{2:.3f}'.format(row['p50_seconds'], row['p90_seconds'], row['p99_seconds']),
+            '{0:.3f}'.format(row['decode_seconds']),
+            row['request_bytes'], row['response_bytes'],
+        ) for row in summary]
+        rows.append((
+            'Total', sum(row['calls'] for row in summary), sum(row['errors'] for row in summary),
+            '{0:.3f}'.format(sum(row['total_seconds'] for row in summary)), '',
+            '{0:.3f}'.format(sum(row['decode_seconds'] for row in summary)),
+            sum(row['request_bytes'] for row in summary), sum(row['response_bytes'] for row in summary),
+        ))
+        PRINTERS['table'](sys.stderr).print_table_stream(
+            ['Method', 'Calls', 'Errors', 'Time (s)', 'p50/p90/p99 (s)', 'Decode (s)', 'Sent (B)', 'Received (B)'],
+            rows, hmarg=0)
+
+    def print_table(self, head, results, mapper_func, secondary=False):
+        """Prints a table of results, row by row as they are generated"""
+        rows = (mapper_func(item) for item in results)
+        return self.p.print_table_stream(head, rows, secondary=secondary) > 0
 
 
 pass_context = click.make_pass_decorator(OktawaveCliContext, ensure=True)
@@ -56,17 +221,17 @@ class NamedItemParam(click.ParamType):
             pass
 
         assert isinstance(ctx.obj, OktawaveCliContext)
-        found_item_id = None
-        for item_id, item_name in self.list_items(ctx.obj.api):
-            if item_name == value:
-                if found_item_id is not None:
-                    self.fail('Duplicate {0} "{1}" found'.format(self.label, value))
-                found_item_id = item_id
-
-        if found_item_id is None:
+        index, fresh = ctx.obj.name_index(self)
+        if value not in index and not fresh:
+            index, fresh = ctx.obj.name_index(self, refresh=True)
+
+        item_ids = index.get(value)
+        if not item_ids:
             self.fail('{0} "{1}" not found'.format(self.label, value))
+        if len(item_ids) > 1:
+            self.fail('Duplicate {0} "{1}" found'.format(self.label, value))
 
-        return found_item_id
+        return item_ids[0]
 
 
 # noinspection PyShadowingBuiltins
@@ -99,6 +264,23 @@ def positional_option(*param_decls, **attrs):
     return decorator
 
 
+def paging_options(f):
+    """Adds --limit and --page-size options for commands listing search results"""
+    from oktawave.api import OktawaveApi
+    f = click.option('--page-size', help='Number of items fetched in a single API request',
+                     type=click.IntRange(min=1), default=OktawaveApi.PAGE_SIZE, show_default=True)(f)
+    f = click.option('--limit', help='Show at most this many items', type=click.IntRange(min=1))(f)
+    return f
+
+
+def wait_options(f):
+    """Adds --wait and --timeout options for commands starting asynchronous operations"""
+    f = click.option('--timeout', help='Give up waiting after this many seconds (with --wait)',
+                     type=click.FloatRange(min=0))(f)
+    f = click.option('--wait', help='Wait until the started operations finish', is_flag=True)(f)
+    return f
+
+
 class OktawaveCliCommand(click.Command):
 
     def format_help(self, ctx, formatter):
@@ -141,3 +323,43 @@ class OktawaveCliGroup(click.Group):
         return decorator
     pass
 
+
+class LazyGroup(click.Group):
+    """Group importing the modules of its subcommands only when they are used
+
+    lazy_commands maps command names to (module name, short help) tuples;
+    the command object is the module attribute named like the command.
+    Listing commands (e.g. in --help) uses the short help and imports nothing.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.lazy_commands = kwargs.pop('lazy_commands', {})
+        super(LazyGroup, self).__init__(*args, **kwargs)
+
+    def list_commands(self, ctx):
+        return sorted(set(self.commands) | set(self.lazy_commands))
+
+    def get_command(self, ctx, cmd_name):
+        if cmd_name not in self.commands and cmd_name in self.lazy_commands:
+            module_name, _short_help = self.lazy_commands[cmd_name]
+            module = importlib.import_module(module_name)
+            self.add_command(getattr(module, cmd_name))
+        return self.commands.get(cmd_name)
+
+    def format_commands(self, ctx, formatter):
+        limit = formatter.width - 6 - max(len(name) for name in self.list_commands(ctx))
+        rows = []
+        for name in self.list_commands(ctx):
+            if name in self.commands:
+                cmd = self.commands[name]
+                if getattr(cmd, 'hidden', False):
+                    continue
+                short_help = cmd.get_short_help_str(limit) if hasattr(cmd, 'get_short_help_str') \
+                    else cmd.short_help or ''
+            else:
+                short_help = click.utils.make_default_short_help(self.lazy_commands[name][1], limit)
+            rows.append((name, short_help))
+        if rows:
+            with formatter.section('Commands'):
+                formatter.write_dl(rows)
+
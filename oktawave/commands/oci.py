@@ -3,8 +3,10 @@ import os
 import click
 
 from oktawave.api import TemplateType, CloneType
-from oktawave.commands.context import pass_context, NamedItemParam, positional_option, OktawaveCliGroup
-from oktawave.commands.util import show_template_category, show_oci_logs, show_oci_settings, show_template_info
+from oktawave.commands.context import pass_context, NamedItemParam, positional_option, OktawaveCliGroup, \
+    paging_options, wait_options
+from oktawave.commands.util import show_template_category, show_oci_logs, show_oci_settings, show_template_info, \
+    oci_name, wait_for_operations
 from oktawave.exceptions import OktawaveOCIClassNotFound
 
 
@@ -131,10 +133,11 @@ def OCI_List(ctx):
 
 
 @OCI.command()
+@paging_options
 @pass_context
-def OCI_ListDetails(ctx):
+def OCI_ListDetails(ctx, limit, page_size):
     """List virtual machines with more detail"""
-    vms = ctx.api.OCI_ListDetails()
+    vms = ctx.api.OCI_ListDetails(page_size, limit)
 
     def fmt(vm):
         return [vm['id'], vm['name'], vm['status'], vm['class_name'],
@@ -163,10 +166,13 @@ def OCI_TurnOff(ctx, oci_id):
 
 @OCI.command()
 @oci_id_param('oci_id')
+@wait_options
 @pass_context
-def OCI_TurnOn(ctx, oci_id):
+def OCI_TurnOn(ctx, oci_id, wait=False, timeout=None):
     """Turn on a VM"""
     ctx.api.OCI_TurnOn(oci_id)
+    if wait:
+        return wait_for_operations(ctx, timeout, oci_name(ctx, oci_id))
 
 
 @OCI.command()
@@ -175,14 +181,16 @@ def OCI_TurnOn(ctx, oci_id):
 def OCI_Delete(ctx, oci_id):
     """Delete a VM"""
     ctx.api.OCI_Delete(oci_id)
+    ctx.invalidate_names()
 
 
 @OCI.command()
 @oci_id_param('oci_id')
+@paging_options
 @pass_context
-def OCI_Logs(ctx, oci_id):
+def OCI_Logs(ctx, oci_id, limit, page_size):
     """Show virtual machine logs"""
-    show_oci_logs(ctx, oci_id)
+    show_oci_logs(ctx, oci_id, page_size, limit)
 
 
 @OCI.command()
@@ -213,14 +221,20 @@ def OCI_Subregions(ctx):
 @subregion_param('--subregion')
 @click.option('--disk-size', required=False, type=click.INT, metavar='SIZE',
               help='Disk size in GB (optional, defaults to template minimum)')
+@wait_options
 @pass_context
-def OCI_Create(ctx, name, template, oci_class=None, subregion='Auto', forced_type='Machine', db_type=None, disk_size=None):
+def OCI_Create(ctx, name, template, oci_class=None, subregion='Auto', forced_type='Machine', db_type=None, disk_size=None,
+               wait=False, timeout=None):
     """Creates a new instance from template"""
     forced_type = getattr(TemplateType, forced_type)
     try:
         ctx.api.OCI_Create(name, template, oci_class, forced_type, db_type, subregion, disk_size, ip_address_id=None)
     except OktawaveOCIClassNotFound:
         print "OCI class not found"
+    else:
+        ctx.invalidate_names()
+        if wait:
+            return wait_for_operations(ctx, timeout, name)
 
 
 @OCI.command()
@@ -266,11 +280,15 @@ def OCI_ChangeClass(ctx, oci_id, oci_class, restart):
 @oci_id_param('oci_id')
 @positional_option('name', help='new OCI name')
 @positional_option('clone_type', type=click.Choice(['Runtime', 'AbsoluteCopy']))
+@wait_options
 @pass_context
-def OCI_Clone(ctx, oci_id, name, clone_type):
+def OCI_Clone(ctx, oci_id, name, clone_type, wait=False, timeout=None):
     """Clone a VM"""
     clone_type = getattr(CloneType, clone_type)
     ctx.api.OCI_Clone(oci_id, name, clone_type)
+    ctx.invalidate_names()
+    if wait:
+        return wait_for_operations(ctx, timeout, name)
 
 
 @OCI.command()
@@ -1,3 +1,7 @@
+import itertools
+import os
+import sys
+
 import click
 from oktawave.commands.context import pass_context, OktawaveCliGroup, positional_option
 
@@ -28,23 +32,43 @@ def swift_object_type(data):
     return data['content_type']
 
 
-def list_swift_objects(ctx, container, cname, path=None):
+def list_swift_objects(ctx, cname, path=None, recursive=False):
+    from oktawave.ocs import ClientException, cached_listing
+
     if path is None:
         path = ''
     elif not path.endswith('/'):
         path += '/'
-    container = container[1]
 
+    entries = cached_listing(ctx.ocs, ctx.ocs_listings, cname, prefix=path or None,
+                             delimiter=None if recursive else '/')
+    first = next(entries, None)
     if path:
-        for d in container:
-            if d['content_type'] == 'application/directory' and d['name'] + '/' == path:
-                print 'Directory content:'
-                break
-        else:
-            print "No such container/directory!"
-            return
+        if first is None:
+            # an empty directory only exists as its marker object
+            try:
+                headers = ctx.ocs.head_object(cname, path[:-1])
+            except ClientException:
+                headers = {}
+            if headers.get('content-type') != 'application/directory':
+                ctx.p.print_str("No such container/directory!")
+                return
+        ctx.p.print_str('Directory content:')
     else:
-        print 'Container content:'
+        ctx.p.print_str('Container content:')
+
+    def entries_with_dirs():
+        """Directories are listed either as marker objects or subdir entries, show them once"""
+        last_dir = None
+        for entry in itertools.chain([first] if first is not None else [], entries):
+            if 'subdir' in entry:
+                if entry['subdir'] != last_dir:
+                    yield {'name': entry['subdir'].rstrip('/'), 'content_type': 'application/directory',
+                           'bytes': '', 'last_modified': ''}
+                continue
+            if entry['content_type'] == 'application/directory':
+                last_dir = entry['name'] + '/'
+            yield entry
 
     def fmt_file(swift_obj):
         return [
@@ -56,7 +80,7 @@ def list_swift_objects(ctx, container, cname, path=None):
 
     ctx.print_table(
         ['Full path', 'Type', 'Size in bytes', 'Last modified'],
-        sorted([o for o in container if o['name'].startswith(path)], key=lambda row: row['name']),
+        entries_with_dirs(),
         fmt_file)
 
 
@@ -65,7 +89,7 @@ def print_swift_file(ctx, data):
     ctype = headers['content-type']
 
     if ctype == 'application/directory':
-        print '<DIRECTORY>'
+        ctx.p.print_str('<DIRECTORY>')
     elif ctype == 'application/object':
         attrs = dict((key[len('x-object-meta-'):], headers[key])
                      for key in headers if key.startswith('x-object-meta-'))
@@ -86,7 +110,9 @@ def OCS():
 @pass_context
 def OCS_ListContainers(self):
     """List OCS containers"""
-    headers, containers = self.ocs.get_account()
+    from oktawave.ocs import cached_listing
+
+    containers = cached_listing(self.ocs, self.ocs_listings)
     self.p.print_hash_table(
         dict((o['name'], [o['count'], o['bytes']]) for o in containers),
         ['Container name', 'Objects count', 'Size in bytes']
@@ -96,24 +122,45 @@ def OCS_ListContainers(self):
 @OCS.command(epilog="Container and path may be specified as a single argument as container/path")
 @container_param('container')
 @path_param('path', required=False)
+@click.option('-r', '--recursive', is_flag=True, help='List contents of subdirectories too')
 @pass_context
-def OCS_List(ctx, container, path):
+def OCS_List(ctx, container, path, recursive):
     """List content of a directory or container"""
     container, path = ocs_split_params(container, path)
-    obj = ctx.ocs.get_container(
-        container)  # TODO: perhaps we can optimize it not to download the whole container when not necessary
-    list_swift_objects(ctx, obj, container, path)
+    list_swift_objects(ctx, container, path, recursive)
 
 
-@OCS.command(epilog="Container and path may be specified as a single argument as container/path")
+@OCS.command(epilog="""
+    Container and path may be specified as a single argument as
+    container/path. With --output, objects are downloaded in byte ranges,
+    several at a time; running the same download again after a failure
+    only fetches the missing ranges.
+    """)
 @container_param('container')
 @path_param('path', required=False)
+@click.option('-o', '--output', type=click.Path(dir_okay=False, allow_dash=True),
+              help='Save the object to a file (- for standard output)')
+@click.option('--range-size', help='Size of ranges downloaded at a time in MB', type=click.IntRange(min=1),
+              default=64, show_default=True)
+@click.option('-j', '--jobs', help='Number of ranges to download concurrently', type=click.IntRange(min=1),
+              default=4, show_default=True)
 @pass_context
-def OCS_Get(ctx, container, path):
+def OCS_Get(ctx, container, path, output, range_size, jobs):
     """Get an object or file"""
     container, path = ocs_split_params(container, path)
+    if output is not None:
+        if path is None:
+            raise click.UsageError('--output requires an object path')
+        from oktawave.ocs import download_object, stream_object
+
+        if output == '-':
+            stream_object(ctx.ocs, container, path, click.get_binary_stream('stdout'))
+        else:
+            download_object(ctx.ocs, container, path, output, range_size * 1024 * 1024, jobs)
+            print "OK"
+        return
     if path is None:
-        headers, contents = ctx.ocs.get_container(container)
+        headers = ctx.ocs.head_container(container)
         ctx.p.print_hash_table(
             {
                 '1 Container name': [container],
@@ -134,33 +181,145 @@ def OCS_CreateContainer(ctx, name):
     print "OK"
 
 
-@OCS.command()
+@OCS.command(epilog="""
+    Files larger than the segment size are uploaded in segments, several
+    at a time, and stored as a static large object. Running the same
+    upload again after a failure only uploads the missing segments.
+    """)
 @container_param('container')
 @path_param('path')
-@positional_option('local_path', type=click.File('rb'), help='file to upload')
+@positional_option('local_path', type=click.Path(exists=True, dir_okay=False, allow_dash=True),
+                   help='file to upload (- for standard input)')
+@click.option('--segment-size', help='Segment size in MB', type=click.IntRange(min=1), default=100,
+              show_default=True)
+@click.option('-j', '--jobs', help='Number of segments to upload concurrently', type=click.IntRange(min=1),
+              default=4, show_default=True)
+@click.option('--retries', help='Number of retries of a failed segment', type=click.IntRange(min=0),
+              default=3, show_default=True)
 @pass_context
-def OCS_Put(ctx, container, path, local_path):
+def OCS_Put(ctx, container, path, local_path, segment_size, jobs, retries):
     """Upload a file to OCS"""
-    ctx.ocs.put_object(container, path, local_path)
+    segment_size *= 1024 * 1024
+    if local_path == '-':
+        # an iterable is sent chunked, pipes cannot tell their size or seek
+        stdin = click.get_binary_stream('stdin')
+        ctx.ocs.put_object(container, path, iter(lambda: stdin.read(65536), ''))
+        ctx.ocs_changed(container)
+    elif os.path.getsize(local_path) > segment_size:
+        from oktawave.ocs import upload_segmented
+
+        segments = upload_segmented(ctx.ocs, container, path, local_path, segment_size, jobs, retries)
+        ctx.ocs_changed(container)
+        print "OK, {0} segments".format(len(segments))
+        return
+    else:
+        with open(local_path, 'rb') as f:
+            ctx.ocs.put_object(container, path, f)
+        ctx.ocs_changed(container)
     print "OK"
 
 
-@OCS.command(epilog="Container and path may be specified as a single argument as container/path")
+@OCS.command(epilog="""
+    Container and path may be specified as a single argument as
+    container/path. Files are compared by size and MD5 sum; sums of local
+    files are remembered in ~/.oktawave-cli/sync, so unchanged files are
+    not read again.
+    """)
+@positional_option('local_dir', type=click.Path(file_okay=False), help='local directory')
 @container_param('container')
 @path_param('path', required=False)
+@click.option('--download', is_flag=True, help='Copy from OCS to the local directory instead of uploading')
+@click.option('--delete', is_flag=True, help='Delete files which do not exist on the source side')
+@click.option('-n', '--dry-run', is_flag=True, help='Only show what would be transferred and deleted')
+@click.option('--segment-size', help='Segment size of large objects in MB', type=click.IntRange(min=1), default=100,
+              show_default=True)
+@click.option('--range-size', help='Size of ranges downloaded at a time in MB', type=click.IntRange(min=1),
+              default=64, show_default=True)
+@click.option('-j', '--jobs', help='Number of files transferred concurrently', type=click.IntRange(min=1),
+              default=4, show_default=True)
 @pass_context
-def OCS_Delete(ctx, container, path):
+def OCS_Sync(ctx, local_dir, container, path, download, delete, dry_run, segment_size, range_size, jobs):
+    """Synchronize a local directory with OCS"""
+    from oktawave.ocs import sync_download, sync_upload
+
+    container, path = ocs_split_params(container, path)
+    prefix = path.strip('/') + '/' if path else ''
+    segment_size *= 1024 * 1024
+
+    def report(action, name):
+        click.echo(u'{0} {1}'.format(action, name))
+
+    if download:
+        counts = sync_download(ctx.ocs, local_dir, container, prefix, range_size * 1024 * 1024, segment_size,
+                               jobs, delete, dry_run, report)
+    else:
+        if not os.path.isdir(local_dir):
+            raise click.BadParameter('{0} is not a directory'.format(local_dir), param_hint='local_dir')
+        try:
+            counts = sync_upload(ctx.ocs, local_dir, container, prefix, segment_size, jobs, delete, dry_run,
+                                 report)
+        finally:
+            ctx.ocs_changed(container)
+    print "OK, {0} transferred, {1} unchanged, {2} deleted".format(*counts)
+
+
+def report_deleted(deleted):
+    print >> sys.stderr, 'Deleted {0} objects'.format(deleted)
+
+
+@OCS.command(epilog="""
+    Container and path may be specified as a single argument as
+    container/path. With --recursive, objects are deleted in batches while
+    the listing is being read, using bulk deletes if the cluster supports
+    them. Segments of large objects are not deleted.
+    """)
+@container_param('container')
+@path_param('path', required=False)
+@click.option('-r', '--recursive', is_flag=True,
+              help='Delete the directory with all of its content (everything without a path)')
+@click.option('-j', '--jobs', help='Number of concurrent requests without bulk deletes', type=click.IntRange(min=1),
+              default=4, show_default=True)
+@pass_context
+def OCS_Delete(ctx, container, path, recursive, jobs):
     """Delete an object from the container"""
     container, path = ocs_split_params(container, path)
+    if recursive:
+        from oktawave.ocs import delete_objects, delete_tree
+
+        path = path.strip('/') if path else ''
+        try:
+            deleted = delete_tree(ctx.ocs, container, path + '/' if path else None, jobs, report_deleted)
+            if path:
+                # the directory marker, if any
+                deleted += delete_objects(ctx.ocs, container, [path], jobs)
+        finally:
+            ctx.ocs_changed(container)
+        print "OK, {0} objects deleted".format(deleted)
+        return
     ctx.ocs.delete_object(container, path)
+    ctx.ocs_changed(container)
     print "OK"
 
 
-@OCS.command()
+@OCS.command(epilog="""
+    With --force, objects are deleted in batches while the listing is
+    being read, using bulk deletes if the cluster supports them. Segments
+    of large objects (in the <name>_segments container) are not deleted.
+    """)
 @container_param('name')
+@click.option('-f', '--force', is_flag=True, help='Delete all objects in the container first')
+@click.option('-j', '--jobs', help='Number of concurrent requests without bulk deletes', type=click.IntRange(min=1),
+              default=4, show_default=True)
 @pass_context
-def OCS_DeleteContainer(ctx, name):
+def OCS_DeleteContainer(ctx, name, force, jobs):
     """Delete a container"""
-    ctx.ocs.delete_container(name)
+    try:
+        if force:
+            from oktawave.ocs import delete_tree
+
+            delete_tree(ctx.ocs, name, jobs=jobs, report=report_deleted)
+        ctx.ocs.delete_container(name)
+    finally:
+        ctx.ocs_changed(name)
     print "OK"
 
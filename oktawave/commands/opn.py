@@ -69,7 +69,7 @@ def OPN_Get(ctx, opn_id):
         vm['PrivateIpAddress']
     ] for vm in c['vms']])
     ctx.p.print_str('Virtual machines')
-    ctx.p.print_table(vm_tab)
+    ctx.p.print_table(vm_tab, secondary=True)
 
 
 @OPN.command()
@@ -79,6 +79,7 @@ def OPN_Get(ctx, opn_id):
 def OPN_Create(ctx, name, address_pool):
     """Create a new OPN"""
     ctx.api.OPN_Create(name, address_pool)
+    ctx.invalidate_names()
     print "OK"
 
 
@@ -109,6 +110,7 @@ def OPN_RemoveOCI(ctx, opn_id, oci_id):
 def OPN_Delete(ctx, opn_id):
     """Delete a private network"""
     ctx.api.OPN_Delete(opn_id)
+    ctx.invalidate_names()
     print "OK"
 
 
@@ -119,4 +121,5 @@ def OPN_Delete(ctx, opn_id):
 def OPN_Rename(ctx, opn_id, name):
     """Change OPN name"""
     ctx.api.OPN_Rename(opn_id, name)
+    ctx.invalidate_names()
     print "OK"
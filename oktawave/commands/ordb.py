@@ -1,8 +1,10 @@
 import click
 from oktawave.api import CloneType, DICT as OktawaveConstants
-from oktawave.commands.context import NamedItemParam, pass_context, OktawaveCliGroup, positional_option
+from oktawave.commands.context import NamedItemParam, pass_context, OktawaveCliGroup, positional_option, \
+    paging_options, wait_options
 from oktawave.commands.oci import clone_type_param, template_id_param, oci_class_param, subregion_param
-from oktawave.commands.util import show_template_category, show_oci_logs, show_oci_settings, show_template_info
+from oktawave.commands.util import show_oci_logs, show_oci_settings, show_template_info, \
+    oci_name, wait_for_operations
 from oktawave.exceptions import OktawaveORDBInvalidTemplateError
 
 
@@ -34,10 +36,11 @@ def ORDB():
 
 
 @ORDB.command()
+@paging_options
 @pass_context
-def ORDB_List(ctx):
+def ORDB_List(ctx, limit, page_size):
     """List database instances"""
-    dbs = ctx.api.ORDB_List()
+    dbs = ctx.api.ORDB_List(page_size, limit)
 
     def fmt(db):
         return [
@@ -84,16 +87,21 @@ def ORDB_Restart(ctx, ordb_id):
 def ORDB_Delete(ctx, ordb_id, db_name):
     """Delete a logical database or database instance"""
     ctx.api.ORDB_Delete(ordb_id, db_name)
+    if db_name is None:
+        ctx.invalidate_names()
 
 
 @ORDB.command()
 @pass_context
 def ORDB_Templates(ctx):
     """List database VM templates"""
-    print "\nCategory: MySQL"
-    show_template_category(ctx, OktawaveConstants['MYSQL_TEMPLATE_CATEGORY'], 'ORDB')
-    print "Category: PostgreSQL"
-    show_template_category(ctx, OktawaveConstants['POSTGRESQL_TEMPLATE_CATEGORY'], 'ORDB')
+    templates = []
+    for category, category_id in [('MySQL', OktawaveConstants['MYSQL_TEMPLATE_CATEGORY']),
+                                  ('PostgreSQL', OktawaveConstants['POSTGRESQL_TEMPLATE_CATEGORY'])]:
+        found = ctx.api.OCI_Templates(category_id, 'ORDB') or {}
+        templates.extend((template_id, found[template_id], category) for template_id in sorted(found))
+    if not ctx.print_table(['Template ID', 'Template name', 'Category'], templates, list):
+        ctx.p.print_str("No templates found.")
 
 
 @ORDB.command(
@@ -113,22 +121,25 @@ def ORDB_Clone(ctx, ordb_id, name, clone_type):
     """Clone an ORDB instance"""
     clone_type = getattr(CloneType, clone_type)
     ctx.api.OCI_Clone(ordb_id, name, clone_type)
+    ctx.invalidate_names()
 
 
 @ORDB.command()
 @ordb_id_param('ordb_id')
+@paging_options
 @pass_context
-def ORDB_Logs(ctx, ordb_id):
+def ORDB_Logs(ctx, ordb_id, limit, page_size):
     """Show ORDB virtual machine logs"""
-    show_oci_logs(ctx, ordb_id)
+    show_oci_logs(ctx, ordb_id, page_size, limit)
 
 
 @ORDB.command()
 @ordb_id_param('ordb_id')
+@paging_options
 @pass_context
-def ORDB_LogicalDatabases(ctx, ordb_id):
+def ORDB_LogicalDatabases(ctx, ordb_id, limit, page_size):
     """Shows logical databases"""
-    dbs = ctx.api.ORDB_LogicalDatabases(ordb_id)
+    dbs = ctx.api.ORDB_LogicalDatabases(ordb_id, page_size, limit)
 
     def fmt(db):
         return [
@@ -137,8 +148,8 @@ def ORDB_LogicalDatabases(ctx, ordb_id):
             db['type'],
             db['encoding'],
             'Yes' if db['is_running'] else 'No',
-            db['QPS'],
-            db['Size']
+            db['qps'],
+            db['size']
         ]
 
     ctx.print_table(
@@ -159,14 +170,18 @@ def ORDB_Settings(ctx, ordb_id):
 @template_id_param('template', help='template ID (as returned by ORDB Templates)')
 @oci_class_param('oci_class', required=False)
 @subregion_param('--subregion')
+@wait_options
 @pass_context
-def ORDB_Create(ctx, name, template, oci_class, subregion):
+def ORDB_Create(ctx, name, template, oci_class, subregion, wait=False, timeout=None):
     """Create a database VM"""
     try:
         ctx.api.ORDB_Create(name, template, oci_class=oci_class, subregion=subregion)
     except OktawaveORDBInvalidTemplateError:
         print "ERROR: Selected template is not a database template"
         return 1
+    ctx.invalidate_names()
+    if wait:
+        return wait_for_operations(ctx, timeout, name)
 
 
 @ORDB.command()
@@ -204,10 +219,14 @@ def ORDB_CreateLogicalDatabase(ctx, ordb_id, name, encoding):
 @ORDB.command()
 @ordb_id_param('ordb_id')
 @db_name_param('name')
+@wait_options
 @pass_context
-def ORDB_BackupLogicalDatabase(ctx, ordb_id, name):
+def ORDB_BackupLogicalDatabase(ctx, ordb_id, name, wait=False, timeout=None):
     """Create a backup of logical database"""
     ctx.api.ORDB_BackupLogicalDatabase(ordb_id, name)
+    # the operation is reported for the instance, not the logical database
+    if wait and wait_for_operations(ctx, timeout, oci_name(ctx, ordb_id)):
+        return 1
     print "OK"
 
 
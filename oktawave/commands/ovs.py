@@ -1,6 +1,7 @@
 import click
 from oktawave.api import PowerStatus
-from oktawave.commands.context import pass_context, NamedItemParam, OktawaveCliGroup, positional_option
+from oktawave.commands.context import pass_context, NamedItemParam, OktawaveCliGroup, positional_option, \
+    paging_options
 from oktawave.commands.oci import subregion_param, oci_id_param
 from oktawave.exceptions import OktawaveOVSDeleteError, OktawaveOVSMappedError, OktawaveOVSMapError, \
     OktawaveOVSUnmappedError, OktawaveOVSUnmapError, OktawaveOVSTooSmallError
@@ -51,10 +52,11 @@ def OVS():
 
 
 @OVS.command()
+@paging_options
 @pass_context
-def OVS_List(ctx):
+def OVS_List(ctx, limit, page_size):
     """Lists disks"""
-    disks = ctx.api.OVS_List()
+    disks = ctx.api.OVS_List(page_size, limit)
 
     def fmt_mapping(mapping):
         ovs_id = mapping['id']
@@ -97,6 +99,7 @@ def OVS_List(ctx):
 def OVS_Create(ctx, name, capacity, tier, shared, subregion):
     """Add a disk"""
     ctx.api.OVS_Create(name, capacity, tier, shared, subregion)
+    ctx.invalidate_names()
     print "OK"
 
 
@@ -110,6 +113,7 @@ def OVS_Delete(ctx, ovs_id):
     except OktawaveOVSDeleteError:
         print "ERROR: Disk cannot be deleted (is it mapped to any OCI instances?)."
     else:
+        ctx.invalidate_names()
         print "OK"
 
 
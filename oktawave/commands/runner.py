@@ -0,0 +1,198 @@
+import sys
+import threading
+import traceback
+from time import time
+
+import click
+
+# commands replacing the current process, they cannot run inside a batch/agent
+EXEC_COMMANDS = frozenset([
+    ('OCI', 'ping'),
+    ('OCI', 'ssh'),
+    ('OCI', 'ssh_copy_id'),
+])
+
+# commands managing other commands, they cannot be nested
+RUNNER_COMMANDS = frozenset(['agent', 'batch', 'shell'])
+
+# ctx.exit() raises click.exceptions.Exit in click>=7, SystemExit before
+_exit_exceptions = (SystemExit, getattr(click.exceptions, 'Exit', SystemExit))
+
+
+class CapturedOutput(object):
+    """File-like object collecting written text (as UTF-8 encoded str)"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, text):
+        if isinstance(text, unicode):
+            text = text.encode('utf-8')
+        self.chunks.append(text)
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
+
+    def getvalue(self):
+        return ''.join(self.chunks)
+
+
+class OutputRouter(object):
+    """Replacement for sys.stdout that sends each thread's output to its own stream
+
+    Threads which did not redirect their output write to the original stream.
+    """
+
+    def __init__(self, default):
+        self.default = default
+        self._local = threading.local()
+
+    def redirect(self, stream):
+        """Routes output of the current thread to stream (None restores default)"""
+        self._local.stream = stream
+
+    @property
+    def stream(self):
+        return getattr(self._local, 'stream', None) or self.default
+
+    def write(self, text):
+        self.stream.write(text)
+
+    def writelines(self, lines):
+        self.stream.writelines(lines)
+
+    def flush(self):
+        self.stream.flush()
+
+    def isatty(self):
+        return self.stream.isatty()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+_router_lock = threading.Lock()
+
+
+def _install_router(name):
+    stream = getattr(sys, name)
+    if not isinstance(stream, OutputRouter):
+        stream = OutputRouter(stream)
+        setattr(sys, name, stream)
+    return stream
+
+
+def install_output_router(ctx):
+    """Replaces sys.stdout and sys.stderr (and the context's printer streams) with OutputRouters
+
+    Returns the stdout router, with the stderr one as its errors attribute;
+    calling it again returns the already installed ones.
+    """
+    with _router_lock:
+        router = _install_router('stdout')
+        router.errors = _install_router('stderr')
+        if ctx.p is not None:
+            ctx.p.output = router
+            if hasattr(ctx.p, 'messages'):
+                ctx.p.messages = router.errors
+        return router
+
+
+class CommandResult(object):
+    def __init__(self, args, exit_code, output, elapsed, error=None):
+        self.args = args
+        self.exit_code = exit_code
+        self.ok = exit_code == 0
+        self.output = output
+        self.elapsed = elapsed
+        self.error = error
+
+    @property
+    def status(self):
+        return 'OK' if self.ok else 'FAILED'
+
+
+def command_path(args):
+    """Returns (group name, command name) of a command line, as far as known"""
+    names = [arg for arg in args[:2] if not arg.startswith('-')]
+    return tuple(names + [None] * (2 - len(names)))
+
+
+def check_command(root_ctx, args, allow_exec=False):
+    """Raises click.UsageError if a command line must not run inside a runner"""
+    group, command = command_path(args)
+    if group in RUNNER_COMMANDS:
+        raise click.UsageError('{0} cannot be nested'.format(group))
+    if not allow_exec and (group, command) in EXEC_COMMANDS:
+        raise click.UsageError('{0} {1} is only available as a standalone command'.format(group, command))
+
+
+def invoke_args(root_ctx, args):
+    """Runs a command line (list of arguments, without global options)
+
+    The command runs as a subcommand of root_ctx, so it shares its
+    OktawaveCliContext (logon, connection pool, caches) with every other
+    command run this way. Exceptions propagate to the caller.
+    """
+    cmd_name, cmd, rest = root_ctx.command.resolve_command(root_ctx, list(args))
+    with cmd.make_context(cmd_name, rest, parent=root_ctx) as sub_ctx:
+        return cmd.invoke(sub_ctx)
+
+
+def run_captured(root_ctx, args, allow_exec=False, router=None, output=None, errors=None):
+    """Runs a command line, collecting its output and status
+
+    Output goes to output (a new CapturedOutput by default) through the
+    router installed with install_output_router. Error output goes to
+    errors if given, otherwise stderr messages pass through while error
+    messages and tracebacks join the output. Never raises (except for
+    KeyboardInterrupt); failures are reported in the returned CommandResult.
+    """
+    if output is None:
+        output = CapturedOutput()
+    if router is None:
+        router = install_output_router(root_ctx.obj)
+    error_output = output if errors is None else errors
+    exit_code = 1
+    error = None
+    start = time()
+    router.redirect(output)
+    if errors is not None:
+        router.errors.redirect(errors)
+    try:
+        check_command(root_ctx, args, allow_exec)
+        # results of read-only calls are only reused within a command
+        root_ctx.obj.forget_api_calls()
+        exit_code = invoke_args(root_ctx, args) or 0
+    except click.ClickException as e:
+        e.show(file=error_output)
+        exit_code = getattr(e, 'exit_code', 1)
+        error = e.format_message()
+    except click.Abort:
+        error = 'aborted'
+    except _exit_exceptions as e:
+        code = getattr(e, 'exit_code', getattr(e, 'code', None))
+        if code is None or isinstance(code, int):
+            exit_code = code or 0
+        else:
+            # sys.exit('message') prints the message and exits with 1
+            print >> error_output, code
+    except KeyboardInterrupt:
+        raise
+    except Exception as e:
+        error_output.write(traceback.format_exc())
+        error = '{0}: {1}'.format(e.__class__.__name__, e)
+    finally:
+        router.redirect(None)
+        router.errors.redirect(None)
+    if exit_code and error is None:
+        error = 'exit status {0}'.format(exit_code)
+    return CommandResult(args, exit_code, output.getvalue() if isinstance(output, CapturedOutput) else '',
+                         time() - start, error)
@@ -0,0 +1,191 @@
+import cmd
+import os
+import shlex
+import sys
+
+import click
+
+from oktawave.commands.context import pass_context, NamedItemParam
+from oktawave.commands.runner import EXEC_COMMANDS, RUNNER_COMMANDS, command_path, install_output_router, \
+    run_captured
+
+try:
+    import readline
+except ImportError:
+    readline = None
+
+
+class OktawaveShell(cmd.Cmd):
+    """Command loop running CLI commands in a single, long-lived context"""
+
+    prompt = 'oktawave> '
+    intro = 'Oktawave CLI shell. Type "help" for a list of commands, "exit" to quit.'
+
+    def __init__(self, root_ctx, history_file=None):
+        cmd.Cmd.__init__(self)
+        self.root_ctx = root_ctx
+        self.history_file = history_file
+        self.router = install_output_router(root_ctx.obj)
+
+    # command line handling
+
+    def emptyline(self):
+        pass
+
+    def default(self, line):
+        try:
+            args = shlex.split(line)
+        except ValueError as e:
+            print 'ERROR: {0}'.format(e)
+            return
+        self.root_ctx.obj.forget_names()
+        if command_path(args) in EXEC_COMMANDS:
+            self.run_forked(args)
+        else:
+            self.run(args)
+
+    def run(self, args):
+        result = run_captured(self.root_ctx, args, router=self.router, output=self.router.default)
+        if not result.ok and result.error:
+            print >> sys.stderr, '{0}: {1}'.format(result.status, result.error)
+
+    def run_forked(self, args):
+        """Runs a command replacing the current process (e.g. OCI ssh) in a child process"""
+        sys.stdout.flush()
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                result = run_captured(self.root_ctx, args, allow_exec=True, router=self.router,
+                                      output=self.router.default)
+                code = result.exit_code
+            finally:
+                sys.stdout.flush()
+                os._exit(code)
+        os.waitpid(pid, 0)
+
+    def do_help(self, arg):
+        """Show help for a command"""
+        try:
+            args = shlex.split(arg)
+        except ValueError:
+            args = []
+        if not args:
+            print self.root_ctx.get_help()
+            return
+        self.run(args + ['--help'])
+
+    def do_exit(self, _arg):
+        """Leave the shell"""
+        return True
+
+    do_quit = do_exit
+
+    def do_EOF(self, _arg):
+        print
+        return True
+
+    # completion
+
+    def _root_command_names(self):
+        return [name for name in self.root_ctx.command.list_commands(self.root_ctx)
+                if name not in RUNNER_COMMANDS] + ['exit', 'help', 'quit']
+
+    def completenames(self, text, *ignored):
+        return [name + ' ' for name in self._root_command_names() if name.startswith(text)]
+
+    def _command(self, words):
+        """Resolves the leading words of a line to a click command"""
+        command = self.root_ctx.command
+        consumed = 0
+        for word in words:
+            if not isinstance(command, click.MultiCommand):
+                break
+            sub = command.get_command(self.root_ctx, word)
+            if sub is None:
+                break
+            command = sub
+            consumed += 1
+        return command, consumed
+
+    def _param_values(self, param, text):
+        if isinstance(param.type, click.Choice):
+            return list(param.type.choices)
+        if isinstance(param.type, NamedItemParam):
+            try:
+                index, _fresh = self.root_ctx.obj.name_index(param.type)
+            except Exception:
+                return []
+            return sorted(index.keys())
+        return []
+
+    def completedefault(self, text, line, begidx, endidx):
+        try:
+            words = shlex.split(line[:begidx])
+        except ValueError:
+            return []
+        if words and words[0] == 'help':
+            words = words[1:]
+        command, consumed = self._command(words)
+        if isinstance(command, click.MultiCommand):
+            if consumed != len(words):
+                return []
+            return [name + ' ' for name in command.list_commands(self.root_ctx) if name.startswith(text)]
+
+        params = command.get_params(self.root_ctx)
+        if text.startswith('-'):
+            opts = []
+            for param in params:
+                if isinstance(param, click.Option):
+                    opts.extend(param.opts + param.secondary_opts)
+            return [opt + ' ' for opt in opts if opt.startswith(text)]
+
+        positional = [word for word in words[consumed:] if not word.startswith('-')]
+        arguments = [param for param in params if isinstance(param, click.Argument)]
+        if len(positional) >= len(arguments):
+            return []
+        values = self._param_values(arguments[len(positional)], text)
+        return [unicode(value).encode('utf-8') + ' ' for value in values if unicode(value).startswith(text)]
+
+    # readline setup
+
+    def _load_history(self):
+        if readline is None:
+            return
+        readline.set_completer_delims(' \t\n')
+        if self.history_file:
+            try:
+                readline.read_history_file(self.history_file)
+            except IOError:
+                pass
+
+    def _save_history(self):
+        if readline is not None and self.history_file:
+            try:
+                readline.write_history_file(self.history_file)
+            except IOError:
+                pass
+
+    def cmdloop(self, intro=None):
+        self._load_history()
+        try:
+            while True:
+                try:
+                    return cmd.Cmd.cmdloop(self, intro)
+                except KeyboardInterrupt:
+                    print '^C'
+                    intro = ''
+        finally:
+            self._save_history()
+
+
+@click.command(name='shell')
+@pass_context
+def shell(ctx):
+    """Interactive shell keeping the session and caches between commands"""
+    root_ctx = click.get_current_context().find_root()
+    config = root_ctx.params.get('config')
+    history_file = None
+    if config:
+        history_file = os.path.join(os.path.dirname(config), 'history')
+    OktawaveShell(root_ctx, history_file).cmdloop()
@@ -4,11 +4,11 @@ def show_template_category(ctx, category_id, name_filter=''):
         res = dict((k, [v]) for k, v in templates.items())
         ctx.p.print_hash_table(res, ['Template ID', 'Template name'])
     else:
-        print "No templates in this category.\n"
+        ctx.p.print_str("No templates in this category.\n")
 
 
-def show_oci_logs(ctx, oci_id):
-    logs = ctx.api.OCI_Logs(oci_id)
+def show_oci_logs(ctx, oci_id, page_size=None, limit=None):
+    logs = ctx.api.OCI_Logs(oci_id, page_size, limit)
 
     def fmt(op):
         return [
@@ -60,7 +60,7 @@ def show_oci_settings(ctx, oci_id):
     ctx.p.print_str("Hard disks")
     ctx.print_table(
         ['ID', 'Name', 'Capacity (GB)', 'Created at', 'Created by', 'Primary', 'Shared'],
-        settings['disks'], fmt_disk)
+        settings['disks'], fmt_disk, secondary=True)
 
     def fmt_ip(ip):
         return [
@@ -84,7 +84,7 @@ def show_oci_settings(ctx, oci_id):
         'Status',
         'Last changed',
         'MAC address'
-    ], settings['ips'], fmt_ip)
+    ], settings['ips'], fmt_ip, secondary=True)
     if settings['vlans']:
         ctx.p.print_str("Private vlans")
 
@@ -97,7 +97,7 @@ def show_oci_settings(ctx, oci_id):
 
         ctx.print_table(
             ['IPv4 address', 'Created at', 'MAC address'],
-            settings['vlans'], fmt_vlan)
+            settings['vlans'], fmt_vlan, secondary=True)
 
 
 def show_template_info(ctx, template_id):
@@ -124,4 +124,19 @@ def show_template_info(ctx, template_id):
     ])
     ctx.p.print_table(tab)
     ctx.p.print_str('Template description:')
-    ctx.p.print_str(ti['description'])
\ No newline at end of file
+    ctx.p.print_str(ti['description'])
+
+
+def oci_name(ctx, oci_id):
+    """Returns the name of an OCI, operations are reported with object names"""
+    return ctx.api.OCI_Settings(oci_id)['name']
+
+
+def wait_for_operations(ctx, timeout, *object_names):
+    """Waits for operations on the named objects to finish (for --wait)
+
+    Returns 1 (the exit status) if they are still running after timeout.
+    """
+    if not ctx.api.wait_for_operations(object_names, timeout):
+        print "ERROR: Operations on {0} still running after {1}s".format(', '.join(object_names), timeout)
+        return 1
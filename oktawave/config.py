@@ -0,0 +1,28 @@
+from ConfigParser import RawConfigParser, NoSectionError, NoOptionError
+
+
+def read_credentials(config, username=None, password=None, ocs_username=None, ocs_password=None):
+    """Returns Oktawave and OCS credentials, using the config file for those not given
+
+    The result is a dict with api_username, api_password, ocs_username
+    and ocs_password keys; missing values are None.
+    """
+    cp = {}
+
+    def get_config_value(section, key, override):
+        if override:
+            return override
+        if 'cp' not in cp:
+            cp['cp'] = RawConfigParser()
+            cp['cp'].read(config)
+        try:
+            return cp['cp'].get(section, key)
+        except (NoSectionError, NoOptionError):
+            return None
+
+    return {
+        'api_username': get_config_value('Auth', 'username', username),
+        'api_password': get_config_value('Auth', 'password', password),
+        'ocs_username': get_config_value('OCS', 'username', ocs_username),
+        'ocs_password': get_config_value('OCS', 'password', ocs_password),
+    }
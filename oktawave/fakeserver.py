@@ -0,0 +1,690 @@
+"""Local stand-in for the Oktawave JSON API
+
+Serves the CommonService.svc/json and ClientsService.svc/json methods
+used by oktawave-cli over a synthetic fleet of instances, disks,
+databases, containers and OPNs, so the CLI can be benchmarked and tested
+without api.oktawave.com:
+
+    python -m oktawave.fakeserver --port 8080 --vms 1000 --latency 0.05
+    oktawave-cli --api-url http://127.0.0.1:8080 OCI List
+
+Any username and password are accepted. Operations changing the fleet
+are applied immediately and show up in GetRunningOperations for
+--operation-time seconds. GET /stats returns the number of API calls per
+method, POST /stats resets it.
+"""
+import itertools
+import json
+import re
+import socket
+import sys
+import threading
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+from time import sleep, time
+from xml.sax.saxutils import escape
+
+import click
+
+CLIENT_ID = 1000
+LANGUAGE_ID = 2
+
+# DictionaryItemId: name, for items referenced by the fleet
+DICTIONARY_ITEMS = {
+    1: 'PL-001',
+    33: 'Monthly',
+    37: 'Public',
+    43: 'HTTP',
+    47: 'none',
+    86: 'Powered on',
+    87: 'Powered off',
+    115: '4',
+    184: 'off',
+    282: 'least_response_time',
+    278: '10.0.0.0/24',
+    325: 'MySQL',
+    326: 'PostgreSQL',
+    549: 'utf8',
+    600: 'PLN',
+    601: 'dd-MM-yyyy',
+    610: 'Assigned',
+    620: 'Finished',
+    621: 'In progress',
+    630: 'Turn on',
+    631: 'Turn off',
+    632: 'Restart',
+    633: 'Delete instance',
+    634: 'Update disk',
+    635: 'Create disk',
+    636: 'Delete disk',
+    637: 'Update container',
+    638: 'Instance access details',
+    639: 'Clone instance',
+    643: 'Backup database',
+    640: 'Instance',
+    641: 'Disk',
+    642: 'Container',
+}
+
+# remote dictionaries loaded with GetDictionaryItems
+DICTIONARIES = {
+    12: dict((700 + i, name) for i, name in enumerate(
+        ['v1.standard-1.09', 'v1.standard-2.2', 'v1.standard-4.4', 'v1.standard-8.8', 'v1.highcpu-16.16'])),
+    17: dict((710 + tier, 'Tier {0}'.format(tier)) for tier in range(1, 6)),
+}
+for _items in DICTIONARIES.values():
+    DICTIONARY_ITEMS.update(_items)
+
+CLUSTERS = [(1, 'PL-001', True), (2, 'PL-002', True), (3, 'PL-003', False)]
+
+# some of the fleet's instances are database instances
+DATABASE_EVERY = 10
+# and an instance in this many is powered off
+POWERED_OFF_EVERY = 7
+
+FAULT_NAMESPACES = (
+    'xmlns="http://schemas.microsoft.com/ws/2005/05/envelope/none" '
+    'xmlns:k2="http://schemas.datacontract.org/2004/07/K2.CloudsFactory.Common.Communication.Models"')
+
+
+class FakeApiError(Exception):
+    """Sent to the client as an API error (OktawaveAPIError)"""
+
+    def __init__(self, code, message):
+        super(FakeApiError, self).__init__(message)
+        self.code = code
+
+
+class FakeAccessDenied(FakeApiError):
+    """Sent to the client as an authorization error (OktawaveAccessDenied)"""
+
+    def __init__(self, message='Access denied'):
+        super(FakeAccessDenied, self).__init__(None, message)
+
+
+def date(timestamp):
+    """Formats a timestamp like the API does"""
+    return '/Date({0}+0000)/'.format(int(timestamp * 1000))
+
+
+def ditem(item_id):
+    """Dictionary item as embedded in API objects"""
+    return {
+        'DictionaryItemId': item_id,
+        'DictionaryItemNames': [{'LanguageDictId': LANGUAGE_ID, 'ItemName': DICTIONARY_ITEMS[item_id]}],
+    }
+
+
+def user_simple():
+    return {'FullName': 'Fake User', 'Email': 'fake@example.com'}
+
+
+class Fleet(object):
+    """Synthetic account contents; each API method is a method of the same name
+
+    Methods get the arguments of the API call as keyword arguments and
+    return the value of its <Method>Result field.
+    """
+
+    def __init__(self, vms=100, disks=None, containers=10, vlans=5, operation_time=5.0):
+        self.lock = threading.Lock()
+        self.operation_time = operation_time
+        self.created = time() - 30 * 86400
+        self.ids = itertools.count(100000)
+        self.operations = []
+        self.vms = {}
+        for vm_id in range(1, vms + 1):
+            self.vms[vm_id] = {
+                'id': vm_id,
+                'name': 'fake-vm-{0}'.format(vm_id),
+                'status': 87 if vm_id % POWERED_OFF_EVERY == 0 else 86,
+                'class': 700 + vm_id % len(DICTIONARIES[12]),
+                'database': 325 + vm_id // DATABASE_EVERY % 2 if vm_id % DATABASE_EVERY == 0 else None,
+            }
+        self.disks = {}
+        for disk_id in range(1, (vms if disks is None else disks) + 1):
+            vm_id = disk_id if disk_id in self.vms else None
+            self.disks[disk_id] = {
+                'id': disk_id,
+                'name': 'fake-disk-{0}'.format(disk_id),
+                'capacity': 5 * (1 + disk_id % 20),
+                'tier': 711 + disk_id % 5,
+                'cluster': 1 + disk_id % 2,
+                'shared': False,
+                'vms': [vm_id] if vm_id is not None else [],
+            }
+        self.containers = {}
+        for container_id in range(1, containers + 1):
+            self.containers[container_id] = {
+                'id': container_id,
+                'name': 'fake-container-{0}'.format(container_id),
+                'vms': [vm_id for vm_id in self.vms if vm_id % containers == container_id % containers][:20],
+            }
+        self.vlans = {}
+        for vlan_id in range(1, vlans + 1):
+            self.vlans[vlan_id] = {'id': vlan_id, 'name': 'fake-opn-{0}'.format(vlan_id)}
+
+    # helpers
+
+    def _vm(self, vm_id):
+        vm = self.vms.get(int(vm_id))
+        if vm is None:
+            raise FakeApiError(404, 'Virtual machine {0} not found'.format(vm_id))
+        return vm
+
+    def _disk(self, disk_id):
+        disk = self.disks.get(int(disk_id))
+        if disk is None:
+            raise FakeApiError(404, 'Disk {0} not found'.format(disk_id))
+        return disk
+
+    def _container(self, container_id):
+        container = self.containers.get(int(container_id))
+        if container is None:
+            raise FakeApiError(404, 'Container {0} not found'.format(container_id))
+        return container
+
+    def _vlan(self, vlan_id):
+        vlan = self.vlans.get(int(vlan_id))
+        if vlan is None:
+            raise FakeApiError(404, 'OPN {0} not found'.format(vlan_id))
+        return vlan
+
+    def _operation(self, type_id, object_type_id, object_id, object_name):
+        with self.lock:
+            self.operations.append({
+                'id': next(self.ids),
+                'started': time(),
+                'type': type_id,
+                'object_type': object_type_id,
+                'object_id': object_id,
+                'object_name': object_name,
+            })
+
+    def _page(self, items, search_params):
+        """Applies PageNumber/PageSize of searchParams to a list of items"""
+        items = list(items)
+        page_size = search_params.get('PageSize')
+        if page_size:
+            start = (search_params.get('PageNumber', 1) - 1) * page_size
+            page = items[start:start + page_size]
+        else:
+            page = items
+        return {'_results': page, '_totalCount': len(items)}
+
+    def _vm_simple(self, vm):
+        return {'VirtualMachineId': vm['id'], 'VirtualMachineName': vm['name'], 'StatusDictId': vm['status']}
+
+    def _vm_full(self, vm):
+        return dict(self._vm_simple(vm), **{
+            'VMClass': ditem(vm['class']),
+            'CpuMhz': 2000 * (1 + vm['id'] % 4),
+            'CpuMhzUsage': 10 * (vm['id'] % 50),
+            'RamMB': 1024 * (1 + vm['id'] % 8),
+            'RamMBUsage': 100 * (vm['id'] % 10),
+        })
+
+    def _disk_full(self, disk):
+        return {
+            'ClientHddId': disk['id'],
+            'HddName': disk['name'],
+            'HddStandard': ditem(disk['tier']),
+            'CapacityGB': disk['capacity'],
+            'UsedCapacityGB': disk['capacity'] // 3,
+            'IsShared': disk['shared'],
+            'Cluster': {'ClusterId': disk['cluster']},
+            'PaymentType': ditem(33),
+            'CreationDate': date(self.created),
+            'CreationUser': user_simple(),
+            'VirtualMachineHdds': [{
+                'VirtualMachine': self._vm_simple(self.vms[vm_id]),
+                'IsPrimary': vm_id == disk['id'],
+            } for vm_id in disk['vms'] if vm_id in self.vms] or None,
+        }
+
+    def _database_instance(self, vm):
+        return dict(self._vm_simple(vm), **{
+            'DatabaseType': ditem(vm['database']),
+            'Size': 1024 * (1 + vm['id'] % 5),
+            'AvailableSpace': 10240,
+            'Databases': [{
+                'VirtualMachineId': vm['id'],
+                'DatabaseName': 'db{0}'.format(n),
+                'DatabaseType': ditem(vm['database']),
+                'Encoding': 'utf8',
+                'IsRunning': vm['status'] == 86,
+                'QPS': n * 10,
+                'Size': n * 100,
+            } for n in range(1, 4)],
+        })
+
+    def _container_full(self, container):
+        return {
+            'ContainerId': container['id'],
+            'ContainerName': container['name'],
+            'VirtualMachineCount': len(container['vms']),
+            'AutoScalingType': ditem(184),
+            'IsServiceCheckAvailable': False,
+            'IsLoadBalancer': True,
+            'MasterServiceId': None,
+            'MasterServiceName': None,
+            'IsProxyCache': False,
+            'IsSSLUsed': False,
+            'PortNumber': 80,
+            'SchedulersCount': 0,
+            'DatabaseUserLogin': None,
+            'DatabaseUserPassword': None,
+            'IPVersion': ditem(115),
+            'LoadBalancerAlgorithm': ditem(282),
+            'Service': ditem(43),
+            'SessionType': ditem(47),
+            'IPs': [{
+                'Address': '192.0.2.{0}'.format(container['id'] % 250 + 1),
+                'AddressV6': '2001:db8::{0:x}'.format(container['id']),
+            }],
+        }
+
+    def _vlan_full(self, vlan):
+        return {
+            'VlanId': vlan['id'],
+            'VlanName': vlan['name'],
+            'AddressPool': ditem(278),
+            'PaymentType': ditem(33),
+        }
+
+    # CommonService
+
+    def LogonUser(self, user, password, **kwargs):
+        if not user or not password:
+            raise FakeApiError(401, 'Invalid username or password')
+        return {'User': {
+            'Client': {'ClientId': CLIENT_ID},
+            'FullName': 'Fake User',
+            'TimeZone': {'DisplayName': '(UTC) Coordinated Universal Time'},
+            'Currency': ditem(600),
+            'DateFormat': ditem(601),
+            'AvailabilityZone': 1,
+            'Is24HourClock': True,
+        }}
+
+    def GetDictionaryItems(self, dictionary, **kwargs):
+        return [ditem(item_id) for item_id in sorted(DICTIONARIES.get(dictionary, {}))]
+
+    def GetDictionaryItemById(self, dictionaryItemId, **kwargs):
+        if dictionaryItemId not in DICTIONARY_ITEMS:
+            raise FakeApiError(404, 'Dictionary item {0} not found'.format(dictionaryItemId))
+        return ditem(dictionaryItemId)
+
+    def GetRunningOperations(self, **kwargs):
+        now = time()
+        with self.lock:
+            self.operations = [op for op in self.operations if now - op['started'] < self.operation_time]
+            operations = list(self.operations)
+        return [{
+            'AsynchronousOperationId': op['id'],
+            'CreationDate': date(op['started']),
+            'CreationUserFullName': 'Fake User',
+            'OperationTypeId': op['type'],
+            'OperationTypeName': DICTIONARY_ITEMS[op['type']],
+            'ObjectTypeId': op['object_type'],
+            'ObjectTypeName': DICTIONARY_ITEMS[op['object_type']],
+            'ObjectId': op['object_id'],
+            'ObjectName': op['object_name'],
+            'Progress': min(99, int(100 * (now - op['started']) / self.operation_time)),
+            'StatusId': 621,
+            'StatusName': DICTIONARY_ITEMS[621],
+        } for op in operations]
+
+    def GetVirtualMachineClassConfigurations(self, **kwargs):
+        return [{
+            'VirtualMachineClass': ditem(item_id),
+            'Category': ditem(37),
+            'CpuCount': 1 + i,
+            'RamMB': 1024 * (1 + i),
+        } for i, item_id in enumerate(sorted(DICTIONARIES[12]))]
+
+    def GetTemplateCategories(self, **kwargs):
+        def category(category_id, name, children=None):
+            return {
+                'TemplateCategoryId': category_id,
+                'TemplateCategoryNames': [{
+                    'LanguageDictId': LANGUAGE_ID,
+                    'CategoryName': name,
+                    'CategoryDescription': '{0} templates'.format(name),
+                }],
+                'CategoryChildren': children,
+            }
+        return [
+            category(1, 'Linux', [category(11, 'Debian'), category(12, 'CentOS')]),
+            category(2, 'Windows'),
+        ]
+
+    def GetTemplatesByCategory(self, categoryId, **kwargs):
+        return [{'TemplateId': categoryId * 100 + n, 'TemplateName': 'fake-template-{0}-{1}'.format(categoryId, n)}
+                for n in range(1, 6)]
+
+    def GetClusters(self, **kwargs):
+        return [{'ClusterId': cluster_id, 'DisplayName': name, 'IsActive': active}
+                for cluster_id, name, active in CLUSTERS]
+
+    # ClientsService: instances
+
+    def GetClientUsers(self, **kwargs):
+        return [{'Email': 'fake@example.com', 'FullName': 'Fake User'}]
+
+    def GetVirtualMachinesSimple(self, **kwargs):
+        return [self._vm_simple(self.vms[vm_id]) for vm_id in sorted(self.vms)]
+
+    def GetVirtualMachines(self, searchParams, **kwargs):
+        return self._page((self._vm_full(self.vms[vm_id]) for vm_id in sorted(self.vms)), searchParams)
+
+    def GetVirtualMachineById(self, virtualMachineId, **kwargs):
+        vm = self._vm(virtualMachineId)
+        return dict(self._vm_full(vm), **{
+            'AutoScalingType': ditem(184),
+            'ConnectionType': ditem(37),
+            'CreationDate': date(self.created),
+            'CreationUserSimple': user_simple(),
+            'IopsUsage': vm['id'] % 100,
+            'LastChangeDate': date(self.created + 86400),
+            'PaymentType': ditem(33),
+            'Status': ditem(vm['status']),
+            'DiskDrives': [{
+                'ClientHddId': disk['id'],
+                'ClientHdd': self._disk_full(disk),
+                'IsPrimary': disk['id'] == vm['id'],
+            } for disk in self.disks.values() if vm['id'] in disk['vms']],
+            'IPs': [{
+                'Address': '198.51.100.{0}'.format(vm['id'] % 250 + 1),
+                'NetMask': '255.255.255.0',
+                'AddressV6': '2001:db8:1::{0:x}'.format(vm['id']),
+                'CreationDate': date(self.created),
+                'DhcpBranch': 'fake',
+                'Gateway': '198.51.100.254',
+                'IPStatus': ditem(610),
+                'LastChangeDate': None,
+                'MacAddress': '00:50:56:00:{0:02x}:{1:02x}'.format(vm['id'] // 256 % 256, vm['id'] % 256),
+            }],
+            'PrivateIpv4': [],
+        })
+
+    def GetVirtualMachineHistories(self, searchParams, **kwargs):
+        vm = self._vm(searchParams['VirtualMachineId'])
+        entries = [{
+            'CreationDate': date(self.created + 3600 * n),
+            'OperationType': ditem(638 if n == 0 else 630 + n % 3),
+            'CreationUser': user_simple(),
+            'Status': ditem(620),
+            'Parameters': [{'Value': 'fake-password-{0}'.format(vm['id'])}] if n == 0 else [],
+        } for n in range(20)]
+        entries.reverse()
+        return self._page(entries, searchParams)
+
+    def _power(self, virtualMachineId, status, operation):
+        vm = self._vm(virtualMachineId)
+        vm['status'] = status
+        self._operation(operation, 640, vm['id'], vm['name'])
+
+    def TurnOnVirtualMachine(self, virtualMachineId, **kwargs):
+        self._power(virtualMachineId, 86, 630)
+
+    def TurnoffVirtualMachine(self, virtualMachineId, **kwargs):
+        self._power(virtualMachineId, 87, 631)
+
+    ShutdownVirtualMachine = TurnoffVirtualMachine
+
+    def RestartVirtualMachine(self, virtualMachineId, **kwargs):
+        self._power(virtualMachineId, 86, 632)
+
+    def DeleteVirtualMachine(self, virtualMachineId, **kwargs):
+        vm = self._vm(virtualMachineId)
+        with self.lock:
+            del self.vms[vm['id']]
+        self._operation(633, 640, vm['id'], vm['name'])
+
+    def CloneVirtualMachine(self, virtualMachineId, cloneName, **kwargs):
+        vm = self._vm(virtualMachineId)
+        clone_id = next(self.ids)
+        with self.lock:
+            self.vms[clone_id] = dict(vm, id=clone_id, name=cloneName)
+        self._operation(639, 640, clone_id, cloneName)
+
+    def IsRestartNeededForClassChange(self, **kwargs):
+        return False
+
+    def UpdateVirtualMachine(self, machine, **kwargs):
+        vm = self._vm(machine['VirtualMachineId'])
+        vm['class'] = machine['VMClass']['DictionaryItemId']
+        return True
+
+    # ClientsService: disks
+
+    def GetDisks(self, searchParams, **kwargs):
+        return self._page((self._disk_full(self.disks[disk_id]) for disk_id in sorted(self.disks)), searchParams)
+
+    def UpdateDisk(self, clientHdd, **kwargs):
+        disk = self._disk(clientHdd['ClientHddId'])
+        disk.update(name=clientHdd['HddName'], capacity=clientHdd['CapacityGB'], tier=clientHdd['HddStandardId'],
+                    vms=list(clientHdd['VirtualMachineIds']))
+        self._operation(634, 641, disk['id'], disk['name'])
+        return True
+
+    def CreateDisk(self, clientHdd, **kwargs):
+        disk_id = next(self.ids)
+        with self.lock:
+            self.disks[disk_id] = {
+                'id': disk_id,
+                'name': clientHdd['HddName'],
+                'capacity': clientHdd['CapacityGB'],
+                'tier': clientHdd['HddStandardId'],
+                'cluster': clientHdd['ClusterId'] or 1,
+                'shared': clientHdd['IsShared'],
+                'vms': [],
+            }
+        self._operation(635, 641, disk_id, clientHdd['HddName'])
+        return True
+
+    def DeleteDisk(self, clientHddId, **kwargs):
+        disk = self._disk(clientHddId)
+        with self.lock:
+            del self.disks[disk['id']]
+        self._operation(636, 641, disk['id'], disk['name'])
+        return True
+
+    # ClientsService: databases
+
+    def GetDatabaseInstances(self, searchParams, **kwargs):
+        return self._page((self._database_instance(self.vms[vm_id]) for vm_id in sorted(self.vms)
+                           if self.vms[vm_id]['database'] is not None), searchParams)
+
+    def GetBackups(self, **kwargs):
+        return []
+
+    def BackupDatabase(self, virtualMachineId, databaseName, **kwargs):
+        vm = self._vm(virtualMachineId)
+        self._operation(643, 640, vm['id'], vm['name'])
+
+    # ClientsService: containers
+
+    def GetContainers(self, **kwargs):
+        return [self._container_full(self.containers[container_id]) for container_id in sorted(self.containers)]
+
+    def GetContainer(self, containerId, **kwargs):
+        return self._container_full(self._container(containerId))
+
+    def GetContainersSimpleWithVM(self, **kwargs):
+        return [{
+            'ContainerId': container['id'],
+            'ContainerName': container['name'],
+            'VirtualMachines': [{
+                'VirtualMachineId': vm_id,
+                'VirtualMachineSimple': self._vm_simple(self.vms[vm_id]),
+            } for vm_id in container['vms'] if vm_id in self.vms],
+        } for container in (self.containers[container_id] for container_id in sorted(self.containers))]
+
+    def UpdateContainer(self, container, virtualMachinesId, **kwargs):
+        obj = self._container(container['ContainerId'])
+        obj.update(name=container['ContainerName'], vms=list(virtualMachinesId))
+        self._operation(637, 642, obj['id'], obj['name'])
+        return True
+
+    def DeleteContainers(self, containerIds, **kwargs):
+        for container_id in containerIds:
+            self._container(container_id)
+            with self.lock:
+                del self.containers[int(container_id)]
+        return True
+
+    # ClientsService: OPNs
+
+    def GetVlansByClientId(self, **kwargs):
+        return [self._vlan_full(self.vlans[vlan_id]) for vlan_id in sorted(self.vlans)]
+
+    def GetVlanById(self, vlanId, **kwargs):
+        return self._vlan_full(self._vlan(vlanId))
+
+    def GetVirtualMachineVlansByVlanId(self, vlanId, **kwargs):
+        self._vlan(vlanId)
+        return []
+
+
+class FakeApiServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, fleet, latency=0.0):
+        HTTPServer.__init__(self, address, FakeApiHandler)
+        self.fleet = fleet
+        self.latency = latency
+        self.calls = {}
+        self.calls_lock = threading.Lock()
+        self.connections = set()
+
+    @property
+    def url(self):
+        return 'http://{0}:{1}'.format(*self.server_address)
+
+    def count_call(self, method):
+        with self.calls_lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+
+    def reset_calls(self):
+        """Returns the numbers of API calls per method so far and starts counting again"""
+        with self.calls_lock:
+            calls = self.calls
+            self.calls = {}
+        return calls
+
+    def finish_request(self, request, client_address):
+        with self.calls_lock:
+            self.connections.add(request)
+        try:
+            HTTPServer.finish_request(self, request, client_address)
+        finally:
+            with self.calls_lock:
+                self.connections.discard(request)
+
+    def server_close(self):
+        """Stops listening and closes kept-alive client connections"""
+        HTTPServer.server_close(self)
+        with self.calls_lock:
+            connections = list(self.connections)
+        for connection in connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+
+
+class FakeApiHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    PATH_RE = re.compile(r'^/(CommonService|ClientsService)\.svc/json/(\w+)$')
+
+    def log_message(self, format, *args):
+        pass
+
+    def send(self, code, body, content_type='application/json'):
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_fault(self, text, code=None, access_denied=False):
+        if access_denied:
+            detail = ('<Detail><k2:AuthorizationErrorDescription><k2:ErrorMsg>{0}</k2:ErrorMsg>'
+                      '</k2:AuthorizationErrorDescription></Detail>'.format(escape(text)))
+        elif code is None:
+            detail = ''
+        else:
+            detail = ('<Detail><k2:ErrorCode>{0}</k2:ErrorCode><k2:ErrorMsg>{1}</k2:ErrorMsg></Detail>'
+                      .format(code, escape(text)))
+        self.send(500, '<Fault {0}><Reason><Text>{1}</Text></Reason>{2}</Fault>'.format(
+            FAULT_NAMESPACES, escape(text), detail), 'application/xml')
+
+    def do_GET(self):
+        if self.path == '/stats':
+            self.send(200, json.dumps(self.server.calls))
+        else:
+            self.send(404, '{}')
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.path == '/stats':
+            self.send(200, json.dumps(self.server.reset_calls()))
+            return
+        match = self.PATH_RE.match(self.path)
+        if match is None:
+            self.send(404, '{}')
+            return
+        method = match.group(2)
+        self.server.count_call(method)
+        if self.server.latency:
+            sleep(self.server.latency)
+        func = getattr(self.server.fleet, method, None)
+        if func is None or method.startswith('_'):
+            self.send_fault('Method {0} is not implemented by the fake server'.format(method))
+            return
+        try:
+            result = func(**json.loads(body or '{}'))
+        except FakeApiError as e:
+            self.send_fault(e.message, e.code, isinstance(e, FakeAccessDenied))
+            return
+        except Exception as e:
+            self.send_fault('{0}: {1}'.format(e.__class__.__name__, e))
+            return
+        self.send(200, json.dumps({method + 'Result': result}))
+
+
+def start(port=0, latency=0.0, host='127.0.0.1', **fleet_args):
+    """Starts a fake API server in a background thread, returns the FakeApiServer"""
+    server = FakeApiServer((host, port), Fleet(**fleet_args), latency)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+@click.command()
+@click.option('--host', help='Address to listen on', default='127.0.0.1', show_default=True)
+@click.option('--port', help='Port to listen on', type=click.IntRange(min=0), default=8080, show_default=True)
+@click.option('--vms', help='Number of instances', type=click.IntRange(min=0), default=100, show_default=True)
+@click.option('--disks', help='Number of disks [default: as many as instances]', type=click.IntRange(min=0))
+@click.option('--containers', help='Number of containers', type=click.IntRange(min=0), default=10,
+              show_default=True)
+@click.option('--vlans', help='Number of OPNs', type=click.IntRange(min=0), default=5, show_default=True)
+@click.option('--latency', help='Delay of every API call in seconds', type=float, default=0.0, show_default=True)
+@click.option('--operation-time', help='How long operations keep running in seconds', type=float, default=5.0,
+              show_default=True)
+def main(host, port, vms, disks, containers, vlans, latency, operation_time):
+    """Run a fake Oktawave API server"""
+    server = FakeApiServer((host, port), Fleet(vms, disks, containers, vlans, operation_time), latency)
+    print >> sys.stderr, 'Fake Oktawave API listening on {0} (use --api-url {0})'.format(server.url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,805 @@
+import hashlib
+import itertools
+import json
+import os
+import sys
+import tempfile
+import threading
+import urllib
+from stat import S_ISREG
+
+try:
+    from swiftclient import Connection, ClientException
+except ImportError:
+    # noinspection PyUnresolvedReferences
+    from swift.common.client import Connection, ClientException
+
+# Swift's default limit of segments in a static large object manifest
+MAX_SEGMENTS = 1000
+
+# size of chunks read from and written to the network
+CHUNK_SIZE = 64 * 1024
+
+# objects deleted in one round of concurrent DELETE requests
+DELETE_BATCH_SIZE = 1000
+
+# where OCS Sync remembers hashes of local files
+SYNC_CACHE_DIR = os.path.expanduser('~/.oktawave-cli/sync')
+
+
+class OCSConnection(Connection):
+    def __init__(self, username, password, **kwargs):
+        super(OCSConnection, self).__init__(
+            'https://ocs-pl.oktawave.com/auth/v1.0', username, password, **kwargs)
+
+    def worker_connection(self):
+        """Returns a new connection reusing this one's auth token
+
+        swiftclient connections must not be shared between threads, every
+        worker thread gets its own one. Logs in first if not done yet.
+        """
+        url, token = self.url, self.token
+        if not (url and token):
+            url, token = self.get_auth()
+        return Connection(self.authurl, self.user, self.key, retries=self.retries,
+                          preauthurl=url, preauthtoken=token)
+
+
+def parallel_map(conn, func, items, jobs):
+    """Calls func(worker_conn, item) for every item, in up to jobs threads
+
+    Returns the results in the order of items. When a call fails, items
+    not started yet are skipped and the exception is re-raised.
+    """
+    items = list(items)
+    if jobs <= 1 or len(items) <= 1:
+        return [func(conn, item) for item in items]
+
+    results = [None] * len(items)
+    errors = []
+    lock = threading.Lock()
+    pending = iter(enumerate(items))
+
+    def worker():
+        try:
+            worker_conn = conn.worker_connection()
+            while True:
+                with lock:
+                    if errors:
+                        return
+                    try:
+                        i, item = next(pending)
+                    except StopIteration:
+                        return
+                results[i] = func(worker_conn, item)
+        except Exception:
+            with lock:
+                errors.append(sys.exc_info())
+
+    threads = [threading.Thread(target=worker) for _ in xrange(min(jobs, len(items)))]
+    for t in threads:
+        t.daemon = True
+        t.start()
+    for t in threads:
+        while t.is_alive():
+            # a timeout keeps the main thread responsive to Ctrl-C
+            t.join(0.1)
+    if errors:
+        raise errors[0][0], errors[0][1], errors[0][2]
+    return results
+
+
+class FileSegment(object):
+    """File-like object reading a part of a file and computing its MD5 sum"""
+
+    def __init__(self, path, offset, length):
+        self.f = open(path, 'rb')
+        self.offset = offset
+        self.length = length
+        self.seek(0)
+
+    def seek(self, pos):
+        self.f.seek(self.offset + pos)
+        self.pos = pos
+        self.md5 = hashlib.md5()
+
+    def tell(self):
+        return self.pos
+
+    def read(self, size=-1):
+        remaining = self.length - self.pos
+        if size < 0 or size > remaining:
+            size = remaining
+        data = self.f.read(size)
+        self.pos += len(data)
+        self.md5.update(data)
+        return data
+
+    def hexdigest(self):
+        """MD5 sum of the whole segment (reads the rest of it)"""
+        while self.read(1024 * 1024):
+            pass
+        return self.md5.hexdigest()
+
+    def close(self):
+        self.f.close()
+
+
+def slo_segment_size(size, segment_size):
+    """Segment size actually used for a file, so that it fits in MAX_SEGMENTS segments"""
+    if size > segment_size * MAX_SEGMENTS:
+        return -(-size // MAX_SEGMENTS)
+    return segment_size
+
+
+def segment_container(container):
+    """Container keeping segments of large objects (swift tool convention)"""
+    return container + '_segments'
+
+
+def segment_prefix(path, mtime, size, segment_size):
+    """Segment name prefix; it identifies the local file, so uploads of the same file can resume"""
+    return '{0}/slo/{1:.6f}/{2}/{3}/'.format(path, mtime, size, segment_size)
+
+
+def list_objects(conn, container, prefix):
+    """Returns {name: listing entry} of objects under prefix, {} for a missing container"""
+    try:
+        _headers, objects = conn.get_container(container, prefix=prefix, full_listing=True)
+    except ClientException as e:
+        if e.http_status == 404:
+            return {}
+        raise
+    return dict((obj['name'], obj) for obj in objects)
+
+
+def iter_objects(conn, container, prefix=None, delimiter=None, page_size=10000):
+    """Yields listing entries of a container, fetched page by page
+
+    With a delimiter, "subdirectories" are returned as {'subdir': name}
+    entries instead of their contents. Entries come in Swift's (name)
+    order; the next page is requested while the current one is consumed.
+    A page shorter than page_size is the last one (page_size must not
+    exceed the server's listing limit, 10000 by default).
+    """
+    from oktawave.client import BackgroundCall
+
+    def page_after(marker):
+        return conn.get_container(container, prefix=prefix, delimiter=delimiter, marker=marker,
+                                  limit=page_size)[1]
+
+    page = page_after(None)
+    while page:
+        next_page = None
+        if len(page) >= page_size:
+            last = page[-1]
+            next_page = BackgroundCall(page_after, last.get('name', last.get('subdir')))
+        for entry in page:
+            yield entry
+        if next_page is None:
+            return
+        page = next_page.result()
+
+
+def bulk_delete_limit(conn):
+    """Returns the maximum number of objects deleted in one bulk delete request
+
+    Returns None when the cluster does not support bulk deletes.
+    """
+    try:
+        bulk_delete = conn.get_capabilities().get('bulk_delete')
+    except ClientException:
+        return None
+    if bulk_delete is None:
+        return None
+    return bulk_delete.get('max_deletes_per_request', 10000)
+
+
+def _bulk_delete(conn, container, names):
+    body = ''.join('{0}\n'.format(urllib.quote(u'/{0}/{1}'.format(container, name).encode('utf-8')))
+                   for name in names)
+    _headers, response = conn.post_account({'Content-Type': 'text/plain', 'Accept': 'application/json'},
+                                           query_string='bulk-delete', data=body)
+    response = json.loads(response)
+    if response['Errors']:
+        name, status = response['Errors'][0]
+        raise ClientException('Bulk delete of {0} failed: {1} ({2} errors)'.format(
+            name, status, len(response['Errors'])))
+    if not response['Response Status'].startswith('2'):
+        raise ClientException('Bulk delete failed: {0} {1}'.format(
+            response['Response Status'], response.get('Response Body', '')))
+    return response['Number Deleted']
+
+
+def _delete_object(conn, item):
+    container, name = item
+    try:
+        conn.delete_object(container, name)
+    except ClientException as e:
+        if e.http_status == 404:
+            return 0
+        raise
+    return 1
+
+
+def delete_objects(conn, container, names, jobs=4, report=None):
+    """Deletes objects from a container, returns the number of objects deleted
+
+    names may be any iterable, e.g. a listing streamed with iter_objects.
+    They are deleted in batches, using the bulk delete middleware if the
+    cluster supports it and jobs concurrent DELETE requests otherwise.
+    Objects which do not exist (any more) are skipped. report(deleted) is
+    called after each batch with the number of objects deleted so far.
+    """
+    batch_size = bulk_delete_limit(conn)
+    if batch_size:
+        delete_batch = lambda batch: _bulk_delete(conn, container, batch)
+    else:
+        batch_size = DELETE_BATCH_SIZE
+        delete_batch = lambda batch: sum(parallel_map(conn, _delete_object,
+                                                      [(container, name) for name in batch], jobs))
+    deleted = 0
+    names = iter(names)
+    while True:
+        batch = list(itertools.islice(names, batch_size))
+        if not batch:
+            return deleted
+        deleted += delete_batch(batch)
+        if report is not None:
+            report(deleted)
+
+
+def delete_tree(conn, container, prefix=None, jobs=4, report=None):
+    """Deletes all objects whose names start with prefix (all of them by default)
+
+    The listing is streamed, deletes start with its first page.
+    Returns the number of objects deleted.
+    """
+    # a connection of its own, the next page of the listing is fetched while deleting
+    objects = iter_objects(conn.worker_connection(), container, prefix=prefix)
+    return delete_objects(conn, container, (obj['name'] for obj in objects), jobs, report)
+
+
+# response headers of HEAD requests which change when a listing does
+LISTING_VALIDATORS = ('x-account-container-count', 'x-account-object-count', 'x-account-bytes-used',
+                      'x-container-object-count', 'x-container-bytes-used', 'etag', 'last-modified')
+
+
+def _listing_group(conn, container):
+    """Listings of a container are stored (and forgotten) together"""
+    return u'/'.join(text if isinstance(text, unicode) else text.decode('utf-8')
+                     for text in (conn.user, container or ''))
+
+
+def forget_listings(conn, cache, container):
+    """Removes listings of a container from a ListingCache"""
+    cache.invalidate(_listing_group(conn, container))
+
+
+def cached_listing(conn, cache, container=None, prefix=None, delimiter=None):
+    """Returns an iterator over a container listing, or the account's containers without a container
+
+    With a ListingCache, a HEAD request checks first whether the listing
+    stored in it is still valid and only if not, the listing is fetched
+    (and stored on the way).
+    """
+    if container is None:
+        fetch = lambda: iter(conn.get_account(full_listing=True)[1])
+    else:
+        fetch = lambda: iter_objects(conn, container, prefix=prefix, delimiter=delimiter)
+    if cache is None:
+        return fetch()
+    headers = conn.head_account() if container is None else conn.head_container(container)
+    validators = dict((name, headers[name]) for name in LISTING_VALIDATORS if name in headers)
+    if not validators:
+        # nothing to tell whether a stored listing is still valid
+        return fetch()
+    group = _listing_group(conn, container)
+    key = json.dumps([prefix, delimiter])
+    entries = cache.get(group, key, validators)
+    if entries is None:
+        entries = cache.store(group, key, validators, fetch())
+    return entries
+
+
+def upload_segmented(conn, container, path, local_path, segment_size, jobs=4, retries=3):
+    """Uploads a file as a static large object (SLO)
+
+    The file is split into segments of segment_size bytes, uploaded
+    concurrently to the <container>_segments container. Segments already
+    uploaded by an earlier, interrupted run (same file, size and mtime)
+    are verified by their MD5 sum and skipped. The manifest is written
+    when all segments are in place. Returns the MD5 sums of the segments.
+    """
+    stat = os.stat(local_path)
+    size = stat.st_size
+    segment_size = slo_segment_size(size, segment_size)
+    seg_container = segment_container(container)
+    prefix = segment_prefix(path, stat.st_mtime, size, segment_size)
+    existing = list_objects(conn, seg_container, prefix)
+    if not existing:
+        conn.put_container(seg_container)
+
+    segments = []
+    for i, offset in enumerate(xrange(0, size, segment_size)):
+        segments.append(('{0}{1:08d}'.format(prefix, i), offset, min(segment_size, size - offset)))
+
+    def upload(worker_conn, segment):
+        name, offset, length = segment
+        old = existing.get(name)
+        if old is not None and old['bytes'] == length:
+            reader = FileSegment(local_path, offset, length)
+            try:
+                etag = reader.hexdigest()
+            finally:
+                reader.close()
+            if old['hash'] == etag:
+                return etag
+        attempt = 0
+        while True:
+            attempt += 1
+            reader = FileSegment(local_path, offset, length)
+            try:
+                etag = worker_conn.put_object(seg_container, name, reader, content_length=length,
+                                              content_type='application/octet-stream')
+                if etag is not None and etag.strip('"') == reader.md5.hexdigest():
+                    return reader.md5.hexdigest()
+                error = ClientException('MD5 mismatch uploading segment {0}'.format(name))
+            except ClientException as e:
+                error = e
+            finally:
+                reader.close()
+            if attempt > retries:
+                raise error
+
+    etags = parallel_map(conn, upload, segments, jobs)
+    manifest = [{
+        'path': '/{0}/{1}'.format(seg_container, name),
+        'etag': etag,
+        'size_bytes': length,
+    } for (name, _offset, length), etag in zip(segments, etags)]
+    conn.put_object(container, path, json.dumps(manifest), query_string='multipart-manifest=put',
+                    headers={'x-object-meta-mtime': '{0:.6f}'.format(stat.st_mtime)})
+    return etags
+
+
+def _is_large_object(headers):
+    return headers.get('x-static-large-object', '').lower() == 'true' or 'x-object-manifest' in headers
+
+
+def stream_object(conn, container, path, output):
+    """Writes an object to a file-like object, chunk by chunk
+
+    The MD5 sum of a plain object is checked against its ETag, but only
+    at the end, when all of the data has already been written.
+    """
+    headers, body = conn.get_object(container, path, resp_chunk_size=CHUNK_SIZE)
+    md5 = hashlib.md5()
+    for chunk in body:
+        md5.update(chunk)
+        output.write(chunk)
+    output.flush()
+    if not _is_large_object(headers) and headers.get('etag', '').strip('"') != md5.hexdigest():
+        raise ClientException('MD5 mismatch downloading {0}/{1}'.format(container, path))
+
+
+def _checked_parts(conn, container, path, headers, size):
+    """Returns (offset, length, expected MD5) of parts of an object whose sums are known
+
+    That is the whole object for plain objects and every segment for static
+    large objects. Dynamic large objects cannot be checked.
+    """
+    if 'x-object-manifest' in headers:
+        return []
+    if headers.get('x-static-large-object', '').lower() != 'true':
+        return [(0, size, headers['etag'].strip('"'))]
+    _headers, manifest = conn.get_object(container, path, query_string='multipart-manifest=get')
+    parts = []
+    offset = 0
+    for segment in json.loads(manifest):
+        parts.append((offset, segment['bytes'], segment['hash']))
+        offset += segment['bytes']
+    return parts
+
+
+class PartVerifier(object):
+    """Checks MD5 sums of consecutive parts of a file while it is being written
+
+    advance(end) hashes the file up to end (which must only grow) and
+    checks every part completed on the way.
+    """
+
+    def __init__(self, path, parts):
+        self.path = path
+        self.parts = parts
+        self.index = 0
+        self.pos = 0
+        self.md5 = hashlib.md5()
+        self.failed = []
+
+    def advance(self, end):
+        with open(self.path, 'rb') as f:
+            while self.index < len(self.parts):
+                offset, length, expected = self.parts[self.index]
+                part_end = offset + length
+                if self.pos < part_end:
+                    if self.pos >= end:
+                        return
+                    f.seek(self.pos)
+                    while self.pos < min(end, part_end):
+                        data = f.read(min(CHUNK_SIZE * 16, min(end, part_end) - self.pos))
+                        if not data:
+                            raise IOError('{0} is shorter than expected'.format(self.path))
+                        self.md5.update(data)
+                        self.pos += len(data)
+                    if self.pos < part_end:
+                        return
+                if self.md5.hexdigest() != expected:
+                    self.failed.append((offset, length))
+                self.md5 = hashlib.md5()
+                self.index += 1
+
+
+def _save_json(path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix='.tmp-')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(data, f)
+    os.rename(tmp_path, path)
+
+
+def _load_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def download_object(conn, container, path, local_path, range_size, jobs=4):
+    """Downloads an object to a local file, fetching byte ranges in parallel
+
+    Data goes to <local_path>.part, which is renamed to local_path when
+    complete and verified. Finished ranges are recorded in a
+    <local_path>.part.json file, so an interrupted download of an unchanged
+    object only fetches the missing ranges when run again.
+    Returns the number of downloaded bytes.
+    """
+    headers = conn.head_object(container, path)
+    size = int(headers['content-length'])
+    etag = headers.get('etag', '').strip('"')
+    part_path = local_path + '.part'
+    state_path = part_path + '.json'
+    ranges = [(offset, min(range_size, size - offset)) for offset in xrange(0, size, range_size)]
+
+    identity = {'etag': etag, 'size': size, 'range_size': range_size,
+                'last_modified': headers.get('last-modified')}
+    state = _load_json(state_path)
+    if state is None or state.get('object') != identity or not os.path.exists(part_path):
+        state = {'object': identity, 'done': []}
+        with open(part_path, 'wb') as f:
+            # sparse file of the final size, ranges are written in place
+            f.truncate(size)
+        _save_json(state_path, state)
+    done = [False] * len(ranges)
+    for i in state['done']:
+        done[i] = True
+
+    verifier = PartVerifier(part_path, _checked_parts(conn, container, path, headers, size))
+    lock = threading.Lock()
+    progress = {'contiguous': 0, 'bytes': 0}
+
+    def completed(i):
+        # called with lock held
+        done[i] = True
+        state['done'] = [n for n, finished in enumerate(done) if finished]
+        _save_json(state_path, state)
+        while progress['contiguous'] < len(ranges) and done[progress['contiguous']]:
+            progress['contiguous'] += 1
+        if progress['contiguous']:
+            offset, length = ranges[progress['contiguous'] - 1]
+            verifier.advance(offset + length)
+
+    def fetch(worker_conn, i):
+        offset, length = ranges[i]
+        range_headers = {'Range': 'bytes={0}-{1}'.format(offset, offset + length - 1)}
+        if etag and not _is_large_object(headers):
+            # fail instead of mixing ranges of different versions of the object
+            range_headers['If-Match'] = etag
+        resp_headers, body = worker_conn.get_object(container, path, resp_chunk_size=CHUNK_SIZE,
+                                                    headers=range_headers)
+        if int(resp_headers['content-length']) != length:
+            raise ClientException('Server did not return the requested range of {0}/{1}'.format(container, path))
+        written = 0
+        with open(part_path, 'r+b') as f:
+            f.seek(offset)
+            for chunk in body:
+                f.write(chunk)
+                written += len(chunk)
+        if written != length:
+            raise ClientException('Short read downloading {0}/{1}'.format(container, path))
+        with lock:
+            progress['bytes'] += length
+            completed(i)
+
+    with lock:
+        for i in xrange(len(ranges)):
+            if done[i]:
+                completed(i)
+    parallel_map(conn, fetch, [i for i in xrange(len(ranges)) if not done[i]], jobs)
+    verifier.advance(size)
+
+    if verifier.failed:
+        os.unlink(part_path)
+        os.unlink(state_path)
+        raise ClientException('MD5 mismatch downloading {0}/{1}'.format(container, path))
+    os.rename(part_path, local_path)
+    os.unlink(state_path)
+    return progress['bytes']
+
+
+class HashCache(object):
+    """Remembers ETags of files in a local directory, so unchanged files are not read again
+
+    Entries are keyed by path relative to the directory and valid as long
+    as the size and mtime of the file stay the same. Each one maps kinds
+    of ETags to their values: the MD5 sum of the file ('md5'), the ETag of
+    a static large object made of it ('slo:<segment size>') or the ETag
+    of the object it was downloaded from ('remote').
+    """
+
+    def __init__(self, root):
+        self.path = os.path.join(SYNC_CACHE_DIR, hashlib.md5(os.path.abspath(root)).hexdigest() + '.json')
+        self.entries = _load_json(self.path) or {}
+        self.lock = threading.Lock()
+
+    def etags(self, rel, stat):
+        with self.lock:
+            entry = self.entries.get(rel)
+        if entry is None or entry[0] != stat.st_size or entry[1] != stat.st_mtime:
+            return {}
+        return entry[2]
+
+    def update(self, rel, stat, etags):
+        with self.lock:
+            self.entries[rel] = [stat.st_size, stat.st_mtime, etags]
+
+    def save(self, keep):
+        """Saves the entries of files in keep, forgetting the rest"""
+        if not os.path.isdir(SYNC_CACHE_DIR):
+            os.makedirs(SYNC_CACHE_DIR)
+        with self.lock:
+            _save_json(self.path, dict((rel, entry) for rel, entry in self.entries.iteritems() if rel in keep))
+
+
+def file_etags(path, size, segment_size):
+    """Returns the ETags (see HashCache) a file has when uploaded with the given segment size"""
+    whole = hashlib.md5()
+    segment_size = slo_segment_size(size, segment_size)
+    segments = []
+    segment = hashlib.md5()
+    segment_left = segment_size
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(min(CHUNK_SIZE * 16, segment_left))
+            if not data:
+                break
+            whole.update(data)
+            segment.update(data)
+            segment_left -= len(data)
+            if not segment_left:
+                segments.append(segment.hexdigest())
+                segment = hashlib.md5()
+                segment_left = segment_size
+    etags = {'md5': whole.hexdigest()}
+    if size > segment_size:
+        if segment_left < segment_size:
+            segments.append(segment.hexdigest())
+        etags['slo:{0}'.format(segment_size)] = hashlib.md5(''.join(segments)).hexdigest()
+    return etags
+
+
+def _native_path(path):
+    """Local paths are handled as byte strings, object names (and paths relative to roots) as unicode"""
+    if isinstance(path, unicode):
+        return path.encode('utf-8')
+    return path
+
+
+def _local_files(root, dirs=None):
+    """Returns {path relative to root: stat} of regular files under root
+
+    Relative paths use / separators and are decoded from UTF-8, like object
+    names; files with names in other encodings are left out. Relative paths
+    of directories are added to dirs.
+    """
+    files = {}
+    for dirpath, _dirnames, filenames in os.walk(root):
+        try:
+            rel_dir = os.path.relpath(dirpath, root).replace(os.sep, '/').decode('utf-8')
+        except UnicodeDecodeError:
+            continue
+        if dirs is not None and rel_dir != '.':
+            dirs.add(rel_dir)
+        for name in filenames:
+            try:
+                stat = os.stat(os.path.join(dirpath, name))
+                name = name.decode('utf-8')
+            except (OSError, UnicodeDecodeError):
+                continue
+            if S_ISREG(stat.st_mode):
+                files[name if rel_dir == '.' else rel_dir + '/' + name] = stat
+    return files
+
+
+def _remote_objects(conn, container, prefix):
+    """Returns {name relative to prefix: listing entry} of objects under prefix"""
+    return dict((obj['name'][len(prefix):], obj) for obj in iter_objects(conn, container, prefix=prefix or None)
+                if obj['name'] != prefix)
+
+
+def _local_path(root, rel):
+    parts = rel.split('/')
+    if '' in parts or '.' in parts or '..' in parts:
+        # would end up outside of root or at a different path
+        return None
+    return os.path.join(root, *[part.encode('utf-8') for part in parts])
+
+
+def _is_directory(obj):
+    return obj['content_type'] == 'application/directory'
+
+
+def sync_upload(conn, local_dir, container, prefix, segment_size, jobs=4, delete=False, dry_run=False,
+                report=None):
+    """Uploads files from local_dir missing or different under container/prefix
+
+    Files are compared by size first and by ETag when sizes are equal.
+    With delete, objects without a local counterpart are deleted.
+    report(action, name) is called before each upload ('upload') and
+    deletion ('delete'). Returns (transferred, unchanged, deleted) counts.
+    """
+    local_dir = _native_path(local_dir)
+    try:
+        remote = _remote_objects(conn, container, prefix)
+    except ClientException as e:
+        if e.http_status != 404:
+            raise
+        if not dry_run:
+            conn.put_container(container)
+        remote = {}
+    local_dirs = set()
+    files = _local_files(local_dir, local_dirs)
+    cache = HashCache(local_dir)
+    lock = threading.Lock()
+
+    def notify(action, rel):
+        if report is not None:
+            with lock:
+                report(action, rel)
+
+    def upload(worker_conn, rel):
+        path = _local_path(local_dir, rel)
+        stat = files[rel]
+        obj = remote.get(rel)
+        if obj is not None and obj['bytes'] == stat.st_size and not _is_directory(obj):
+            etags = cache.etags(rel, stat)
+            if obj['hash'] not in etags.values():
+                etags = dict(etags, **file_etags(path, stat.st_size, segment_size))
+                cache.update(rel, stat, etags)
+            if obj['hash'] in etags.values():
+                return False
+        notify('upload', rel)
+        if dry_run:
+            return True
+        if stat.st_size > segment_size:
+            segments = upload_segmented(worker_conn, container, prefix + rel, path, segment_size, jobs=1)
+            etags = {'slo:{0}'.format(slo_segment_size(stat.st_size, segment_size)):
+                     hashlib.md5(''.join(segments)).hexdigest()}
+        else:
+            reader = FileSegment(path, 0, stat.st_size)
+            try:
+                etag = worker_conn.put_object(container, prefix + rel, reader, content_length=stat.st_size)
+            finally:
+                reader.close()
+            if etag is None or etag.strip('"') != reader.md5.hexdigest():
+                raise ClientException('MD5 mismatch uploading {0}'.format(path))
+            etags = {'md5': reader.md5.hexdigest()}
+        cache.update(rel, stat, etags)
+        return True
+
+    stale = []
+    if delete:
+        stale = sorted(rel for rel, obj in remote.iteritems()
+                       if rel not in files and not (_is_directory(obj) and rel in local_dirs))
+    try:
+        transferred = sum(parallel_map(conn, upload, sorted(files), jobs))
+    finally:
+        cache.save(files)
+    for rel in stale:
+        notify('delete', rel)
+    if stale and not dry_run:
+        delete_objects(conn, container, [prefix + rel for rel in stale], jobs)
+    return transferred, len(files) - transferred, len(stale)
+
+
+def sync_download(conn, local_dir, container, prefix, range_size, segment_size, jobs=4, delete=False,
+                  dry_run=False, report=None):
+    """Downloads objects under container/prefix missing or different in local_dir
+
+    Objects are compared as in sync_upload, segment_size is only used to
+    compute ETags of local files. Objects larger than range_size are
+    downloaded like with download_object. With delete, local files without
+    a remote counterpart are deleted. report(action, name) is called
+    before each download ('download'), deletion ('delete') and for
+    objects whose names cannot be local paths ('skip').
+    Returns (transferred, unchanged, deleted) counts.
+    """
+    local_dir = _native_path(local_dir)
+    remote = _remote_objects(conn, container, prefix)
+    files = _local_files(local_dir) if os.path.isdir(local_dir) else {}
+    cache = HashCache(local_dir)
+    lock = threading.Lock()
+
+    def notify(action, rel):
+        if report is not None:
+            with lock:
+                report(action, rel)
+
+    objects = []
+    for rel, obj in sorted(remote.iteritems()):
+        path = _local_path(local_dir, rel)
+        if path is None:
+            notify('skip', rel)
+        elif _is_directory(obj):
+            if not dry_run and not os.path.isdir(path):
+                os.makedirs(path)
+        else:
+            objects.append((rel, path, obj))
+
+    def download(worker_conn, item):
+        rel, path, obj = item
+        stat = files.get(rel)
+        if stat is not None and stat.st_size == obj['bytes']:
+            etags = cache.etags(rel, stat)
+            if obj['hash'] not in etags.values():
+                etags = dict(etags, **file_etags(path, stat.st_size, segment_size))
+                cache.update(rel, stat, etags)
+            if obj['hash'] in etags.values():
+                return False
+        notify('download', rel)
+        if dry_run:
+            return True
+        if not os.path.isdir(os.path.dirname(path)):
+            try:
+                os.makedirs(os.path.dirname(path))
+            except OSError:
+                # created by another worker in the meantime
+                if not os.path.isdir(os.path.dirname(path)):
+                    raise
+        if obj['bytes'] > range_size:
+            download_object(worker_conn, container, prefix + rel, path, range_size, jobs=1)
+        else:
+            part_path = path + '.part'
+            try:
+                with open(part_path, 'wb') as f:
+                    stream_object(worker_conn, container, prefix + rel, f)
+            except Exception:
+                os.unlink(part_path)
+                raise
+            os.rename(part_path, path)
+        cache.update(rel, os.stat(path), {'remote': obj['hash']})
+        return True
+
+    stale = []
+    if delete:
+        stale = sorted(rel for rel in files if rel not in remote and not rel.endswith(('.part', '.part.json')))
+    try:
+        transferred = sum(parallel_map(conn, download, objects, jobs))
+    finally:
+        cache.save(set(rel for rel, _path, _obj in objects))
+    # local deletions are quick, no need for worker threads (and their connections)
+    for rel in stale:
+        notify('delete', rel)
+        if not dry_run:
+            os.unlink(_local_path(local_dir, rel))
+    return transferred, len(objects) - transferred, len(stale)
@@ -1,6 +1,27 @@
+import csv
+import datetime
+import json
 import sys
+import unicodedata
+from collections import OrderedDict
+from itertools import islice
 
-from prettytable import PrettyTable
+
+def _cell_text(value):
+    if isinstance(value, str):
+        return value.decode('utf-8', 'replace')
+    return unicode(value)
+
+
+def _text_width(text):
+    """Number of terminal columns taken by text (wide East Asian characters count twice)"""
+    if all(ord(c) < 0x1100 for c in text):
+        return len(text)
+    return sum(2 if unicodedata.east_asian_width(c) in 'WF' else 1 for c in text)
+
+
+def _pad(text, width):
+    return text + ' ' * (width - _text_width(text))
 
 
 class Printer:
@@ -13,9 +34,16 @@ class Printer:
     def offset_print(self, text, offset=1):
         self.print_str(offset * ' ' + text)
 
-    def print_table(self, data, hmarg=1):
+    def print_table(self, data, hmarg=1, secondary=False):
+        """Prints a table given as a list of rows, the first one being the header
+
+        secondary marks further tables of a command with several ones
+        (which matters for machine-readable output only, see RecordPrinter).
+        """
         for i in xrange(hmarg):
             self.print_str('')
+        from prettytable import PrettyTable
+
         x = PrettyTable(data[0])
         if hasattr(x, 'set_field_align'):
             for f in data[0]:
@@ -28,6 +56,64 @@ class Printer:
         for i in xrange(hmarg):
             self.print_str('')
 
+    def print_table_stream(self, head, rows, window=50, hmarg=1, secondary=False):
+        """Prints a table (like print_table) while its rows are being generated
+
+        Column widths are computed from the header and the first window rows;
+        further rows are printed as soon as they arrive. When a later row does
+        not fit, its columns grow and a separator line marks the change.
+        Returns the number of printed rows, nothing is printed for no rows.
+        """
+        rows = iter(rows)
+        head = [_cell_text(h) for h in head]
+        widths = [_text_width(h) for h in head]
+
+        def split(row):
+            cells = [_cell_text(value).split('\n') for value in row]
+            for i, lines in enumerate(cells):
+                widths[i] = max([widths[i]] + [_text_width(line) for line in lines])
+            return cells
+
+        def border():
+            return '+' + '+'.join('-' * (w + 2) for w in widths) + '+'
+
+        def lines(cells):
+            for n in xrange(max(len(c) for c in cells)):
+                yield '| ' + ' | '.join(
+                    _pad(c[n] if n < len(c) else u'', w) for c, w in zip(cells, widths)) + ' |'
+
+        buffered = [split(row) for row in islice(rows, window)]
+        if not buffered:
+            return 0
+
+        for i in xrange(hmarg):
+            self.print_str('')
+        self.print_str(border())
+        for line in lines([[h] for h in head]):
+            self.print_str(line)
+        self.print_str(border())
+        for cells in buffered:
+            for line in lines(cells):
+                self.print_str(line)
+        self.output.flush()
+        count = len(buffered)
+        del buffered
+
+        for row in rows:
+            old_widths = list(widths)
+            cells = split(row)
+            if widths != old_widths:
+                self.print_str(border())
+            for line in lines(cells):
+                self.print_str(line)
+            self.output.flush()
+            count += 1
+
+        self.print_str(border())
+        for i in xrange(hmarg):
+            self.print_str('')
+        return count
+
     def print_hash_table(self, data, headers=None, order=False):
         if headers is None:
             headers = []
@@ -46,6 +132,87 @@ class Printer:
         self.print_table(data_array)
 
 
+class RecordPrinter(Printer):
+    """Base class for machine-readable output: every table row becomes a record
+
+    Records are written as soon as they are generated, without any layout
+    pass. Other text (titles, notes printed with print_str) goes to
+    the messages stream, so that it does not get mixed with the data.
+    So do secondary tables (e.g. the disks listed by OCI Settings after
+    its main table), the output only holds records of a single schema.
+    """
+
+    def __init__(self, output=sys.stdout, messages=sys.stderr):
+        Printer.__init__(self, output)
+        self.messages = messages
+
+    def print_str(self, text):
+        print >> self.messages, text
+
+    def print_table(self, data, hmarg=1, secondary=False):
+        self.print_table_stream(data[0], data[1:], secondary=secondary)
+
+    def print_table_stream(self, head, rows, window=None, hmarg=None, secondary=False):
+        output = self.messages if secondary else self.output
+        head = [_cell_text(h) for h in head]
+        count = 0
+        for row in rows:
+            if count == 0:
+                self.write_head(output, head)
+            self.write_row(output, head, row)
+            output.flush()
+            count += 1
+        return count
+
+    def write_head(self, output, head):
+        pass
+
+    def write_row(self, output, head, row):
+        raise NotImplementedError()
+
+
+def _json_value(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return _cell_text(value)
+
+
+class JsonLinesPrinter(RecordPrinter):
+    """One JSON object per line, keyed by column headers"""
+
+    def write_row(self, output, head, row):
+        output.write(json.dumps(OrderedDict(zip(head, row)), default=_json_value) + '\n')
+
+
+class CsvPrinter(RecordPrinter):
+    """CSV with a header line (UTF-8 encoded)"""
+    dialect = 'excel'
+
+    def _write(self, output, cells):
+        writer = csv.writer(output, dialect=self.dialect)
+        writer.writerow([(u'' if cell is None else _cell_text(cell)).encode('utf-8') for cell in cells])
+
+    def write_head(self, output, head):
+        self._write(output, head)
+
+    def write_row(self, output, head, row):
+        self._write(output, row)
+
+
+class TsvPrinter(CsvPrinter):
+    """Tab separated values with a header line (UTF-8 encoded)"""
+    dialect = 'excel-tab'
+
+
+# Printer classes for the --format option
+PRINTERS = OrderedDict([
+    ('table', Printer),
+    ('jsonl', JsonLinesPrinter),
+    ('csv', CsvPrinter),
+    ('tsv', TsvPrinter),
+])
+
+
 # a small test
 if __name__ == '__main__':
     p = Printer()
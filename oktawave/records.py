@@ -0,0 +1,94 @@
+from oktawave.client import ApiClient
+
+
+class Record(object):
+    """Read-only view of an API result object with lazily decoded fields
+
+    FIELDS maps field names to functions decoding the field from the raw
+    API data; a field is decoded on first access and remembered. Records
+    are accessed like the dicts they replace (record['name']), attribute
+    access (record.name) works too.
+    """
+    __slots__ = ('raw', '_values')
+
+    FIELDS = {}
+
+    def __init__(self, raw):
+        self.raw = raw
+        self._values = None
+
+    def __getitem__(self, key):
+        values = self._values
+        if values is not None and key in values:
+            return values[key]
+        value = self.FIELDS[key](self.raw)
+        if values is None:
+            values = self._values = {}
+        values[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        if self._values is None:
+            self._values = {}
+        self._values[key] = value
+
+    def __getattr__(self, name):
+        if name.startswith('_') or name == 'raw':
+            raise AttributeError(name)
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __contains__(self, key):
+        return key in self.FIELDS or (self._values is not None and key in self._values)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        keys = set(self.FIELDS)
+        if self._values is not None:
+            keys.update(self._values)
+        return sorted(keys)
+
+    def as_dict(self):
+        """Decodes all fields, returns them as a dict"""
+        return dict((key, self[key]) for key in self.keys())
+
+    def __repr__(self):
+        return '<{0} {1!r}>'.format(self.__class__.__name__, self.raw)
+
+
+def _lookup(raw, path):
+    for key in path:
+        raw = raw[key]
+    return raw
+
+
+def field(*path):
+    """Field taken as-is from raw['key1']['key2']..."""
+    return lambda raw: _lookup(raw, path)
+
+
+def convert(func, *path):
+    """Field decoded with func(raw['key1']['key2']...)"""
+    return lambda raw: func(_lookup(raw, path))
+
+
+def date(*path):
+    """Date field in the API's /Date(...)/ format, None stays None"""
+    def decode(raw):
+        value = _lookup(raw, path)
+        if value is None:
+            return None
+        return ApiClient.parse_date(value)
+    return decode
+
+
+def record_list(cls, *path):
+    """List of records of class cls, a missing (None) list is empty"""
+    return lambda raw: [cls(item) for item in _lookup(raw, path) or ()]
@@ -1,4 +1,24 @@
-from distutils.core import setup
+import sys
+from distutils.core import Command, setup
+
+
+class TestCommand(Command):
+    description = 'run the unit tests (in tests/)'
+    user_options = []
+
+    def initialize_options(self):
+        pass
+
+    def finalize_options(self):
+        pass
+
+    def run(self):
+        import unittest
+        suite = unittest.defaultTestLoader.discover('tests', top_level_dir='.')
+        result = unittest.TextTestRunner(verbosity=2).run(suite)
+        if not result.wasSuccessful():
+            sys.exit(1)
+
 
 setup(name='oktawave-cli',
       version='0.9.0',
@@ -10,8 +30,9 @@ setup(name='oktawave-cli',
       install_requires=['requests>=0.12.1', 'python-swiftclient',
                         'argparse', 'setproctitle', 'prettytable', 'click'],
       license='GPLv3',
+      cmdclass={'test': TestCommand},
       entry_points='''
         [console_scripts]
-        oktawave-cli=oktawave.cli:cli
+        oktawave-cli=oktawave.cli:main
         ''',
       )
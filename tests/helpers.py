@@ -0,0 +1,43 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from oktawave import fakeserver
+
+
+class TempDirTestCase(unittest.TestCase):
+    """Gives every test an empty temporary directory (self.tmp)"""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp(prefix='oktawave-test-')
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+
+
+class FakeApiTestCase(TempDirTestCase):
+    """Runs tests against a fresh oktawave.fakeserver (self.server)"""
+    fleet_args = {'vms': 20}
+    latency = 0.0
+
+    def setUp(self):
+        super(FakeApiTestCase, self).setUp()
+        self.server = fakeserver.start(latency=self.latency, **self.fleet_args)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def api(self, **kwargs):
+        from oktawave.api import OktawaveApi
+        return OktawaveApi('user', 'password', api_url=self.server.url, **kwargs)
+
+    def root_context(self, *args):
+        """Returns the context of oktawave-cli run with args against the fake server
+
+        Commands can then be run in it like batch, shell and agent do.
+        """
+        from oktawave.cli import cli
+        args = ['-c', os.path.join(self.tmp, 'config'), '-u', 'user', '-p', 'password',
+                '--api-url', self.server.url] + list(args)
+        ctx = cli.make_context('oktawave-cli', args)
+        self.addCleanup(ctx.close)
+        ctx.invoke(cli.callback, **ctx.params)
+        return ctx
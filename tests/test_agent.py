@@ -0,0 +1,167 @@
+import base64
+import os
+import socket
+import sys
+import threading
+
+from oktawave.agent import connect, forward, read_message, send_message
+from oktawave import agent as agent_client
+from oktawave.commands import agent
+from oktawave.commands.agent import SocketOutput, accept_request, handle_connection, listen
+from oktawave.commands.runner import CapturedOutput, install_output_router
+from tests.helpers import FakeApiTestCase
+
+
+def stream(messages, key='out'):
+    """Returns the bytes sent in key fields of messages"""
+    return ''.join(base64.b64decode(m[key]) for m in messages if key in m)
+
+
+class AgentTest(FakeApiTestCase):
+
+    def setUp(self):
+        super(AgentTest, self).setUp()
+        self.addCleanup(setattr, sys, 'stdout', sys.stdout)
+        self.addCleanup(setattr, sys, 'stderr', sys.stderr)
+        self.root_ctx = self.root_context()
+        self.router = install_output_router(self.root_ctx.obj)
+        self.listener = None
+
+    def argv(self, *args):
+        return ['-c', os.path.join(self.tmp, 'config'), '-u', 'user', '-p', 'password',
+                '--api-url', self.server.url] + list(args)
+
+    def connect(self):
+        """Returns a (client, agent) pair of connected sockets"""
+        path = os.path.join(self.tmp, 'agent.sock')
+        if self.listener is None:
+            self.listener = listen(path)
+            self.addCleanup(self.listener.close)
+        client = connect(path)
+        self.addCleanup(client.close)
+        conn, _addr = self.listener.accept()
+        self.addCleanup(conn.close)
+        return client, conn
+
+    def request(self, argv):
+        """Sends a request through handle_connection, returns the messages received"""
+        client, conn = self.connect()
+        f = client.makefile('r+b')
+        send_message(f, argv=argv, cwd=os.getcwd())
+        handle_connection(self.root_ctx, conn, self.router)
+        conn.close()
+        messages = []
+        while True:
+            message = read_message(f)
+            if message is None:
+                return messages
+            messages.append(message)
+
+    def test_accept(self):
+        self.assertEqual(accept_request(self.root_ctx, self.argv('OCI', 'List')), (['OCI', 'List'], None))
+
+    def test_refused(self):
+        self.assertEqual(accept_request(self.root_ctx, self.argv('shell')),
+                         (None, 'command not supported by agent'))
+        self.assertEqual(accept_request(self.root_ctx, self.argv('OCI', 'ssh', '1')),
+                         (None, 'command not supported by agent'))
+        self.assertEqual(accept_request(self.root_ctx, self.argv('OCI', 'List', '--help')),
+                         (None, 'help requested'))
+        self.assertEqual(accept_request(self.root_ctx, self.argv()), (None, 'no command'))
+
+    def test_different_options(self):
+        self.assertEqual(accept_request(self.root_ctx, self.argv('--format', 'csv', 'OCI', 'List')),
+                         (None, 'different value of output_format'))
+        argv = self.argv('OCI', 'List')
+        argv[argv.index('user')] = 'other'
+        self.assertEqual(accept_request(self.root_ctx, argv), (None, 'different credentials'))
+
+    def test_output_and_exit_code(self):
+        messages = self.request(self.argv('OCI', 'List'))
+        self.assertEqual(messages[:2], [{'ready': True}, {'accepted': True}])
+        self.assertEqual(messages[-1], {'exit': 0})
+        out = stream(messages)
+        self.assertIn('fake-vm-3', out)
+
+    def test_names_created_elsewhere(self):
+        self.assertEqual(self.request(self.argv('OCI', 'Settings', 'fake-vm-3'))[-1], {'exit': 0})
+        self.server.fleet.CloneVirtualMachine(3, 'newvm')
+        self.assertEqual(self.request(self.argv('OCI', 'Settings', 'newvm'))[-1], {'exit': 0})
+
+    def test_binary_output(self):
+        client, conn = self.connect()
+        output = SocketOutput(conn.makefile('r+b'))
+        # a UTF-8 character split between writes, then bytes which are not UTF-8 at all
+        for chunk in [u'\u0142'.encode('utf-8')[:1], u'\u0142'.encode('utf-8')[1:], '\xff\x00\n', u'\u0144']:
+            output.write(chunk)
+        conn.shutdown(socket.SHUT_WR)
+        f = client.makefile('r+b')
+        messages = list(iter(lambda: read_message(f), None))
+        self.assertEqual(stream(messages), u'\u0142'.encode('utf-8') + '\xff\x00\n' + u'\u0144'.encode('utf-8'))
+
+    def test_forward_binary_output(self):
+        path = os.path.join(self.tmp, 'agent.sock')
+        self.listener = listen(path)
+        self.addCleanup(self.listener.close)
+
+        def serve():
+            conn, _addr = self.listener.accept()
+            f = conn.makefile('r+b')
+            send_message(f, ready=True)
+            read_message(f)
+            send_message(f, accepted=True)
+            SocketOutput(f).write('\x89PNG\xff')
+            send_message(f, exit=0)
+            conn.shutdown(socket.SHUT_WR)
+
+        thread = threading.Thread(target=serve)
+        thread.start()
+        self.addCleanup(thread.join)
+        sys.stdout = CapturedOutput()
+        self.assertEqual(forward(['OCS', 'Get', 'c/p', '-o-'], path), 0)
+        self.assertEqual(sys.stdout.getvalue(), '\x89PNG\xff')
+
+    def test_busy_agent(self):
+        path = os.path.join(self.tmp, 'agent.sock')
+        self.listener = listen(path)
+        self.addCleanup(self.listener.close)
+        self.addCleanup(setattr, agent_client, 'READY_TIMEOUT', agent_client.READY_TIMEOUT)
+        agent_client.READY_TIMEOUT = 0.01
+        # nobody accepts the connection, the client runs the command by itself
+        self.assertIsNone(forward(['OCI', 'TurnOff', 'fake-vm-3'], path))
+        # and once the agent gets to it, there is nothing to run
+        conn, _addr = self.listener.accept()
+        self.addCleanup(conn.close)
+        self.server.reset_calls()
+        try:
+            handle_connection(self.root_ctx, conn, self.router)
+        except socket.error:
+            pass
+        self.assertEqual(self.server.reset_calls(), {})
+
+    def test_no_timeout_while_running(self):
+        # output may go to a slow reader (e.g. less), only the request has to come in time
+        self.addCleanup(setattr, agent, 'CLIENT_TIMEOUT', agent.CLIENT_TIMEOUT)
+        agent.CLIENT_TIMEOUT = 0.01
+        client, conn = self.connect()
+        send_message(client.makefile('r+b'), argv=self.argv('OCI', 'List'), cwd=os.getcwd())
+        handle_connection(self.root_ctx, conn, self.router)
+        self.assertIsNone(conn.gettimeout())
+
+    def test_usage_error(self):
+        messages = self.request(self.argv('OCI', 'Settings'))
+        self.assertEqual(messages[-1], {'exit': 2})
+        err = stream(messages, 'err')
+        self.assertIn('Missing argument', err)
+        self.assertFalse([m for m in messages if 'out' in m])
+
+    def test_fallback(self):
+        self.assertEqual(self.request(self.argv('shell')),
+                         [{'ready': True}, {'fallback': 'command not supported by agent'}])
+
+    def test_client_timeout(self):
+        _client, conn = self.connect()
+        self.addCleanup(setattr, agent, 'CLIENT_TIMEOUT', agent.CLIENT_TIMEOUT)
+        agent.CLIENT_TIMEOUT = 0.01
+        with self.assertRaises(socket.timeout):
+            handle_connection(self.root_ctx, conn, self.router)
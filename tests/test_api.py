@@ -0,0 +1,161 @@
+import os
+import sys
+import threading
+import unittest
+from time import time
+
+from click.testing import CliRunner
+
+from oktawave.api import OperationWatcher
+from oktawave.cli import cli
+from oktawave.commands.runner import run_captured
+from tests.helpers import FakeApiTestCase
+
+
+class PagedSearchTest(FakeApiTestCase):
+
+    def setUp(self):
+        super(PagedSearchTest, self).setUp()
+        self.api = self.api()
+        self.api.logon()
+        self.server.reset_calls()
+
+    def list_names(self, **kwargs):
+        return [vm.name for vm in self.api.OCI_ListDetails(**kwargs)]
+
+    def ignore_page_number(self, total_count=True):
+        page = self.server.fleet._page
+
+        def first_page(items, search_params):
+            result = page(items, dict(search_params, PageNumber=1))
+            if not total_count:
+                del result['_totalCount']
+            return result
+
+        self.server.fleet._page = first_page
+
+    def test_pages(self):
+        names = self.list_names(page_size=5)
+        self.assertEqual(names, ['fake-vm-{0}'.format(i) for i in range(1, 21)])
+        # the total count shows there is no fifth page
+        self.assertEqual(self.server.reset_calls(), {'GetVirtualMachines': 4})
+
+    def test_limit(self):
+        self.assertEqual(len(self.list_names(page_size=3, limit=7)), 7)
+        self.assertEqual(self.server.reset_calls(), {'GetVirtualMachines': 3})
+
+    def test_short_page(self):
+        self.ignore_page_number(total_count=False)
+        self.assertEqual(len(self.list_names(page_size=50)), 20)
+        self.assertEqual(self.server.reset_calls(), {'GetVirtualMachines': 1})
+
+    def test_short_page_with_total_count(self):
+        page = self.server.fleet._page
+
+        def short_first_page(items, search_params):
+            result = page(items, search_params)
+            if search_params.get('PageNumber') == 1:
+                result['_results'] = result['_results'][:-1]
+            return result
+
+        self.server.fleet._page = short_first_page
+        self.assertEqual(len(self.list_names(page_size=5)), 19)
+        # one item short of the total, so paging goes on until an empty page
+        self.assertEqual(self.server.reset_calls(), {'GetVirtualMachines': 5})
+
+    def test_default_page_size(self):
+        self.assertEqual(len(self.list_names()), 20)
+        self.assertEqual(self.server.reset_calls(), {'GetVirtualMachines': 1})
+
+    def test_page_number_ignored(self):
+        self.ignore_page_number()
+        self.assertEqual(len(self.list_names(page_size=5)), 5)
+
+    def test_page_number_ignored_without_total_count(self):
+        self.ignore_page_number(total_count=False)
+        self.assertEqual(len(self.list_names(page_size=5)), 5)
+        self.assertEqual(self.server.reset_calls(), {'GetVirtualMachines': 2})
+
+
+class OperationWatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.polls = 0
+        self.operations = [{'ObjectName': 'a'}, {'ObjectName': 'b'}]
+        self.watcher = OperationWatcher(self.poll)
+        self.watcher.MIN_INTERVAL = 0.01
+        self.watcher.MAX_INTERVAL = 0.05
+
+    def poll(self):
+        self.polls += 1
+        if self.polls == 3:
+            # everything finishes, the third poll shows it
+            del self.operations[:]
+        return list(self.operations)
+
+    def test_wait(self):
+        self.assertTrue(self.watcher.wait(lambda op: op['ObjectName'] == 'a'))
+        self.assertEqual(self.polls, 3)
+
+    def test_timeout(self):
+        self.watcher.poll = lambda: self.operations
+        start = time()
+        self.assertFalse(self.watcher.wait(lambda op: op['ObjectName'] == 'b', timeout=0.1))
+        self.assertLess(time() - start, 0.5)
+
+    def test_shared_polls(self):
+        self.operations = [{'ObjectName': str(i)} for i in range(10)]
+        results = []
+
+        def wait(name):
+            results.append(self.watcher.wait(lambda op: op['ObjectName'] == name, timeout=5))
+
+        threads = [threading.Thread(target=wait, args=(str(i),)) for i in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [True] * 10)
+        # waiters polling by themselves would make at least one poll each
+        self.assertLess(self.polls, 10)
+
+
+class WaitCommandTest(FakeApiTestCase):
+    fleet_args = {'vms': 20, 'operation_time': 0.3}
+
+    def setUp(self):
+        super(WaitCommandTest, self).setUp()
+        self.addCleanup(setattr, sys, 'stdout', sys.stdout)
+        self.addCleanup(setattr, sys, 'stderr', sys.stderr)
+        self.addCleanup(setattr, OperationWatcher, 'MIN_INTERVAL', OperationWatcher.MIN_INTERVAL)
+        OperationWatcher.MIN_INTERVAL = 0.05
+        self.root_ctx = self.root_context()
+
+    def run_command(self, *args):
+        return run_captured(self.root_ctx, list(args))
+
+    def test_turn_on(self):
+        self.server.reset_calls()
+        result = self.run_command('OCI', 'TurnOn', '7', '--wait')
+        self.assertTrue(result.ok, result.output)
+        calls = self.server.reset_calls()
+        self.assertEqual(calls.get('GetVirtualMachineById'), 1)
+        self.assertNotIn('GetVirtualMachinesSimple', calls)
+        self.assertGreater(calls['GetRunningOperations'], 1)
+
+    def test_timeout(self):
+        result = self.run_command('OCI', 'TurnOn', '7', '--wait', '--timeout', '0.1')
+        self.assertEqual(result.exit_code, 1)
+        self.assertIn('ERROR: Operations on fake-vm-7 still running after 0.1s', result.output)
+
+    def test_exit_status(self):
+        args = ['-c', os.path.join(self.tmp, 'config'), '-u', 'user', '-p', 'password', '--api-url', self.server.url,
+                'OCI', 'TurnOn', '7', '--wait', '--timeout', '0.1']
+        self.assertEqual(CliRunner().invoke(cli, args).exit_code, 1)
+
+    def test_backup_waits_for_instance(self):
+        # an operation on an unrelated object named like the logical database stays running
+        self.server.fleet._operation(630, 640, 3, 'db')
+        self.server.fleet.operations[-1]['started'] += 60
+        result = self.run_command('ORDB', 'BackupLogicalDatabase', '10', 'db', '--wait', '--timeout', '5')
+        self.assertTrue(result.ok, result.output)
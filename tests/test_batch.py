@@ -0,0 +1,87 @@
+import threading
+import unittest
+from StringIO import StringIO
+
+import click
+
+from oktawave.commands.batch import read_batch
+from oktawave.commands.context import OktawaveCliContext
+from oktawave.commands.runner import CapturedOutput, run_captured
+from tests.helpers import FakeApiTestCase
+
+
+class ReadBatchTest(unittest.TestCase):
+
+    def test_stages(self):
+        stages = read_batch(StringIO(
+            '# comment\n'
+            'OCI List\n'
+            '\n'
+            'OCI Settings "my vm"\n'
+            'wait\n'
+            'wait\n'
+            'OVS List\n'
+            'wait\n'))
+        self.assertEqual(stages, [
+            [(2, ['OCI', 'List']), (4, ['OCI', 'Settings', 'my vm'])],
+            [(7, ['OVS', 'List'])],
+        ])
+
+    def test_syntax_error(self):
+        with self.assertRaises(click.BadParameter) as cm:
+            read_batch(StringIO('OCI List\nOCI Settings "unterminated\n'))
+        self.assertIn('line 2', cm.exception.format_message())
+
+
+class SingleLoginTest(FakeApiTestCase):
+    latency = 0.05
+
+    def test_concurrent_jobs_log_on_once(self):
+        ctx = OktawaveCliContext()
+        ctx.init_api('user', 'password', api_url=self.server.url)
+        apis = []
+        threads = [threading.Thread(target=lambda: apis.append(ctx.api)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(set(map(id, apis))), 1)
+        self.assertEqual(self.server.reset_calls(), {'LogonUser': 1})
+
+
+class RunCapturedTest(FakeApiTestCase):
+
+    def test_output_captured(self):
+        root_ctx = self.root_context('--format', 'tsv')
+        result = run_captured(root_ctx, ['OCI', 'List'])
+        self.assertTrue(result.ok)
+        lines = result.output.splitlines()
+        self.assertEqual(lines[0], 'Virtual machine ID\tName\tStatus')
+        self.assertEqual(lines[3], '3\tfake-vm-3\tPowered on')
+        self.assertEqual(len(lines), 21)
+
+    def test_single_schema_output(self):
+        root_ctx = self.root_context('--format', 'csv')
+        errors = CapturedOutput()
+        result = run_captured(root_ctx, ['OCI', 'Settings', 'fake-vm-3'], errors=errors)
+        self.assertTrue(result.ok)
+        lines = result.output.splitlines()
+        self.assertEqual(lines[0], 'Key,Value')
+        self.assertEqual([line for line in lines if line.startswith('Key,')], ['Key,Value'])
+        self.assertIn('Hard disks', errors.getvalue())
+        self.assertIn('\nID,Name,Capacity (GB)', errors.getvalue())
+
+    def test_usage_error(self):
+        result = run_captured(self.root_context(), ['OCI', 'NoSuchCommand'])
+        self.assertFalse(result.ok)
+        self.assertIn('No such command', result.error)
+
+    def test_nested_runner_refused(self):
+        result = run_captured(self.root_context(), ['batch', '-'])
+        self.assertFalse(result.ok)
+        self.assertIn('cannot be nested', result.error)
+
+    def test_api_error(self):
+        result = run_captured(self.root_context(), ['OCI', 'Settings', '999'])
+        self.assertFalse(result.ok)
+        self.assertIn('Virtual machine 999 not found', result.error)
@@ -0,0 +1,20 @@
+import subprocess
+import sys
+import unittest
+
+from oktawave.bench import PACKAGE_ROOT, check_result
+
+
+class CommandsBenchTest(unittest.TestCase):
+
+    def test_commands_within_baseline(self):
+        proc = subprocess.Popen([sys.executable, '-m', 'oktawave.bench', 'commands', '--latency', '0', '--runs', '1'],
+                                stdout=subprocess.PIPE, stderr=subprocess.STDOUT, cwd=PACKAGE_ROOT)
+        out, _err = proc.communicate()
+        self.assertEqual(proc.returncode, 0, out)
+
+    def test_check_result(self):
+        result = {'command': 'OCI List', 'seconds': 0.5, 'round_trips': 2}
+        self.assertEqual(check_result(result, 1, 1.0, 0.0, warm=False), [])
+        self.assertEqual(check_result(result, 1, 1.0, 0.0, warm=True), ['2 round trips, expected 1'])
+        self.assertEqual(check_result(result, 1, 0.1, 0.1, warm=False), ['0.500s, budget 0.300s'])
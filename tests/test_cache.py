@@ -0,0 +1,110 @@
+import os
+
+from oktawave.cache import FileCache, ListingCache
+from tests.helpers import TempDirTestCase
+
+
+class FileCacheTest(TempDirTestCase):
+
+    def cache(self, ttl=60):
+        return FileCache(os.path.join(self.tmp, 'sub', 'cache'), ttl)
+
+    def test_set_get(self):
+        self.cache().set('key', {'a': [1, 2]})
+        self.assertEqual(self.cache().get('key'), {'a': [1, 2]})
+        self.assertIsNone(self.cache().get('other'))
+
+    def test_expired(self):
+        cache = self.cache(ttl=-1)
+        cache.set('key', 'value')
+        self.assertIsNone(cache.get('key'))
+
+    def test_zero_ttl_disables(self):
+        cache = self.cache(ttl=0)
+        cache.set('key', 'value')
+        self.assertIsNone(cache.get('key'))
+        self.assertFalse(os.path.exists(cache.path))
+
+    def test_delete_prefix(self):
+        cache = self.cache()
+        cache.set('user:a', 1)
+        cache.set('user:b', 2)
+        cache.set('other:a', 3)
+        cache.delete_prefix('user:')
+        self.assertEqual([cache.get('user:a'), cache.get('user:b'), cache.get('other:a')], [None, None, 3])
+
+    def test_corrupted_file(self):
+        cache = self.cache()
+        os.makedirs(os.path.dirname(cache.path))
+        with open(cache.path, 'w') as f:
+            f.write('not json')
+        self.assertIsNone(cache.get('key'))
+        cache.set('key', 'value')
+        self.assertEqual(cache.get('key'), 'value')
+
+
+class ListingCacheTest(TempDirTestCase):
+
+    VALIDATORS = {'x-container-object-count': '2', 'x-container-bytes-used': '10'}
+    ENTRIES = [{'name': u'a', 'bytes': 4}, {'name': u'\u017c', 'bytes': 6}]
+
+    def cache(self, max_size=10000, max_age=60):
+        return ListingCache(os.path.join(self.tmp, 'listings'), max_size, max_age)
+
+    def store(self, cache, group='user/c', key='k', entries=None):
+        return list(cache.store(group, key, self.VALIDATORS, iter(entries or self.ENTRIES)))
+
+    def test_store_get(self):
+        self.assertEqual(self.store(self.cache()), self.ENTRIES)
+        self.assertEqual(list(self.cache().get('user/c', 'k', self.VALIDATORS)), self.ENTRIES)
+        self.assertIsNone(self.cache().get('user/c', 'other', self.VALIDATORS))
+
+    def test_validators_changed(self):
+        self.store(self.cache())
+        validators = dict(self.VALIDATORS, **{'x-container-object-count': '3'})
+        self.assertIsNone(self.cache().get('user/c', 'k', validators))
+
+    def test_expired(self):
+        self.store(self.cache())
+        self.assertIsNone(self.cache(max_age=-1).get('user/c', 'k', self.VALIDATORS))
+
+    def test_disabled(self):
+        for cache in (self.cache(max_size=0), self.cache(max_age=0)):
+            self.assertEqual(self.store(cache), self.ENTRIES)
+            self.assertFalse(os.path.exists(cache.path))
+
+    def test_partly_read_listing_not_stored(self):
+        cache = self.cache()
+        entries = cache.store('user/c', 'k', self.VALIDATORS, iter(self.ENTRIES))
+        next(entries)
+        entries.close()
+        self.assertIsNone(cache.get('user/c', 'k', self.VALIDATORS))
+        self.assertEqual(os.listdir(cache.path), [])
+
+    def test_too_big(self):
+        cache = self.cache(max_size=50)
+        self.assertEqual(self.store(cache), self.ENTRIES)
+        self.assertIsNone(cache.get('user/c', 'k', self.VALIDATORS))
+
+    def test_invalidate(self):
+        cache = self.cache()
+        self.store(cache, key='k1')
+        self.store(cache, key='k2')
+        self.store(cache, group='user/d')
+        cache.invalidate('user/c')
+        self.assertIsNone(cache.get('user/c', 'k1', self.VALIDATORS))
+        self.assertIsNone(cache.get('user/c', 'k2', self.VALIDATORS))
+        self.assertIsNotNone(cache.get('user/d', 'k', self.VALIDATORS))
+
+    def test_least_recently_used_evicted(self):
+        cache = self.cache(max_size=400)
+        self.store(cache, key='k1')
+        self.store(cache, key='k2')
+        old = os.path.getmtime(cache._file('user/c', 'k1')) - 10
+        os.utime(cache._file('user/c', 'k1'), (old, old))
+        os.utime(cache._file('user/c', 'k2'), (old - 10, old - 10))
+        list(cache.get('user/c', 'k2', self.VALIDATORS))
+        self.store(cache, key='k3')
+        self.assertIsNone(cache.get('user/c', 'k1', self.VALIDATORS))
+        self.assertIsNotNone(cache.get('user/c', 'k2', self.VALIDATORS))
+        self.assertIsNotNone(cache.get('user/c', 'k3', self.VALIDATORS))
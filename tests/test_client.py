@@ -0,0 +1,169 @@
+import json
+import unittest
+
+from oktawave.client import BackgroundCall, CallMemo, CallStats, ResultsStream
+from tests.helpers import FakeApiTestCase
+
+
+class TransportTest(FakeApiTestCase):
+
+    def test_services_share_connection_pool(self):
+        api = self.api()
+        api.logon()
+        self.assertIs(api.common.transport, api.clients.transport)
+        list(api.OCI_List())
+        list(api.Account_Users())
+        stats = api.pool_stats()
+        self.assertEqual(len(stats), 1)
+        self.assertEqual(stats[0]['requests'], 3)
+        self.assertEqual(stats[0]['connections_opened'], 1)
+
+    def test_call_async(self):
+        api = self.api()
+        api.logon()
+        vlan = api.clients.call_async('GetVlanById', vlanId=2, clientId=api.client_id)
+        vm = api.clients.call_async('GetVirtualMachineById', virtualMachineId=3, clientId=api.client_id)
+        self.assertEqual(vlan.result()['VlanName'], 'fake-opn-2')
+        self.assertEqual(vm.result()['VirtualMachineName'], 'fake-vm-3')
+
+
+class CallStatsTest(FakeApiTestCase):
+
+    def test_summary(self):
+        stats = CallStats()
+        for i in range(1, 101):
+            stats('GetA', i / 100.0, 10, 100, 0.001, None)
+        stats('GetB', 100.0, 1, 2, 0.5, ValueError())
+        summary = stats.summary()
+        self.assertEqual([row['method'] for row in summary], ['GetB', 'GetA'])
+        row = summary[1]
+        self.assertEqual((row['calls'], row['errors'], row['request_bytes'], row['response_bytes']),
+                         (100, 0, 1000, 10000))
+        self.assertEqual((row['p50_seconds'], row['p90_seconds'], row['p99_seconds'], row['max_seconds']),
+                         (0.5, 0.9, 0.99, 1.0))
+        self.assertAlmostEqual(row['total_seconds'], 50.5)
+        self.assertAlmostEqual(row['decode_seconds'], 0.1)
+        self.assertEqual(summary[0]['errors'], 1)
+
+    def test_api_calls_counted(self):
+        stats = CallStats()
+        api = self.api(call_hooks=[stats])
+        list(api.OCI_List())
+        list(api.OCI_ListDetails())
+        with self.assertRaises(Exception):
+            api.OCI_Settings(999)
+        summary = dict((row['method'], row) for row in stats.summary())
+        self.assertEqual(sorted(summary), ['GetVirtualMachineById', 'GetVirtualMachines', 'GetVirtualMachinesSimple',
+                                           'LogonUser'])
+        self.assertEqual(summary['GetVirtualMachineById']['errors'], 1)
+        for row in summary.values():
+            self.assertEqual(row['calls'], 1)
+            self.assertGreater(row['request_bytes'], 0)
+            self.assertGreater(row['response_bytes'], 0)
+
+
+class CallMemoTest(FakeApiTestCase):
+
+    def setUp(self):
+        super(CallMemoTest, self).setUp()
+        self.api = self.api()
+        self.api.logon()
+        self.server.reset_calls()
+
+    def test_keys(self):
+        memo = CallMemo()
+        self.assertEqual(memo.key('u', 'GetVlanById', {'b': 1, 'a': 2}), memo.key('u', 'GetVlanById', {'a': 2, 'b': 1}))
+        self.assertNotEqual(memo.key('u', 'GetVlanById', {'a': 1}), memo.key('u', 'GetVlanById', {'a': 2}))
+        self.assertIsNone(memo.key('u', 'GetRunningOperations', {}))
+        self.assertIsNone(memo.key('u', 'TurnOnVirtualMachine', {}))
+        self.assertFalse(memo.changes_data('IsVirtualMachineRunning'))
+        self.assertTrue(memo.changes_data('TurnOnVirtualMachine'))
+
+    def test_repeated_call(self):
+        first = self.api.OCI_Settings(3)
+        first.raw['VirtualMachineName'] = 'changed'
+        self.assertEqual(self.api.OCI_Settings(3).name, 'fake-vm-3')
+        self.assertEqual(self.server.reset_calls(), {'GetVirtualMachineById': 1})
+
+    def test_forgotten(self):
+        self.api.OCI_Settings(3)
+        self.api.forget_calls()
+        self.api.OCI_Settings(3)
+        self.api.OCI_TurnOn(7)
+        self.api.OCI_Settings(3)
+        self.assertEqual(self.server.reset_calls(), {'GetVirtualMachineById': 3, 'TurnOnVirtualMachine': 1})
+
+    def test_volatile_method(self):
+        list(self.api.Account_RunningJobs())
+        list(self.api.Account_RunningJobs())
+        self.assertEqual(self.server.reset_calls(), {'GetRunningOperations': 2})
+
+
+class BackgroundCallTest(unittest.TestCase):
+
+    def test_result(self):
+        call = BackgroundCall(lambda a, b=0: a + b, 1, b=2)
+        self.assertEqual(call.result(), 3)
+        self.assertTrue(call.done())
+
+    def test_exception_reraised(self):
+        def fail():
+            raise ValueError('boom')
+
+        call = BackgroundCall(fail)
+        with self.assertRaises(ValueError):
+            call.result()
+
+
+class ResultsStreamTest(unittest.TestCase):
+
+    DOCUMENT = json.dumps({
+        '_totalCount': 4,
+        '_results': [{'id': 1, 'name': u'\u017c]\\"'}, 12345, [1, [2]], None],
+    }, ensure_ascii=False)
+
+    def feed(self, chunks):
+        parser = ResultsStream()
+        items = []
+        for chunk in chunks:
+            items.extend(parser.feed(chunk))
+        return parser, items
+
+    def test_any_split(self):
+        expected = json.loads(self.DOCUMENT)['_results']
+        for size in range(1, 20):
+            chunks = [self.DOCUMENT[i:i + size] for i in range(0, len(self.DOCUMENT), size)]
+            parser, items = self.feed(chunks)
+            self.assertEqual(items, expected)
+            self.assertTrue(parser.finished)
+
+    def test_number_across_chunks(self):
+        parser, items = self.feed(['{"_results": [123', '45, 6', '7]}'])
+        self.assertEqual(items, [12345, 67])
+
+    def test_items_available_early(self):
+        parser = ResultsStream()
+        self.assertEqual(parser.feed('{"_results": [{"id": 1}, {"id"'), [{'id': 1}])
+        self.assertEqual(parser.feed(': 2}]'), [{'id': 2}])
+        self.assertEqual(parser.feed(', "_totalCount": 2}'), [])
+
+    def test_truncated(self):
+        parser, items = self.feed(['{"_results": [{"id": 1}, {"id": 2'])
+        self.assertEqual(items, [{'id': 1}])
+        self.assertTrue(parser.started)
+        self.assertFalse(parser.finished)
+
+    def test_no_results(self):
+        parser, items = self.feed(['{"_totalCount": 0, ', '"_res', 'ults": []}'])
+        self.assertEqual(items, [])
+        self.assertTrue(parser.finished)
+        parser, items = self.feed(['{"ErrorMsg": "x"}'])
+        self.assertFalse(parser.started)
+
+    def test_total_count(self):
+        parser, items = self.feed(['{"_totalCount": 1', '2, "_results": [1]}'])
+        self.assertEqual(parser.total_count, 12)
+        parser, items = self.feed(['{"_results": [1], "_totalCount": 3', '4}'])
+        self.assertEqual(parser.total_count, 34)
+        parser, items = self.feed(['{"_results": [{"_totalCount": 5}]}'])
+        self.assertIsNone(parser.total_count)
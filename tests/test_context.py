@@ -0,0 +1,64 @@
+import os
+
+from oktawave import fakeserver
+from oktawave.cache import FileCache
+from oktawave.commands.context import OktawaveCliContext
+from oktawave.commands.oci import OCIParam
+from tests.helpers import FakeApiTestCase
+
+
+class LazyApiTest(FakeApiTestCase):
+
+    def context(self):
+        ctx = OktawaveCliContext()
+        ctx.init_api('user', 'password', api_url=self.server.url)
+        return ctx
+
+    def test_no_calls_until_used(self):
+        ctx = self.context()
+        self.assertEqual(self.server.reset_calls(), {})
+        api = ctx.api
+        self.assertIs(ctx.api, api)
+        self.assertEqual(self.server.reset_calls(), {'LogonUser': 1})
+
+    def test_missing_credentials(self):
+        ctx = OktawaveCliContext()
+        ctx.init_api(None, None, api_url=self.server.url)
+        with self.assertRaises(SystemExit):
+            ctx.api
+        self.assertEqual(self.server.reset_calls(), {})
+
+
+class NameIndexTest(FakeApiTestCase):
+
+    def context(self, api_url=None):
+        ctx = OktawaveCliContext()
+        ctx.init_api('user', 'password', api_url=api_url or self.server.url)
+        ctx.init_names(FileCache(os.path.join(self.tmp, 'names'), 60))
+        return ctx
+
+    def test_index_stored(self):
+        index, fresh = self.context().name_index(OCIParam())
+        self.assertTrue(fresh)
+        self.assertEqual(index['fake-vm-3'], [3])
+        self.server.reset_calls()
+        index, fresh = self.context().name_index(OCIParam())
+        self.assertFalse(fresh)
+        self.assertEqual(index['fake-vm-3'], [3])
+        self.assertEqual(self.server.reset_calls(), {})
+
+    def test_index_per_endpoint(self):
+        self.context().name_index(OCIParam())
+        other = fakeserver.start(vms=2)
+        self.addCleanup(other.server_close)
+        self.addCleanup(other.shutdown)
+        index, fresh = self.context(other.url).name_index(OCIParam())
+        self.assertTrue(fresh)
+        self.assertEqual(sorted(index), ['fake-vm-1', 'fake-vm-2'])
+
+    def test_invalidate(self):
+        ctx = self.context()
+        ctx.name_index(OCIParam())
+        ctx.invalidate_names()
+        index, fresh = self.context().name_index(OCIParam())
+        self.assertTrue(fresh)
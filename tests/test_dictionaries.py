@@ -0,0 +1,58 @@
+import os
+
+from oktawave.api import DictionaryRegistry
+from oktawave.cache import FileCache
+from tests.helpers import FakeApiTestCase
+
+
+def raw_item(item_id, name):
+    return {'DictionaryItemId': item_id, 'DictionaryItemNames': [{'LanguageDictId': 2, 'ItemName': name}]}
+
+
+class DictionaryRegistryTest(FakeApiTestCase):
+
+    def test_loaded_once(self):
+        loaded = []
+
+        def loader(dict_id):
+            loaded.append(dict_id)
+            return [raw_item(1, 'one'), raw_item(2, 'two')]
+
+        registry = DictionaryRegistry(loader)
+        self.assertEqual(registry.id_of(12, 'two'), 2)
+        self.assertEqual(registry.get(12).by_id(1).name, 'one')
+        self.assertEqual(loaded, [12])
+        self.assertIsNone(registry.find(12, 'three'))
+        self.assertRaises(KeyError, registry.id_of, 12, 'three')
+        self.assertEqual(loaded, [12, 12])
+
+    def test_static_dictionaries(self):
+        registry = DictionaryRegistry(self.fail)
+        self.assertEqual(registry.id_of('autoscaling', 'off'), 184)
+
+    def test_store(self):
+        store = FileCache(os.path.join(self.tmp, 'dictionaries'), 3600)
+        DictionaryRegistry(lambda dict_id: [raw_item(1, 'one')], store).get(12)
+        registry = DictionaryRegistry(self.fail, store)
+        self.assertEqual(registry.id_of(12, 'one'), 1)
+
+    def test_empty_not_stored(self):
+        store = FileCache(os.path.join(self.tmp, 'dictionaries'), 3600)
+        self.assertEqual(len(DictionaryRegistry(lambda dict_id: [], store).get(12)), 0)
+        registry = DictionaryRegistry(lambda dict_id: [raw_item(1, 'one')], store)
+        self.assertEqual(registry.id_of(12, 'one'), 1)
+
+    def test_miss_reloads_stale_store(self):
+        store = FileCache(os.path.join(self.tmp, 'dictionaries'), 3600)
+        DictionaryRegistry(lambda dict_id: [raw_item(1, 'one')], store).get(12)
+        registry = DictionaryRegistry(lambda dict_id: [raw_item(1, 'one'), raw_item(2, 'two')], store)
+        self.assertEqual(registry.id_of(12, 'two'), 2)
+        self.assertEqual(DictionaryRegistry(self.fail, store).id_of(12, 'two'), 2)
+
+    def test_api_tiers(self):
+        api = self.api()
+        api.logon()
+        self.server.reset_calls()
+        self.assertEqual(api.dictionaries.id_of(17, 'Tier 2'), 712)
+        self.assertEqual(api.dictionaries.id_of(17, 'Tier 3'), 713)
+        self.assertEqual(self.server.reset_calls(), {'GetDictionaryItems': 1})
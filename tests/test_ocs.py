@@ -0,0 +1,645 @@
+import hashlib
+import json
+import os
+import unittest
+import urllib
+
+from oktawave import ocs
+from oktawave.cache import ListingCache
+from oktawave.ocs import MAX_SEGMENTS, ClientException, FileSegment, HashCache, PartVerifier, _checked_parts, \
+    _local_files, _local_path, cached_listing, delete_objects, delete_tree, download_object, file_etags, \
+    forget_listings, iter_objects, parallel_map, segment_prefix, slo_segment_size, upload_segmented
+from tests.helpers import TempDirTestCase
+
+
+def md5(data):
+    return hashlib.md5(data).hexdigest()
+
+
+class FakeConnection(object):
+    """Stands in for swiftclient connections, serving objects by (container, path, query_string)
+
+    Requests are recorded in calls as (method, path, detail) tuples, detail
+    being the Range header or query string; a request listed in errors
+    fails with HTTP 500 as many times as given there.
+    """
+
+    def __init__(self, objects=None, bulk_delete=None):
+        self.objects = objects if objects is not None else {}
+        # headers overriding the computed ones, e.g. of static large objects
+        self.object_headers = {}
+        # max_deletes_per_request of the bulk delete middleware, None if not enabled
+        self.bulk_delete = bulk_delete
+        self.containers = set()
+        self.calls = []
+        self.errors = {}
+        self.workers = []
+        self.user = 'user'
+        self.listings = 0
+        self.bulk_deletes = 0
+
+    def worker_connection(self):
+        worker = FakeConnection(self.objects, self.bulk_delete)
+        worker.object_headers = self.object_headers
+        worker.containers = self.containers
+        worker.calls = self.calls
+        worker.errors = self.errors
+        self.workers.append(worker)
+        return worker
+
+    def _request(self, method, path, detail=None):
+        call = (method, path, detail)
+        self.calls.append(call)
+        if self.errors.get(call):
+            self.errors[call] -= 1
+            raise ClientException('Object {0} failed'.format(method), http_status=500)
+
+    def _headers(self, key):
+        data = self.objects[key]
+        headers = {
+            'content-length': str(len(data)),
+            'content-type': 'application/octet-stream',
+            'etag': '"{0}"'.format(md5(data)),
+            'last-modified': 'Thu, 01 Jan 2015 00:00:00 GMT',
+        }
+        headers.update(self.object_headers.get(key, {}))
+        return headers
+
+    def head_object(self, container, path):
+        self._request('HEAD', path)
+        if (container, path, None) not in self.objects:
+            raise ClientException('Object HEAD failed', http_status=404)
+        return self._headers((container, path, None))
+
+    def get_object(self, container, path, query_string=None, resp_chunk_size=None, headers=None):
+        headers = headers or {}
+        self._request('GET', path, headers.get('Range', query_string))
+        key = (container, path, query_string)
+        if key not in self.objects:
+            raise ClientException('Object GET failed', http_status=404)
+        resp_headers = self._headers(key)
+        if 'If-Match' in headers and headers['If-Match'] != resp_headers['etag'].strip('"'):
+            raise ClientException('Object GET failed', http_status=412)
+        data = self.objects[key]
+        if 'Range' in headers:
+            start, end = headers['Range'][len('bytes='):].split('-')
+            data = data[int(start):int(end) + 1]
+            resp_headers['content-length'] = str(len(data))
+        if resp_chunk_size:
+            return resp_headers, iter([data[i:i + resp_chunk_size] for i in xrange(0, len(data), resp_chunk_size)])
+        return resp_headers, data
+
+    def put_container(self, container):
+        self.containers.add(container)
+
+    def put_object(self, container, path, contents, content_length=None, content_type=None, query_string=None,
+                   headers=None):
+        data = contents if isinstance(contents, str) else contents.read()
+        self._request('PUT', path, query_string)
+        key = (container, path, None)
+        if query_string == 'multipart-manifest=put':
+            manifest = json.loads(data)
+            segments = []
+            for segment in manifest:
+                seg_container, seg_path = segment['path'][1:].split('/', 1)
+                seg_data = self.objects.get((seg_container, seg_path, None))
+                if seg_data is None or md5(seg_data) != segment['etag'] or len(seg_data) != segment['size_bytes']:
+                    raise ClientException('Invalid manifest', http_status=400)
+                segments.append(seg_data)
+            self.objects[(container, path, 'multipart-manifest=get')] = json.dumps([
+                {'name': segment['path'], 'bytes': segment['size_bytes'], 'hash': segment['etag']}
+                for segment in manifest])
+            data = ''.join(segments)
+            etag = md5(''.join(segment['etag'] for segment in manifest))
+            self.object_headers[key] = dict(headers or {}, etag='"{0}"'.format(etag))
+            self.object_headers[key]['x-static-large-object'] = 'True'
+        else:
+            etag = md5(data)
+            self.objects.pop((container, path, 'multipart-manifest=get'), None)
+            self.object_headers.pop(key, None)
+            if content_type is not None:
+                self.object_headers[key] = {'content-type': content_type}
+        self.objects[key] = data
+        return etag
+
+    def get_container(self, container, prefix=None, delimiter=None, marker=None, limit=None, full_listing=False):
+        self.listings += 1
+        if container not in self.containers and not [key for key in self.objects if key[0] == container]:
+            raise ClientException('Container GET failed', http_status=404)
+        entries = []
+        for obj_container, path, query_string in sorted(self.objects):
+            if obj_container != container or query_string or not path.startswith(prefix or ''):
+                continue
+            if delimiter and delimiter in path[len(prefix or ''):]:
+                subdir = path[:path.index(delimiter, len(prefix or '')) + 1]
+                if entries and entries[-1].get('subdir') == subdir:
+                    continue
+                entry = {'subdir': subdir}
+            else:
+                headers = self._headers((obj_container, path, None))
+                entry = {'name': path, 'bytes': int(headers['content-length']), 'hash': headers['etag'].strip('"'),
+                         'content_type': headers['content-type'], 'last_modified': '2015-01-01T00:00:00.000000'}
+            if marker is None or entry.get('name', entry.get('subdir')) > marker:
+                entries.append(entry)
+        return {}, entries if full_listing else entries[:limit]
+
+    def head_container(self, container):
+        names = [path for obj_container, path, query_string in self.objects
+                 if obj_container == container and not query_string]
+        return {'x-container-object-count': str(len(names))}
+
+    def get_capabilities(self):
+        if self.bulk_delete is None:
+            return {}
+        return {'bulk_delete': {'max_deletes_per_request': self.bulk_delete}}
+
+    def delete_object(self, container, path):
+        self._request('DELETE', path)
+        self.object_headers.pop((container, path, None), None)
+        if self.objects.pop((container, path, None), None) is None:
+            raise ClientException('Object DELETE failed', http_status=404)
+
+    def post_account(self, headers, query_string=None, data=None):
+        self.bulk_deletes += 1
+        deleted = 0
+        for line in data.splitlines():
+            container, path = urllib.unquote(line).decode('utf-8')[1:].split('/', 1)
+            if self.objects.pop((container, path, None), None) is not None:
+                deleted += 1
+        return {}, json.dumps({'Errors': [], 'Response Status': '200 OK', 'Number Deleted': deleted})
+
+
+class SegmentTest(TempDirTestCase):
+
+    def test_slo_segment_size(self):
+        self.assertEqual(slo_segment_size(100, 10), 10)
+        self.assertEqual(slo_segment_size(10 * MAX_SEGMENTS, 10), 10)
+        size = 10 * MAX_SEGMENTS + 1
+        segment_size = slo_segment_size(size, 10)
+        self.assertEqual(segment_size, 11)
+        self.assertLessEqual(-(-size // segment_size), MAX_SEGMENTS)
+
+    def test_file_segment(self):
+        path = os.path.join(self.tmp, 'data')
+        with open(path, 'wb') as f:
+            f.write('0123456789')
+        segment = FileSegment(path, 3, 5)
+        self.addCleanup(segment.close)
+        self.assertEqual(segment.read(2), '34')
+        self.assertEqual(segment.tell(), 2)
+        self.assertEqual(segment.read(), '567')
+        self.assertEqual(segment.read(), '')
+        self.assertEqual(segment.hexdigest(), hashlib.md5('34567').hexdigest())
+        # a retried upload reads the segment again
+        segment.seek(0)
+        self.assertEqual(segment.hexdigest(), hashlib.md5('34567').hexdigest())
+
+
+class UploadSegmentedTest(TempDirTestCase):
+
+    DATA = ''.join(chr(i) for i in range(25))
+
+    def setUp(self):
+        super(UploadSegmentedTest, self).setUp()
+        self.conn = FakeConnection()
+        self.path = os.path.join(self.tmp, 'data')
+        with open(self.path, 'wb') as f:
+            f.write(self.DATA)
+
+    def segment_names(self, segment_size=10):
+        stat = os.stat(self.path)
+        prefix = segment_prefix('o', stat.st_mtime, stat.st_size, segment_size)
+        return ['{0}{1:08d}'.format(prefix, i) for i in range(-(-stat.st_size // segment_size))]
+
+    def puts(self):
+        return [path for method, path, _detail in self.conn.calls if method == 'PUT']
+
+    def test_upload(self):
+        etags = upload_segmented(self.conn, 'c', 'o', self.path, 10, jobs=2)
+        self.assertEqual(etags, [md5(self.DATA[:10]), md5(self.DATA[10:20]), md5(self.DATA[20:])])
+        self.assertEqual(self.conn.objects[('c', 'o', None)], self.DATA)
+        headers = self.conn.head_object('c', 'o')
+        self.assertEqual(headers['etag'], '"{0}"'.format(md5(''.join(etags))))
+        self.assertIn('x-object-meta-mtime', headers)
+        manifest = json.loads(self.conn.objects[('c', 'o', 'multipart-manifest=get')])
+        self.assertEqual([segment['name'] for segment in manifest],
+                         ['/c_segments/' + name for name in self.segment_names()])
+        self.assertIn('c_segments', self.conn.containers)
+
+    def test_segment_retried(self):
+        name = self.segment_names()[1]
+        self.conn.errors[('PUT', name, None)] = 2
+        upload_segmented(self.conn, 'c', 'o', self.path, 10, jobs=1, retries=2)
+        self.assertEqual(self.puts().count(name), 3)
+        self.assertEqual(self.conn.objects[('c', 'o', None)], self.DATA)
+
+    def test_resume(self):
+        names = self.segment_names()
+        self.conn.errors[('PUT', names[2], None)] = 2
+        with self.assertRaises(ClientException):
+            upload_segmented(self.conn, 'c', 'o', self.path, 10, jobs=1, retries=1)
+        # no manifest for missing segments
+        self.assertNotIn(('c', 'o', None), self.conn.objects)
+        # a segment spoilt in the meantime is uploaded again
+        self.conn.objects[('c_segments', names[0], None)] = 'x' * 10
+        del self.conn.calls[:]
+        upload_segmented(self.conn, 'c', 'o', self.path, 10, jobs=1)
+        self.assertEqual(self.puts(), [names[0], names[2], 'o'])
+        self.assertEqual(self.conn.objects[('c', 'o', None)], self.DATA)
+
+    def test_max_segments(self):
+        self.addCleanup(setattr, ocs, 'MAX_SEGMENTS', ocs.MAX_SEGMENTS)
+        ocs.MAX_SEGMENTS = 2
+        upload_segmented(self.conn, 'c', 'o', self.path, 10)
+        manifest = json.loads(self.conn.objects[('c', 'o', 'multipart-manifest=get')])
+        self.assertEqual([segment['bytes'] for segment in manifest], [13, 12])
+        self.assertEqual([segment['name'] for segment in manifest],
+                         ['/c_segments/' + name for name in self.segment_names(13)])
+        self.assertEqual(self.conn.objects[('c', 'o', None)], self.DATA)
+
+
+class DownloadObjectTest(TempDirTestCase):
+
+    DATA = ''.join(chr(i) for i in range(25))
+
+    def setUp(self):
+        super(DownloadObjectTest, self).setUp()
+        self.conn = FakeConnection({('c', 'o', None): self.DATA})
+        self.path = os.path.join(self.tmp, 'data')
+
+    def ranges(self):
+        return [detail for method, _path, detail in self.conn.calls if method == 'GET']
+
+    def local_files(self):
+        return sorted(os.listdir(self.tmp))
+
+    def test_download(self):
+        self.assertEqual(download_object(self.conn, 'c', 'o', self.path, 10, jobs=2), 25)
+        with open(self.path, 'rb') as f:
+            self.assertEqual(f.read(), self.DATA)
+        self.assertEqual(self.local_files(), ['data'])
+
+    def test_resume(self):
+        self.conn.errors[('GET', 'o', 'bytes=10-19')] = 1
+        with self.assertRaises(ClientException):
+            download_object(self.conn, 'c', 'o', self.path, 10, jobs=1)
+        self.assertEqual(self.local_files(), ['data.part', 'data.part.json'])
+        del self.conn.calls[:]
+        self.assertEqual(download_object(self.conn, 'c', 'o', self.path, 10, jobs=1), 15)
+        self.assertEqual(self.ranges(), ['bytes=10-19', 'bytes=20-24'])
+        with open(self.path, 'rb') as f:
+            self.assertEqual(f.read(), self.DATA)
+        self.assertEqual(self.local_files(), ['data'])
+
+    def test_changed_during_download(self):
+        changed = self.DATA[::-1]
+        get_object = self.conn.get_object
+
+        def get_object_changing(container, path, **kwargs):
+            if kwargs.get('headers', {}).get('Range') == 'bytes=10-19':
+                self.conn.objects[('c', 'o', None)] = changed
+            return get_object(container, path, **kwargs)
+
+        self.conn.get_object = get_object_changing
+        with self.assertRaises(ClientException) as cm:
+            download_object(self.conn, 'c', 'o', self.path, 10, jobs=1)
+        # If-Match keeps ranges of the old version out
+        self.assertEqual(cm.exception.http_status, 412)
+        self.assertFalse(os.path.exists(self.path))
+        # the object is not the one the saved state belongs to, so it starts over
+        del self.conn.calls[:]
+        self.assertEqual(download_object(self.conn, 'c', 'o', self.path, 10, jobs=1), 25)
+        self.assertEqual(self.ranges(), ['bytes=0-9', 'bytes=10-19', 'bytes=20-24'])
+        with open(self.path, 'rb') as f:
+            self.assertEqual(f.read(), changed)
+
+    def test_md5_mismatch(self):
+        self.conn.object_headers[('c', 'o', None)] = {'etag': '"{0}"'.format(md5('other'))}
+        with self.assertRaises(ClientException):
+            download_object(self.conn, 'c', 'o', self.path, 10, jobs=2)
+        self.assertEqual(self.local_files(), [])
+
+    def test_static_large_object(self):
+        self.conn.objects[('c_segments', 's1', None)] = self.DATA[:15]
+        self.conn.objects[('c_segments', 's2', None)] = self.DATA[15:]
+        manifest = [{'path': '/c_segments/s1', 'etag': md5(self.DATA[:15]), 'size_bytes': 15},
+                    {'path': '/c_segments/s2', 'etag': md5(self.DATA[15:]), 'size_bytes': 10}]
+        self.conn.put_object('c', 'o', json.dumps(manifest), query_string='multipart-manifest=put')
+        self.assertEqual(download_object(self.conn, 'c', 'o', self.path, 10, jobs=2), 25)
+        with open(self.path, 'rb') as f:
+            self.assertEqual(f.read(), self.DATA)
+
+
+class SyncTest(TempDirTestCase):
+
+    def setUp(self):
+        super(SyncTest, self).setUp()
+        self.addCleanup(setattr, ocs, 'SYNC_CACHE_DIR', ocs.SYNC_CACHE_DIR)
+        ocs.SYNC_CACHE_DIR = os.path.join(self.tmp, 'sync')
+        self.conn = FakeConnection()
+        self.local = os.path.join(self.tmp, 'local')
+        self.reports = []
+        self.mtime = 1000000000
+
+    def write(self, rel, data):
+        path = os.path.join(self.local, rel)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as f:
+            f.write(data)
+        # a rewrite within the same second must still look changed
+        self.mtime += 10
+        os.utime(path, (self.mtime, self.mtime))
+
+    def read(self, rel):
+        with open(os.path.join(self.local, rel), 'rb') as f:
+            return f.read()
+
+    def requests(self, method):
+        paths = [path for call_method, path, _detail in self.conn.calls if call_method == method]
+        del self.conn.calls[:]
+        return paths
+
+    def upload(self, **kwargs):
+        return ocs.sync_upload(self.conn, self.local, 'c', 'p/', 10, jobs=2,
+                               report=lambda action, rel: self.reports.append((action, rel)), **kwargs)
+
+    def download(self, **kwargs):
+        return ocs.sync_download(self.conn, self.local, 'c', 'p/', 10, 10, jobs=2,
+                                 report=lambda action, rel: self.reports.append((action, rel)), **kwargs)
+
+    def test_upload(self):
+        self.write('a', 'aaaa')
+        self.write('d/b', 'b' * 25)
+        self.assertEqual(self.upload(), (2, 0, 0))
+        self.assertIn('c', self.conn.containers)
+        self.assertEqual(self.conn.objects[('c', 'p/a', None)], 'aaaa')
+        self.assertEqual(self.conn.objects[('c', 'p/d/b', None)], 'b' * 25)
+        self.assertEqual(sorted(self.reports), [('upload', 'a'), ('upload', 'd/b')])
+
+        # unchanged, also the static large object
+        self.requests('PUT')
+        self.assertEqual(self.upload(), (0, 2, 0))
+        self.assertEqual(self.requests('PUT'), [])
+
+        # changed contents of the same size
+        self.write('a', 'xxxx')
+        self.assertEqual(self.upload(), (1, 1, 0))
+        self.assertEqual(self.requests('PUT'), ['p/a'])
+        self.assertEqual(self.conn.objects[('c', 'p/a', None)], 'xxxx')
+
+    def test_upload_delete(self):
+        self.write('a', 'aaaa')
+        self.conn.objects[('c', 'p/stale', None)] = 's'
+        self.conn.objects[('c', 'other', None)] = 'o'
+        self.assertEqual(self.upload(dry_run=True, delete=True), (1, 0, 1))
+        self.assertEqual(self.requests('PUT') + self.requests('DELETE'), [])
+        self.assertEqual(sorted(self.reports), [('delete', 'stale'), ('upload', 'a')])
+        self.assertNotIn(('c', 'p/a', None), self.conn.objects)
+
+        self.assertEqual(self.upload(), (1, 0, 0))
+        self.assertIn(('c', 'p/stale', None), self.conn.objects)
+        self.assertEqual(self.upload(delete=True), (0, 1, 1))
+        self.assertEqual(sorted(path for _container, path, _query_string in self.conn.objects), ['other', 'p/a'])
+
+    def test_download(self):
+        self.conn.objects[('c', 'p/a', None)] = 'aaaa'
+        self.conn.objects[('c', 'p/d/b', None)] = 'b' * 25
+        self.assertEqual(self.download(), (2, 0, 0))
+        self.assertEqual(self.read('a'), 'aaaa')
+        self.assertEqual(self.read('d/b'), 'b' * 25)
+        self.assertEqual(sorted(os.listdir(self.local)), ['a', 'd'])
+
+        # unchanged
+        self.requests('GET')
+        self.assertEqual(self.download(), (0, 2, 0))
+        self.assertEqual(self.requests('GET'), [])
+
+        # changed contents of the same size
+        self.conn.objects[('c', 'p/d/b', None)] = 'x' * 25
+        self.assertEqual(self.download(), (1, 1, 0))
+        self.assertEqual(set(self.requests('GET')), set(['p/d/b']))
+        self.assertEqual(self.read('d/b'), 'x' * 25)
+
+    def test_download_delete(self):
+        self.conn.objects[('c', 'p/a', None)] = 'aaaa'
+        self.write('stale', 's')
+        self.write('stale2', 's')
+        self.write('a', 'xxxx')
+        self.assertEqual(self.download(dry_run=True, delete=True), (1, 0, 2))
+        self.assertEqual(sorted(self.reports), [('delete', 'stale'), ('delete', 'stale2'), ('download', 'a')])
+        self.assertEqual(self.requests('GET'), [])
+        self.assertEqual(self.read('a'), 'xxxx')
+        self.assertEqual(self.read('stale'), 's')
+
+        self.assertEqual(self.download(), (1, 0, 0))
+        self.assertEqual(self.read('stale'), 's')
+        self.assertEqual(self.download(delete=True), (0, 1, 2))
+        self.assertEqual(sorted(os.listdir(self.local)), ['a'])
+        # local files are deleted without opening worker connections
+        self.assertEqual(self.conn.workers, [])
+        self.assertEqual(self.read('a'), 'aaaa')
+
+
+class ParallelMapTest(unittest.TestCase):
+
+    def test_results_in_order(self):
+        conn = FakeConnection()
+
+        def func(worker_conn, item):
+            self.assertIn(worker_conn, conn.workers)
+            return item * 2
+
+        self.assertEqual(parallel_map(conn, func, range(20), 4), range(0, 40, 2))
+        self.assertEqual(len(conn.workers), 4)
+
+    def test_serial(self):
+        conn = FakeConnection()
+        self.assertEqual(parallel_map(conn, lambda c, item: c is conn, [1, 2], 1), [True, True])
+
+    def test_error(self):
+        def func(worker_conn, item):
+            if item == 3:
+                raise ValueError(item)
+
+        with self.assertRaises(ValueError):
+            parallel_map(FakeConnection(), func, range(10), 4)
+
+
+class PartVerifierTest(TempDirTestCase):
+
+    def setUp(self):
+        super(PartVerifierTest, self).setUp()
+        self.path = os.path.join(self.tmp, 'data')
+        with open(self.path, 'wb') as f:
+            f.write('aaaabbbbcc')
+
+    def test_parts_checked_as_completed(self):
+        verifier = PartVerifier(self.path, [(0, 4, md5('aaaa')), (4, 4, md5('xxxx')), (8, 2, md5('cc'))])
+        verifier.advance(3)
+        self.assertEqual(verifier.index, 0)
+        verifier.advance(6)
+        self.assertEqual(verifier.index, 1)
+        verifier.advance(10)
+        self.assertEqual(verifier.index, 3)
+        self.assertEqual(verifier.failed, [(4, 4)])
+
+    def test_short_file(self):
+        verifier = PartVerifier(self.path, [(0, 12, md5('aaaabbbbcc'))])
+        with self.assertRaises(IOError):
+            verifier.advance(12)
+
+
+class CheckedPartsTest(unittest.TestCase):
+
+    def test_plain_object(self):
+        self.assertEqual(_checked_parts(None, 'c', 'o', {'etag': '"abc"'}, 10), [(0, 10, 'abc')])
+
+    def test_dynamic_large_object(self):
+        self.assertEqual(_checked_parts(None, 'c', 'o', {'x-object-manifest': 'c_segments/o', 'etag': 'x'}, 10), [])
+
+    def test_static_large_object(self):
+        manifest = json.dumps([{'bytes': 4, 'hash': 'h1'}, {'bytes': 2, 'hash': 'h2'}])
+        conn = FakeConnection({('c', 'o', 'multipart-manifest=get'): manifest})
+        headers = {'x-static-large-object': 'True', 'etag': '"slo"'}
+        self.assertEqual(_checked_parts(conn, 'c', 'o', headers, 6), [(0, 4, 'h1'), (4, 2, 'h2')])
+
+
+class IterObjectsTest(unittest.TestCase):
+
+    def setUp(self):
+        names = ['a/1', 'a/2', 'b', 'c/1', 'c/d/1', 'e']
+        self.conn = FakeConnection(dict((('c', name, None), '') for name in names))
+
+    def names(self, **kwargs):
+        return [entry.get('name', entry.get('subdir')) for entry in iter_objects(self.conn, 'c', **kwargs)]
+
+    def test_pages(self):
+        self.assertEqual(self.names(page_size=4), ['a/1', 'a/2', 'b', 'c/1', 'c/d/1', 'e'])
+        # the second page is short, so it is the last one
+        self.assertEqual(self.conn.listings, 2)
+
+    def test_full_last_page(self):
+        self.assertEqual(len(self.names(page_size=3)), 6)
+        self.assertEqual(self.conn.listings, 3)
+
+    def test_prefix_and_delimiter(self):
+        self.assertEqual(self.names(delimiter='/', page_size=2), ['a/', 'b', 'c/', 'e'])
+        self.assertEqual(self.names(prefix='c/', delimiter='/'), ['c/1', 'c/d/'])
+
+
+class SyncHelpersTest(TempDirTestCase):
+
+    def write(self, rel, data):
+        path = os.path.join(self.tmp, rel)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_file_etags(self):
+        path = self.write('data', 'aaaabbbbcc')
+        self.assertEqual(file_etags(path, 10, 10), {'md5': md5('aaaabbbbcc')})
+        self.assertEqual(file_etags(path, 10, 4), {
+            'md5': md5('aaaabbbbcc'),
+            'slo:4': md5(md5('aaaa') + md5('bbbb') + md5('cc')),
+        })
+
+    def test_hash_cache(self):
+        self.addCleanup(setattr, ocs, 'SYNC_CACHE_DIR', ocs.SYNC_CACHE_DIR)
+        ocs.SYNC_CACHE_DIR = os.path.join(self.tmp, 'sync')
+        root = os.path.join(self.tmp, 'root')
+        stat = os.stat(self.write('root/a', 'a'))
+        cache = HashCache(root)
+        self.assertEqual(cache.etags(u'a', stat), {})
+        cache.update(u'a', stat, {'md5': md5('a')})
+        cache.update(u'b', stat, {'md5': md5('b')})
+        cache.save(set([u'a']))
+
+        cache = HashCache(root)
+        self.assertEqual(cache.etags(u'a', stat), {'md5': md5('a')})
+        self.assertEqual(cache.etags(u'b', stat), {})
+        changed = self.write('root/a', 'aa')
+        self.assertEqual(cache.etags(u'a', os.stat(changed)), {})
+
+    def test_local_files(self):
+        self.write('root/a', '')
+        self.write('root/d/\xc5\xbc', '')
+        self.write('root/d/\xff', '')
+        dirs = set()
+        files = _local_files(os.path.join(self.tmp, 'root'), dirs)
+        self.assertEqual(sorted(files), [u'a', u'd/\u017c'])
+        self.assertEqual(dirs, set([u'd']))
+
+    def test_local_path(self):
+        self.assertEqual(_local_path('/root', u'd/\u017c'), '/root/d/\xc5\xbc')
+        for rel in (u'../x', u'd/../x', u'/x', u'd//x', u'./x'):
+            self.assertIsNone(_local_path('/root', rel))
+
+
+class DeleteTest(unittest.TestCase):
+
+    def objects(self, count):
+        names = [u'dir/{0:03}'.format(i) for i in range(count)] + [u'other', u'\u017c']
+        return dict(((u'c', name, None), '') for name in names)
+
+    def remaining(self, conn):
+        return sorted(path for _container, path, _query_string in conn.objects)
+
+    def test_delete_tree_bulk(self):
+        conn = FakeConnection(self.objects(25), bulk_delete=10)
+        reports = []
+        self.assertEqual(delete_tree(conn, u'c', u'dir/', report=reports.append), 25)
+        self.assertEqual(reports, [10, 20, 25])
+        self.assertEqual(conn.bulk_deletes, 3)
+        self.assertEqual(self.remaining(conn), [u'other', u'\u017c'])
+
+    def test_delete_tree_without_bulk_delete(self):
+        conn = FakeConnection(self.objects(25))
+        self.assertEqual(delete_tree(conn, u'c'), 27)
+        self.assertEqual(conn.bulk_deletes, 0)
+        self.assertEqual(self.remaining(conn), [])
+
+    def test_missing_objects_skipped(self):
+        conn = FakeConnection(self.objects(2))
+        self.assertEqual(delete_objects(conn, u'c', [u'dir/000', u'missing', u'other'], jobs=2), 2)
+        self.assertEqual(self.remaining(conn), [u'dir/001', u'\u017c'])
+
+
+class CachedListingTest(TempDirTestCase):
+
+    def setUp(self):
+        super(CachedListingTest, self).setUp()
+        self.conn = FakeConnection({('c', 'a', None): '', ('c', 'b', None): ''})
+
+    def names(self, cache):
+        return [entry['name'] for entry in cached_listing(self.conn, cache, 'c')]
+
+    def test_cached_while_valid(self):
+        cache = ListingCache(self.tmp, 10000)
+        self.assertEqual(self.names(cache), ['a', 'b'])
+        self.assertEqual(self.names(cache), ['a', 'b'])
+        self.assertEqual(self.conn.listings, 1)
+        # the object count changes
+        del self.conn.objects[('c', 'b', None)]
+        self.assertEqual(self.names(cache), ['a'])
+        self.assertEqual(self.conn.listings, 2)
+
+    def replace_object(self):
+        """Changes the listing without changing the validators"""
+        del self.conn.objects[('c', 'b', None)]
+        self.conn.objects[('c', 'x', None)] = ''
+
+    def test_forget_listings(self):
+        cache = ListingCache(self.tmp, 10000)
+        self.names(cache)
+        self.replace_object()
+        self.assertEqual(self.names(cache), ['a', 'b'])
+        forget_listings(self.conn, cache, 'c')
+        self.assertEqual(self.names(cache), ['a', 'x'])
+
+    def test_max_age(self):
+        self.names(ListingCache(self.tmp, 10000))
+        self.replace_object()
+        self.assertEqual(self.names(ListingCache(self.tmp, 10000, max_age=-1)), ['a', 'x'])
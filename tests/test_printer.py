@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+import datetime
+import unittest
+from StringIO import StringIO
+
+from oktawave.printer import CsvPrinter, JsonLinesPrinter, Printer, TsvPrinter
+
+
+class TableStreamTest(unittest.TestCase):
+
+    def print_table(self, head, rows, **kwargs):
+        output = StringIO()
+        count = Printer(output).print_table_stream(head, rows, hmarg=0, **kwargs)
+        return count, output.getvalue()
+
+    def test_table(self):
+        count, text = self.print_table(['ID', 'Name'], [[1, 'a'], [22, u'zażółć']])
+        self.assertEqual(count, 2)
+        self.assertEqual(text, u'\n'.join([
+            u'+----+--------+',
+            u'| ID | Name   |',
+            u'+----+--------+',
+            u'| 1  | a      |',
+            u'| 22 | zażółć |',
+            u'+----+--------+',
+            u'',
+        ]))
+
+    def test_rows_after_window(self):
+        count, text = self.print_table(['ID'], iter([[1], [2], [333]]), window=2)
+        self.assertEqual(count, 3)
+        self.assertEqual(text.splitlines(), [
+            '+----+',
+            '| ID |',
+            '+----+',
+            '| 1  |',
+            '| 2  |',
+            '+-----+',
+            '| 333 |',
+            '+-----+',
+        ])
+
+    def test_multiline_and_wide_cells(self):
+        count, text = self.print_table(['A', 'B'], [[u'x\ny', u'中']])
+        self.assertEqual(text.splitlines()[3:5], [u'| x | 中 |', u'| y |    |'])
+
+    def test_no_rows(self):
+        self.assertEqual(self.print_table(['ID'], []), (0, ''))
+
+    def test_rows_printed_while_generated(self):
+        output = StringIO()
+
+        def rows():
+            yield [1]
+            # the first window has been printed before the next row is requested
+            self.assertIn('| 1  |', output.getvalue())
+            yield [2]
+
+        Printer(output).print_table_stream(['ID'], rows(), window=1)
+
+
+class RecordPrinterTest(unittest.TestCase):
+
+    HEAD = ['ID', 'Name', 'Created']
+    ROWS = [
+        [1, u'zażółć, "gęślą"', datetime.datetime(2015, 1, 2, 3, 4, 5)],
+        [2, None, None],
+    ]
+
+    def print_table(self, printer_class):
+        output = StringIO()
+        messages = StringIO()
+        printer = printer_class(output, messages)
+        printer.print_str('Title')
+        count = printer.print_table_stream(self.HEAD, self.ROWS)
+        self.assertEqual(count, 2)
+        self.assertEqual(messages.getvalue(), 'Title\n')
+        return output.getvalue()
+
+    def test_jsonl(self):
+        lines = self.print_table(JsonLinesPrinter).splitlines()
+        self.assertEqual(lines, [
+            '{"ID": 1, "Name": "za\\u017c\\u00f3\\u0142\\u0107, \\"g\\u0119\\u015bl\\u0105\\"", '
+            '"Created": "2015-01-02T03:04:05"}',
+            '{"ID": 2, "Name": null, "Created": null}',
+        ])
+
+    def test_csv(self):
+        self.assertEqual(self.print_table(CsvPrinter),
+                         'ID,Name,Created\r\n'
+                         '1,"zażółć, ""gęślą""",2015-01-02 03:04:05\r\n'
+                         '2,,\r\n')
+
+    def test_tsv(self):
+        self.assertEqual(self.print_table(TsvPrinter),
+                         'ID\tName\tCreated\r\n'
+                         '1\t"zażółć, ""gęślą"""\t2015-01-02 03:04:05\r\n'
+                         '2\t\t\r\n')
+
+    def test_secondary_table(self):
+        output = StringIO()
+        messages = StringIO()
+        printer = CsvPrinter(output, messages)
+        printer.print_table([['Key', 'Value'], ['Name', 'a']])
+        printer.print_table_stream(self.HEAD, self.ROWS[1:], secondary=True)
+        self.assertEqual(output.getvalue(), 'Key,Value\r\nName,a\r\n')
+        self.assertEqual(messages.getvalue(), 'ID,Name,Created\r\n2,,\r\n')
+
+    def test_no_rows(self):
+        output = StringIO()
+        self.assertEqual(CsvPrinter(output).print_table_stream(self.HEAD, []), 0)
+        self.assertEqual(output.getvalue(), '')
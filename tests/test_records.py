@@ -0,0 +1,73 @@
+import datetime
+import unittest
+
+from oktawave.records import Record, convert, date, field, record_list
+
+
+class Item(Record):
+    __slots__ = ()
+
+    FIELDS = {
+        'id': field('Id'),
+    }
+
+
+class Thing(Record):
+    __slots__ = ()
+
+    calls = []
+
+    FIELDS = {
+        'name': field('Name'),
+        'owner': field('Owner', 'Name'),
+        'size': convert(lambda v: Thing.calls.append(v) or v * 2, 'Size'),
+        'created': date('Created'),
+        'items': record_list(Item, 'Items'),
+    }
+
+
+class RecordTest(unittest.TestCase):
+
+    RAW = {
+        'Name': 'thing',
+        'Owner': {'Name': 'owner'},
+        'Size': 21,
+        'Created': '/Date(1420070400000+0000)/',
+        'Items': [{'Id': 1}, {'Id': 2}],
+    }
+
+    def setUp(self):
+        Thing.calls[:] = []
+
+    def test_fields(self):
+        thing = Thing(self.RAW)
+        self.assertEqual(thing['name'], 'thing')
+        self.assertEqual(thing.owner, 'owner')
+        self.assertEqual(thing.size, 42)
+        self.assertEqual([item.id for item in thing['items']], [1, 2])
+        self.assertIsInstance(thing.created, datetime.datetime)
+        self.assertIsNone(Thing({'Created': None}).created)
+
+    def test_decoded_once(self):
+        thing = Thing(self.RAW)
+        self.assertEqual(Thing.calls, [])
+        thing['size']
+        thing.size
+        self.assertEqual(Thing.calls, [21])
+
+    def test_dict_access(self):
+        thing = Thing(self.RAW)
+        thing['extra'] = 1
+        self.assertIn('extra', thing)
+        self.assertIn('owner', thing)
+        self.assertNotIn('missing', thing)
+        self.assertEqual(thing.get('missing', 3), 3)
+        self.assertEqual(thing.keys(), ['created', 'extra', 'items', 'name', 'owner', 'size'])
+        self.assertEqual(thing.as_dict()['extra'], 1)
+        with self.assertRaises(KeyError):
+            thing['missing']
+        with self.assertRaises(AttributeError):
+            thing.missing
+
+    def test_missing_list(self):
+        self.assertEqual(Thing({'Items': None})['items'], [])
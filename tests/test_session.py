@@ -0,0 +1,56 @@
+import os
+
+from oktawave import fakeserver
+from oktawave.cache import FileCache
+from oktawave.exceptions import OktawaveAccessDenied
+from tests.helpers import FakeApiTestCase
+
+
+class SessionTest(FakeApiTestCase):
+
+    def test_session_reused(self):
+        store = FileCache(os.path.join(self.tmp, 'session'), 3600)
+        self.api(session_store=store).logon()
+        self.assertEqual(self.server.reset_calls(), {'LogonUser': 1})
+        api = self.api(session_store=store)
+        api.logon()
+        self.assertEqual(self.server.reset_calls(), {})
+        self.assertEqual(api.client_id, 1000)
+
+    def test_session_per_user(self):
+        store = FileCache(os.path.join(self.tmp, 'session'), 3600)
+        self.api(session_store=store).logon()
+        self.server.reset_calls()
+        from oktawave.api import OktawaveApi
+        api = OktawaveApi('user', 'password', api_url=self.server.url + '/', session_store=store)
+        api.logon()
+        self.assertEqual(self.server.reset_calls(), {})
+        other = OktawaveApi('other', 'password', api_url=self.server.url, session_store=store)
+        other.logon()
+        self.assertEqual(self.server.reset_calls(), {'LogonUser': 1})
+
+    def test_session_per_password(self):
+        store = FileCache(os.path.join(self.tmp, 'session'), 3600)
+        self.api(session_store=store).logon()
+        self.server.reset_calls()
+        from oktawave.api import OktawaveApi
+        api = OktawaveApi('user', 'changed', api_url=self.server.url, session_store=store)
+        api.logon()
+        self.assertEqual(self.server.reset_calls(), {'LogonUser': 1})
+
+    def test_access_denied_forgets_session(self):
+        store = FileCache(os.path.join(self.tmp, 'session'), 3600)
+        api = self.api(session_store=store)
+        self.assertEqual(api.logon(), api.logon())
+
+        def denied(**kwargs):
+            raise fakeserver.FakeAccessDenied()
+
+        self.server.fleet.GetVirtualMachinesSimple = denied
+        with self.assertRaises(OktawaveAccessDenied):
+            list(api.OCI_List())
+        self.server.reset_calls()
+        cached = self.api(session_store=store)
+        cached.logon()
+        self.assertEqual(self.server.reset_calls(), {'LogonUser': 1})
+        self.assertEqual(cached.logon(), api.logon())
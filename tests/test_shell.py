@@ -0,0 +1,68 @@
+import sys
+
+from oktawave.commands.runner import CapturedOutput
+from oktawave.commands.shell import OktawaveShell
+from tests.helpers import FakeApiTestCase
+
+
+class CompletionTest(FakeApiTestCase):
+
+    def setUp(self):
+        super(CompletionTest, self).setUp()
+        self.addCleanup(setattr, sys, 'stdout', sys.stdout)
+        self.shell = OktawaveShell(self.root_context())
+
+    def complete(self, line):
+        text = line.split(' ')[-1]
+        begidx = len(line) - len(text)
+        return self.shell.completedefault(text, line, begidx, len(line))
+
+    def test_namespaces(self):
+        self.assertEqual(self.shell.completenames('OC'), ['OCI ', 'OCS '])
+        self.assertNotIn('batch ', self.shell.completenames(''))
+
+    def test_commands(self):
+        self.assertEqual(self.complete('OCI Tur'), ['TurnOff ', 'TurnOn '])
+        self.assertEqual(self.complete('help OCI Tur'), ['TurnOff ', 'TurnOn '])
+        self.assertEqual(self.complete('NoSuch Tur'), [])
+
+    def test_options(self):
+        self.assertIn('--wait ', self.complete('OCI TurnOn --w'))
+
+    def test_names(self):
+        self.assertEqual(self.complete('OCI Settings fake-vm-1'),
+                         ['fake-vm-1 ', 'fake-vm-10 ', 'fake-vm-11 ', 'fake-vm-12 ', 'fake-vm-13 ',
+                          'fake-vm-14 ', 'fake-vm-15 ', 'fake-vm-16 ', 'fake-vm-17 ', 'fake-vm-18 ',
+                          'fake-vm-19 '])
+        self.assertEqual(self.complete('OCI Settings fake-vm-3 '), [])
+
+
+class NameRefreshTest(FakeApiTestCase):
+
+    def setUp(self):
+        super(NameRefreshTest, self).setUp()
+        self.addCleanup(setattr, sys, 'stdout', sys.stdout)
+        self.addCleanup(setattr, sys, 'stderr', sys.stderr)
+        self.shell = OktawaveShell(self.root_context('--name-cache-ttl', '0'))
+        self.addCleanup(setattr, self.shell.router, 'default', self.shell.router.default)
+        self.addCleanup(setattr, self.shell.router.errors, 'default', self.shell.router.errors.default)
+
+    def run_line(self, line):
+        """Runs a shell command line, returns (output, error output)"""
+        out = self.shell.router.default = CapturedOutput()
+        err = self.shell.router.errors.default = CapturedOutput()
+        self.shell.onecmd(line)
+        return out.getvalue(), err.getvalue()
+
+    def test_created_elsewhere(self):
+        self.assertEqual(self.run_line('OCI Settings fake-vm-3')[1], '')
+        self.server.fleet.CloneVirtualMachine(3, 'newvm')
+        self.assertEqual(self.run_line('OCI Settings newvm')[1], '')
+
+    def test_recreated_elsewhere(self):
+        self.server.fleet.CloneVirtualMachine(3, 'newvm')
+        self.run_line('OCI Settings newvm')
+        old_id = max(self.server.fleet.vms)
+        self.server.fleet.DeleteVirtualMachine(old_id)
+        self.server.fleet.CloneVirtualMachine(4, 'newvm')
+        self.assertEqual(self.run_line('OCI Settings newvm')[1], '')
@@ -0,0 +1,16 @@
+import unittest
+
+from oktawave.bench import STARTUP_BUDGET, measure_startup
+
+
+class StartupTest(unittest.TestCase):
+
+    def test_help_within_budget(self):
+        best, _loaded = measure_startup(['--help'], runs=5)
+        self.assertLessEqual(best, STARTUP_BUDGET)
+
+    def test_help_imports_no_heavy_modules(self):
+        for args in (['--help'], ['OCI', '--help'], ['OCS', '--help']):
+            _best, loaded = measure_startup(args, runs=1)
+            self.assertEqual(loaded, [], '{0} imported by oktawave-cli {1}'.format(
+                ', '.join(loaded), ' '.join(args)))